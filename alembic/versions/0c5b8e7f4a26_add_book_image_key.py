@@ -0,0 +1,41 @@
+"""add book image key, widen storage object key for variants
+
+Revision ID: 0c5b8e7f4a26
+Revises: f3d92a61c7e4
+Create Date: 2026-10-18 22:14:50.193362
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0c5b8e7f4a26"
+down_revision: Union[str, None] = "f3d92a61c7e4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("book", sa.Column("image_key", sa.String(length=64), nullable=True))
+    op.alter_column(
+        "storage_object",
+        "key",
+        existing_type=sa.String(length=64),
+        type_=sa.String(length=100),
+        existing_nullable=False,
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "storage_object",
+        "key",
+        existing_type=sa.String(length=100),
+        type_=sa.String(length=64),
+        existing_nullable=False,
+    )
+    op.drop_column("book", "image_key")
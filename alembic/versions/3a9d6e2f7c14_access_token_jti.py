@@ -0,0 +1,53 @@
+"""store access token jti instead of the token, index expiry for the reaper
+
+Revision ID: 3a9d6e2f7c14
+Revises: 0c5b8e7f4a26
+Create Date: 2026-10-18 23:41:07.518204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3a9d6e2f7c14"
+down_revision: Union[str, None] = "0c5b8e7f4a26"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # tokens issued before have no jti claim and are refused, their rows are
+    # of no further use
+    op.execute("DELETE FROM access_token")
+    op.drop_column("access_token", "token")
+    op.add_column(
+        "access_token", sa.Column("jti", sa.String(length=32), nullable=False)
+    )
+    op.create_index(op.f("ix_access_token_jti"), "access_token", ["jti"], unique=True)
+    op.create_index(
+        op.f("ix_access_token_user_id"), "access_token", ["user_id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_access_token_expiry_time"),
+        "access_token",
+        ["expiry_time"],
+        unique=False,
+    )
+    op.create_index(op.f("ix_otp_expires_at"), "otp", ["expires_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_otp_expires_at"), table_name="otp")
+    op.drop_index(op.f("ix_access_token_expiry_time"), table_name="access_token")
+    op.drop_index(op.f("ix_access_token_user_id"), table_name="access_token")
+    op.drop_index(op.f("ix_access_token_jti"), table_name="access_token")
+    op.execute("DELETE FROM access_token")
+    op.drop_column("access_token", "jti")
+    op.add_column(
+        "access_token",
+        sa.Column("token", sa.String(length=2048), nullable=False),
+    )
@@ -0,0 +1,95 @@
+"""create refresh token and token revocation tables
+
+Revision ID: 5e8b1f4c2d97
+Revises: 3a9d6e2f7c14
+Create Date: 2026-10-19 01:12:44.902317
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5e8b1f4c2d97"
+down_revision: Union[str, None] = "3a9d6e2f7c14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "refresh_token",
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("family_id", sa.String(length=32), nullable=False),
+        sa.Column("token_hash", sa.String(length=64), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("used_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("revoked", sa.Boolean(), server_default="false", nullable=False),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_refresh_token_id"), "refresh_token", ["id"], unique=False)
+    op.create_index(
+        op.f("ix_refresh_token_user_id"), "refresh_token", ["user_id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_refresh_token_family_id"), "refresh_token", ["family_id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_refresh_token_token_hash"),
+        "refresh_token",
+        ["token_hash"],
+        unique=True,
+    )
+    op.create_index(
+        op.f("ix_refresh_token_expires_at"),
+        "refresh_token",
+        ["expires_at"],
+        unique=False,
+    )
+    op.create_table(
+        "token_revocation",
+        sa.Column("kind", sa.String(length=10), nullable=False),
+        sa.Column("key", sa.String(length=36), nullable=False),
+        sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_token_revocation_id"), "token_revocation", ["id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_token_revocation_expires_at"),
+        "token_revocation",
+        ["expires_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_token_revocation_expires_at"), table_name="token_revocation")
+    op.drop_index(op.f("ix_token_revocation_id"), table_name="token_revocation")
+    op.drop_table("token_revocation")
+    op.drop_index(op.f("ix_refresh_token_expires_at"), table_name="refresh_token")
+    op.drop_index(op.f("ix_refresh_token_token_hash"), table_name="refresh_token")
+    op.drop_index(op.f("ix_refresh_token_family_id"), table_name="refresh_token")
+    op.drop_index(op.f("ix_refresh_token_user_id"), table_name="refresh_token")
+    op.drop_index(op.f("ix_refresh_token_id"), table_name="refresh_token")
+    op.drop_table("refresh_token")
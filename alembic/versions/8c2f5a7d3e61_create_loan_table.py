@@ -0,0 +1,154 @@
+"""create loan table from book borrowers
+
+Revision ID: 8c2f5a7d3e61
+Revises: 5e8b1f4c2d97
+Create Date: 2026-10-19 09:41:27.315842
+
+"""
+
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c2f5a7d3e61"
+down_revision: Union[str, None] = "5e8b1f4c2d97"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN = sa.text("returned_at IS NULL")
+# the loan period of the borrowers it replaces
+LOAN_PERIOD = timedelta(days=14)
+
+book = sa.table(
+    "book",
+    sa.column("id", sa.String()),
+    sa.column("borrowers", sa.ARRAY(sa.JSON())),
+)
+loan = sa.table(
+    "loan",
+    sa.column("id", sa.String()),
+    sa.column("book_id", sa.String()),
+    sa.column("user_id", sa.String()),
+    sa.column("borrowed_at", sa.DateTime(timezone=True)),
+    sa.column("due_at", sa.DateTime(timezone=True)),
+    sa.column("returned_at", sa.DateTime(timezone=True)),
+)
+
+
+def parse_due_date(value) -> datetime:
+    try:
+        due_at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now(timezone.utc) + LOAN_PERIOD
+
+    if due_at.tzinfo is None:
+        due_at = due_at.replace(tzinfo=timezone.utc)
+    return due_at
+
+
+def upgrade() -> None:
+    op.create_table(
+        "loan",
+        sa.Column("book_id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("borrowed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("due_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("returned_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("renewals", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["book_id"], ["book.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_loan_id"), "loan", ["id"], unique=False)
+    op.create_index(
+        "ix_loan_book_id_user_id_open",
+        "loan",
+        ["book_id", "user_id"],
+        unique=True,
+        postgresql_where=OPEN,
+    )
+    op.create_index(
+        "ix_loan_user_id_due_at_open",
+        "loan",
+        ["user_id", "due_at"],
+        unique=False,
+        postgresql_where=OPEN,
+    )
+    op.create_index(
+        "ix_loan_due_at_open",
+        "loan",
+        ["due_at"],
+        unique=False,
+        postgresql_where=OPEN,
+    )
+
+    # each borrowers entry becomes an open loan, entries of deleted users and
+    # repeats of a user on the same book are dropped
+    connection = op.get_bind()
+    users = set(connection.execute(sa.text('SELECT id FROM "user"')).scalars())
+    loans = []
+    for book_id, borrowers in connection.execute(
+        sa.select(book.c.id, book.c.borrowers).where(book.c.borrowers.is_not(None))
+    ):
+        seen = set()
+        for entry in borrowers:
+            user = entry.get("user")
+            user_id = user.get("id") if isinstance(user, dict) else user
+            if user_id not in users or user_id in seen:
+                continue
+            seen.add(user_id)
+
+            due_at = parse_due_date(entry.get("due_date"))
+            loans.append(
+                {
+                    "id": str(uuid.uuid4()),
+                    "book_id": book_id,
+                    "user_id": user_id,
+                    "borrowed_at": due_at - LOAN_PERIOD,
+                    "due_at": due_at,
+                    "returned_at": None,
+                }
+            )
+
+    if loans:
+        op.bulk_insert(loan, loans)
+
+    op.drop_column("book", "borrowers")
+
+
+def downgrade() -> None:
+    op.add_column("book", sa.Column("borrowers", sa.ARRAY(sa.JSON()), nullable=True))
+
+    connection = op.get_bind()
+    borrowers = {}
+    for row in connection.execute(
+        sa.select(loan.c.book_id, loan.c.user_id, loan.c.due_at).where(
+            loan.c.returned_at.is_(None)
+        )
+    ):
+        borrowers.setdefault(row.book_id, []).append(
+            {"user": {"id": row.user_id}, "due_date": row.due_at.isoformat()}
+        )
+
+    for book_id, entries in borrowers.items():
+        connection.execute(
+            book.update().where(book.c.id == book_id).values(borrowers=entries)
+        )
+
+    op.drop_index("ix_loan_due_at_open", table_name="loan")
+    op.drop_index("ix_loan_user_id_due_at_open", table_name="loan")
+    op.drop_index("ix_loan_book_id_user_id_open", table_name="loan")
+    op.drop_index(op.f("ix_loan_id"), table_name="loan")
+    op.drop_table("loan")
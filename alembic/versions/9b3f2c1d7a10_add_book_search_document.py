@@ -0,0 +1,69 @@
+"""add book search document
+
+Revision ID: 9b3f2c1d7a10
+Revises: 41ffe3ea5240
+Create Date: 2026-10-18 09:12:44.210391
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3f2c1d7a10"
+down_revision: Union[str, None] = "41ffe3ea5240"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "book",
+        sa.Column("search_document", sa.Text(), server_default="", nullable=False),
+    )
+
+    # backfill from the book, its category and its genres
+    op.execute(
+        """
+        UPDATE book SET search_document = concat_ws(
+            ' ',
+            book.title,
+            array_to_string(book.authors, ' '),
+            array_to_string(book.publishers, ' '),
+            (
+                SELECT string_agg(genre.name, ' ')
+                FROM genre
+                JOIN "genreAssociation" ON "genreAssociation".genre_id = genre.id
+                WHERE "genreAssociation".book_id = book.id
+            ),
+            (SELECT category.name FROM category WHERE category.id = book.category_id),
+            replace(book.isbn, '-', '')
+        )
+        """
+    )
+    op.add_column(
+        "book",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('simple', search_document)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_book_search_vector",
+        "book",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_book_search_vector", table_name="book")
+    op.drop_column("book", "search_vector")
+    op.drop_column("book", "search_document")
@@ -0,0 +1,53 @@
+"""create import job table
+
+Revision ID: a1d4f7c93e08
+Revises: e58c0b7a2f16
+Create Date: 2026-10-20 09:14:52.307126
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a1d4f7c93e08"
+down_revision: Union[str, None] = "e58c0b7a2f16"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "import_job",
+        sa.Column("user_id", sa.String(), nullable=True),
+        sa.Column("format", sa.String(length=10), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("processed", sa.Integer(), nullable=False),
+        sa.Column("imported", sa.Integer(), nullable=False),
+        sa.Column("failed", sa.Integer(), nullable=False),
+        sa.Column("errors", sa.JSON(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_import_job_id"), "import_job", ["id"], unique=False)
+    op.create_index(
+        op.f("ix_import_job_expires_at"), "import_job", ["expires_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_import_job_expires_at"), table_name="import_job")
+    op.drop_index(op.f("ix_import_job_id"), table_name="import_job")
+    op.drop_table("import_job")
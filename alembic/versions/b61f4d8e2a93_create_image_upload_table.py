@@ -0,0 +1,66 @@
+"""create image upload table
+
+Revision ID: b61f4d8e2a93
+Revises: 7a3e9c2b1d58
+Create Date: 2026-10-18 20:58:31.772014
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b61f4d8e2a93"
+down_revision: Union[str, None] = "7a3e9c2b1d58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "book",
+        sa.Column(
+            "image_status", sa.String(length=20), server_default="ready", nullable=False
+        ),
+    )
+    op.create_table(
+        "image_upload",
+        sa.Column("book_id", sa.String(), nullable=False),
+        sa.Column("source", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column(
+            "next_attempt_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["book_id"], ["book.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("book_id"),
+    )
+    op.create_index(op.f("ix_image_upload_id"), "image_upload", ["id"], unique=False)
+    op.create_index(
+        "ix_image_upload_status_next_attempt_at",
+        "image_upload",
+        ["status", "next_attempt_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_image_upload_status_next_attempt_at", table_name="image_upload")
+    op.drop_index(op.f("ix_image_upload_id"), table_name="image_upload")
+    op.drop_table("image_upload")
+    op.drop_column("book", "image_status")
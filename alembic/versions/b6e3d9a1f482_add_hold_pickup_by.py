@@ -0,0 +1,46 @@
+"""add pickup deadline to ready holds
+
+Revision ID: b6e3d9a1f482
+Revises: d47a1c9e6b25
+Create Date: 2026-10-19 17:41:08.214305
+
+"""
+
+from datetime import datetime, timezone, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6e3d9a1f482"
+down_revision: Union[str, None] = "d47a1c9e6b25"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HOLD_PICKUP_DAYS = 7
+
+hold = sa.table(
+    "hold",
+    sa.column("status", sa.String()),
+    sa.column("pickup_by", sa.DateTime(timezone=True)),
+)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "hold", sa.Column("pickup_by", sa.DateTime(timezone=True), nullable=True)
+    )
+    op.create_index(op.f("ix_hold_pickup_by"), "hold", ["pickup_by"], unique=False)
+
+    # copies already kept get a full window from now
+    pickup_by = datetime.now(timezone.utc) + timedelta(days=HOLD_PICKUP_DAYS)
+    op.execute(
+        hold.update().where(hold.c.status == "ready").values(pickup_by=pickup_by)
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_hold_pickup_by"), table_name="hold")
+    op.drop_column("hold", "pickup_by")
@@ -0,0 +1,37 @@
+"""add keyset pagination indexes
+
+Revision ID: c4e81a5f03b2
+Revises: 9b3f2c1d7a10
+Create Date: 2026-10-18 10:03:17.552810
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e81a5f03b2"
+down_revision: Union[str, None] = "9b3f2c1d7a10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_book_created_at_id", "book", ["created_at", "id"], unique=False
+    )
+    op.create_index(
+        "ix_user_created_at_id", "user", ["created_at", "id"], unique=False
+    )
+    op.create_index(
+        "ix_genreAssociation_book_id", "genreAssociation", ["book_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_genreAssociation_book_id", table_name="genreAssociation")
+    op.drop_index("ix_user_created_at_id", table_name="user")
+    op.drop_index("ix_book_created_at_id", table_name="book")
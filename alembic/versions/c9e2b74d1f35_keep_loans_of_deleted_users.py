@@ -0,0 +1,37 @@
+"""keep the returned loans of deleted users
+
+Revision ID: c9e2b74d1f35
+Revises: a1d4f7c93e08
+Create Date: 2026-10-20 15:41:08.552913
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c9e2b74d1f35"
+down_revision: Union[str, None] = "a1d4f7c93e08"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column("loan", "user_id", existing_type=sa.String(), nullable=True)
+    op.drop_constraint("loan_user_id_fkey", "loan", type_="foreignkey")
+    op.create_foreign_key(
+        "loan_user_id_fkey", "loan", "user", ["user_id"], ["id"], ondelete="SET NULL"
+    )
+
+
+def downgrade() -> None:
+    # the loans of deleted users had been deleted with them
+    op.execute("DELETE FROM loan WHERE user_id IS NULL")
+    op.drop_constraint("loan_user_id_fkey", "loan", type_="foreignkey")
+    op.create_foreign_key(
+        "loan_user_id_fkey", "loan", "user", ["user_id"], ["id"], ondelete="CASCADE"
+    )
+    op.alter_column("loan", "user_id", existing_type=sa.String(), nullable=False)
@@ -0,0 +1,131 @@
+"""create hold table from the reservation queues
+
+Revision ID: d47a1c9e6b25
+Revises: 8c2f5a7d3e61
+Create Date: 2026-10-19 14:06:52.581947
+
+"""
+
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d47a1c9e6b25"
+down_revision: Union[str, None] = "8c2f5a7d3e61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HOLD_EXPIRE_DAYS = 90
+
+association = sa.table(
+    "bookUserAssociation",
+    sa.column("user_id", sa.String()),
+    sa.column("book_id", sa.String()),
+)
+book = sa.table(
+    "book",
+    sa.column("id", sa.String()),
+    sa.column("hold_seq", sa.Integer()),
+)
+hold = sa.table(
+    "hold",
+    sa.column("id", sa.String()),
+    sa.column("book_id", sa.String()),
+    sa.column("user_id", sa.String()),
+    sa.column("seq", sa.Integer()),
+    sa.column("status", sa.String()),
+    sa.column("expires_at", sa.DateTime(timezone=True)),
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "hold",
+        sa.Column("book_id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column(
+            "status", sa.String(length=10), server_default="waiting", nullable=False
+        ),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("ready_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["book_id"], ["book.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_hold_id"), "hold", ["id"], unique=False)
+    op.create_index(op.f("ix_hold_user_id"), "hold", ["user_id"], unique=False)
+    op.create_index(op.f("ix_hold_expires_at"), "hold", ["expires_at"], unique=False)
+    op.create_index("ix_hold_book_id_seq", "hold", ["book_id", "seq"], unique=True)
+    op.create_index(
+        "ix_hold_book_id_user_id", "hold", ["book_id", "user_id"], unique=True
+    )
+    op.add_column(
+        "book",
+        sa.Column("hold_seq", sa.Integer(), server_default="0", nullable=False),
+    )
+
+    # the association had no order, each book's queue is numbered as stored
+    connection = op.get_bind()
+    expires_at = datetime.now(timezone.utc) + timedelta(days=HOLD_EXPIRE_DAYS)
+    holds = []
+    seqs = {}
+    for user_id, book_id in connection.execute(
+        sa.select(association.c.user_id, association.c.book_id)
+    ):
+        seqs[book_id] = seqs.get(book_id, 0) + 1
+        holds.append(
+            {
+                "id": str(uuid.uuid4()),
+                "book_id": book_id,
+                "user_id": user_id,
+                "seq": seqs[book_id],
+                "status": "waiting",
+                "expires_at": expires_at,
+            }
+        )
+
+    if holds:
+        op.bulk_insert(hold, holds)
+    for book_id, seq in seqs.items():
+        connection.execute(
+            book.update().where(book.c.id == book_id).values(hold_seq=seq)
+        )
+
+    op.drop_table("bookUserAssociation")
+
+
+def downgrade() -> None:
+    op.create_table(
+        "bookUserAssociation",
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("book_id", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["book_id"], ["book.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "book_id"),
+    )
+    op.execute(
+        association.insert().from_select(
+            ["user_id", "book_id"], sa.select(hold.c.user_id, hold.c.book_id)
+        )
+    )
+
+    op.drop_column("book", "hold_seq")
+    op.drop_index("ix_hold_book_id_user_id", table_name="hold")
+    op.drop_index("ix_hold_book_id_seq", table_name="hold")
+    op.drop_index(op.f("ix_hold_expires_at"), table_name="hold")
+    op.drop_index(op.f("ix_hold_user_id"), table_name="hold")
+    op.drop_index(op.f("ix_hold_id"), table_name="hold")
+    op.drop_table("hold")
@@ -0,0 +1,42 @@
+"""create cache version table
+
+Revision ID: e2a7d4b9c815
+Revises: c4e81a5f03b2
+Create Date: 2026-10-18 11:26:02.918344
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a7d4b9c815"
+down_revision: Union[str, None] = "c4e81a5f03b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cache_version",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_index(op.f("ix_cache_version_id"), "cache_version", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_cache_version_id"), table_name="cache_version")
+    op.drop_table("cache_version")
@@ -0,0 +1,38 @@
+"""add overdue fine to loans, drop book fine_details
+
+Revision ID: e58c0b7a2f16
+Revises: b6e3d9a1f482
+Create Date: 2026-10-19 21:12:37.460913
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e58c0b7a2f16"
+down_revision: Union[str, None] = "b6e3d9a1f482"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "loan", sa.Column("fine", sa.Integer(), server_default="0", nullable=False)
+    )
+    op.create_index(op.f("ix_loan_user_id"), "loan", ["user_id"], unique=False)
+    # only pages written from now on keep the free space, a VACUUM FULL of
+    # loan in a maintenance window rewrites the existing ones
+    op.execute("ALTER TABLE loan SET (fillfactor = 50)")
+    # nothing ever wrote it, the fines are charged to the loans from now on
+    op.drop_column("book", "fine_details")
+
+
+def downgrade() -> None:
+    op.add_column("book", sa.Column("fine_details", sa.JSON(), nullable=True))
+    op.execute("ALTER TABLE loan RESET (fillfactor)")
+    op.drop_index(op.f("ix_loan_user_id"), table_name="loan")
+    op.drop_column("loan", "fine")
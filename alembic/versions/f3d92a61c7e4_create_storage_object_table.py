@@ -0,0 +1,52 @@
+"""create storage object table
+
+Revision ID: f3d92a61c7e4
+Revises: b61f4d8e2a93
+Create Date: 2026-10-18 21:36:12.408157
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f3d92a61c7e4"
+down_revision: Union[str, None] = "b61f4d8e2a93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "storage_object",
+        sa.Column("backend", sa.String(length=20), nullable=False),
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("url", sa.String(length=1024), nullable=False),
+        sa.Column("content_type", sa.String(length=100), nullable=True),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_storage_object_id"), "storage_object", ["id"], unique=False
+    )
+    op.create_index(
+        "ix_storage_object_backend_key",
+        "storage_object",
+        ["backend", "key"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_storage_object_backend_key", table_name="storage_object")
+    op.drop_index(op.f("ix_storage_object_id"), table_name="storage_object")
+    op.drop_table("storage_object")
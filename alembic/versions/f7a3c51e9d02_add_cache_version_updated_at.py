@@ -0,0 +1,45 @@
+"""add cache_version updated_at, principal versions per user
+
+Revision ID: f7a3c51e9d02
+Revises: c9e2b74d1f35
+Create Date: 2026-10-21 10:27:44.918305
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f7a3c51e9d02"
+down_revision: Union[str, None] = "c9e2b74d1f35"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "cache_version",
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.create_index(
+        op.f("ix_cache_version_updated_at"),
+        "cache_version",
+        ["updated_at"],
+        unique=False,
+    )
+    # principal revocations are versioned per user from now on
+    op.execute("DELETE FROM cache_version WHERE name = 'principal'")
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM cache_version WHERE name LIKE 'principal:%'")
+    op.drop_index(op.f("ix_cache_version_updated_at"), table_name="cache_version")
+    op.drop_column("cache_version", "updated_at")
@@ -30,10 +30,22 @@ class AddBookResponseSchema(BaseModel):
     data: BookResponseSchema
 
 
+class PaginatedUsersSchema(BaseModel):
+    count: Optional[int] = None
+    count_type: Optional[str] = None
+    page: Optional[int] = None
+    next: Optional[bool] = None
+    prev: Optional[bool] = None
+    limit: Optional[int] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    results: list[UserResponseSchema]
+
+
 class GetUsersResponse(BaseModel):
     status_code: int = 200
     message: str
-    data: list[UserResponseSchema]
+    data: PaginatedUsersSchema
 
 
 # Response documentatikn
@@ -82,6 +94,48 @@ not_authorized = {
         }
     },
 }
+too_large = {
+    "description": "Content Too Large",
+    "content": {
+        "application/json": {
+            "example": {"status_code": 413, "message": "file is too large"}
+        }
+    },
+}
+unsupported_media_type = {
+    "description": "Unsupported Media Type",
+    "content": {
+        "application/json": {
+            "example": {"status_code": 415, "message": "file is not an image"}
+        }
+    },
+}
+conflict = {
+    "description": "Conflict",
+    "content": {
+        "application/json": {
+            "example": {"status_code": 409, "message": "No copies available"}
+        }
+    },
+}
+too_many_requests = {
+    "description": "Too Many Requests",
+    "headers": {"Retry-After": {"description": "Seconds to wait before a retry"}},
+    "content": {
+        "application/json": {
+            "example": {"status_code": 429, "message": "Too many requests"}
+        }
+    },
+}
+service_unavailable = {
+    "description": "Service Unavailable",
+    "headers": {"Retry-After": {"description": "Seconds to wait before a retry"}},
+    "content": {
+        "application/json": {
+            "example": {"status_code": 503, "message": "Server is busy"}
+        }
+    },
+}
 no_content = {
     "description": "No Content",
     "content": {
@@ -94,16 +148,26 @@ no_content = {
 register_responses = {
     400: bad_request,
     422: validation_error,
+    429: too_many_requests,
+    503: service_unavailable,
 }
 
 login_responses = {
     400: bad_request,
     404: not_found,
     422: validation_error,
+    429: too_many_requests,
+    503: service_unavailable,
+}
+refresh_responses = {
+    401: not_authorized,
+    422: validation_error,
 }
 email_verify_responses = {
     400: bad_request,
     422: validation_error,
+    429: too_many_requests,
+    503: service_unavailable,
 }
 update_responses = {403: forbidden, 422: validation_error, 401: not_authorized}
 
@@ -114,8 +178,23 @@ get_users_responses = {401: not_authorized, 403: forbidden}
 delete_responses = {
     204: no_content,
     404: not_found,
+    409: conflict,
     422: validation_error,
 }
 
 # book docs
 add_book_responses = {401: not_authorized, 403: forbidden, 422: validation_error}
+upload_book_responses = {
+    **add_book_responses,
+    400: bad_request,
+    413: too_large,
+    415: unsupported_media_type,
+}
+import_responses = {401: not_authorized, 403: forbidden, 413: too_large}
+import_job_responses = {401: not_authorized, 403: forbidden, 404: not_found}
+loan_responses = {
+    400: bad_request,
+    401: not_authorized,
+    404: not_found,
+    409: conflict,
+}
@@ -1,6 +1,15 @@
 from api.v1.models.user import User
 from api.v1.models.book import Book
+from api.v1.models.loan import Loan
+from api.v1.models.hold import Hold
 from api.v1.models.genre import Genre
 from api.v1.models.category import Category
 from api.v1.models.access_token import AccessToken
+from api.v1.models.refresh_token import RefreshToken
+from api.v1.models.token_revocation import TokenRevocation
 from api.v1.models.otp import Otp
+from api.v1.models.cache_version import CacheVersion
+from api.v1.models.email_outbox import EmailOutbox
+from api.v1.models.image_upload import ImageUpload
+from api.v1.models.storage_object import StorageObject
+from api.v1.models.import_job import ImportJob
@@ -5,21 +5,26 @@ from datetime import datetime
 
 
 class AccessToken(AbstractBaseModel):
+    """An issued access token, found by the jti claim of the JWT. The token
+    itself is never stored."""
 
     __tablename__ = "access_token"
 
-    user_id: Mapped[str] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
+    user_id: Mapped[str] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), index=True
+    )
     user = relationship("User", back_populates="access_token")
-    token: Mapped[str] = mapped_column(String(2048))
+    jti: Mapped[str] = mapped_column(String(32), unique=True, index=True)
+    # the reaper deletes expired rows in batches
     expiry_time: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False
+        DateTime(timezone=True), nullable=False, index=True
     )
     blacklisted: Mapped[bool] = mapped_column(
         Boolean(), server_default="false", default=False
     )
 
     def __repr__(self) -> str:
-        return self.token
+        return self.jti
 
     def is_expired(self) -> bool:
         return datetime.utcnow() > self.expiry_time
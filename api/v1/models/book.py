@@ -1,10 +1,21 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, DateTime, Integer, ForeignKey, Table, Column, ARRAY, JSON
+from sqlalchemy import (
+    String,
+    Text,
+    DateTime,
+    Integer,
+    ForeignKey,
+    Table,
+    Column,
+    ARRAY,
+    Index,
+    Computed,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.mutable import MutableList
 from api.v1.models.abstract_base_model import AbstractBaseModel
-from api.v1.schemas.user import BookUserSchema
 from api.v1.utils.database import Base
-from datetime import datetime, timedelta
+from typing import Optional
 
 BookGenreAssociation = Table(
     "genreAssociation",
@@ -15,22 +26,41 @@ BookGenreAssociation = Table(
     Column(
         "book_id", String, ForeignKey("book.id", ondelete="CASCADE"), primary_key=True
     ),
+    # the primary key leads with genre_id, loading the genres of a page of
+    # books needs its own index
+    Index("ix_genreAssociation_book_id", "book_id"),
 )
 
-BookUserAssociation = Table(
-    "bookUserAssociation",
-    Base.metadata,
-    Column(
-        "user_id", String, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
-    ),
-    Column(
-        "book_id", String, ForeignKey("book.id", ondelete="CASCADE"), primary_key=True
-    ),
-)
+def build_search_document(
+    title: str | None,
+    authors: list[str] | None,
+    publishers: list[str] | None,
+    genres: list[str] | None,
+    category: str | None,
+    isbn: str | None,
+) -> str:
+    """Text indexed by the catalog search for a book."""
+
+    parts = [title or ""]
+    parts.extend(authors or [])
+    parts.extend(publishers or [])
+    parts.extend(genres or [])
+    if category:
+        parts.append(category)
+    if isbn:
+        parts.append(isbn.replace("-", ""))
+
+    return " ".join(part for part in parts if part)
 
 
 class Book(AbstractBaseModel):
     __tablename__ = "book"
+    __table_args__ = (
+        # Keyset pagination seeks on (created_at, id)
+        Index("ix_book_created_at_id", "created_at", "id"),
+        # Full-text index over the search document
+        Index("ix_book_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     title: Mapped[str] = mapped_column(String(100), unique=True, index=True)
     authors: Mapped[list[str]] = mapped_column(
@@ -40,6 +70,13 @@ class Book(AbstractBaseModel):
         MutableList.as_mutable(ARRAY(String(100)))
     )
     image: Mapped[str] = mapped_column(String(1024))
+    # "pending" while the cover waits in the image_upload queue, then "ready"
+    # or "failed"
+    image_status: Mapped[str] = mapped_column(
+        String(20), default="ready", server_default="ready"
+    )
+    # storage key of the image, its variants are derived from it
+    image_key: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     year: Mapped[int]
     isbn: Mapped[str] = mapped_column(String, unique=True)
     category_id: Mapped[str] = mapped_column(ForeignKey("category.id"))
@@ -52,60 +89,40 @@ class Book(AbstractBaseModel):
     )
     copies_available: Mapped[int] = mapped_column(default=0, nullable=False)
     total_copies: Mapped[int] = mapped_column(default=0)
-    borrowers: Mapped[list[dict]] = mapped_column(
-        MutableList.as_mutable(ARRAY(JSON)), nullable=True
-    )
-    reservation_queue: Mapped[list["User"]] = relationship(
-        "User", secondary=BookUserAssociation, back_populates="queued_users"
-    )
+    # seq of the last hold placed on the book, see Hold
+    hold_seq: Mapped[int] = mapped_column(default=0, server_default="0")
     history: Mapped[list[str]] = mapped_column(
         MutableList.as_mutable(ARRAY(String)), nullable=True, default=[]
     )
-    fine_details: Mapped[dict[str, int]] = mapped_column(
-        JSON, default={}, nullable=True
+    search_document: Mapped[str] = mapped_column(
+        Text, default="", server_default="", nullable=False, deferred=True
+    )
+    # stored so ranking does not re-parse the document of every match
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR(),
+        Computed("to_tsvector('simple', search_document)", persisted=True),
+        deferred=True,
     )
 
     # Model methods
 
-    def update_copies(self, num_copies: int):
-        if self.copies_available is None:
-            self.copies_available = 0
-        if self.total_copies is None:
-            self.total_copies = 0
-        self.copies_available += num_copies
-        self.total_copies += num_copies
+    def refresh_search_document(
+        self, genres: list[str] | None = None, category: str | None = None
+    ):
+        """Rebuild the text indexed by the catalog search from the book, its
+        genres and its category. Must be called whenever any of them change.
+        Genre and category names default to the loaded relationships."""
+
+        if genres is None:
+            genres = [genre.name for genre in self.genre]
+        if category is None and self.category is not None:
+            category = self.category.name
+
+        self.search_document = build_search_document(
+            self.title, self.authors, self.publishers, genres, category, self.isbn
+        )
 
     @property
     def is_available(self):
         return self.copies_available > 0
 
-    def reserve_book(self, user: BookUserSchema):
-        if not self.is_available():
-            self.reservation_queue.append(user)
-            return True
-        else:
-            return False
-
-    def borrow_book(self, user: BookUserSchema):
-        if self.is_available():
-            self.copies_available -= 1
-            self.borrowers.append({"user": user, "due_date": self.calculate_due_date()})
-
-            return f"{user.username} borrowed {self.title}"
-        else:
-            self.reserve_book(user)
-            return f"{self.title} not available for borrowing. {self.user} added to reservation"
-
-    def return_book(self, user: BookUserSchema):
-        if any(borrower[user] == user for borrower in self.borrowers):
-            self.copies_available += 1
-            self.borrowers = [
-                borrower for borrower in self.borrowers if borrower[user] != user
-            ]
-
-            return f"{user.username} returned {self.title}"
-        else:
-            return f"{user.username} did not borrow this book"
-
-    def calculate_due_date(self):
-        return datetime.now() + timedelta(days=14)
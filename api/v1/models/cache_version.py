@@ -0,0 +1,39 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column, Session
+from sqlalchemy import DateTime, String, Integer, func, select, update
+from api.v1.models.abstract_base_model import AbstractBaseModel
+from api.v1.utils.upsert import insert_ignore
+
+
+class CacheVersion(AbstractBaseModel):
+    """Version stamp of an in-process cache, shared by every worker. Writers
+    bump it, readers drop their local copy when it moves."""
+
+    __tablename__ = "cache_version"
+
+    name: Mapped[str] = mapped_column(String(50), unique=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # when the stamp last moved, for readers following many stamps
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+    @classmethod
+    def current(cls, db: Session, name: str) -> int | None:
+        return db.scalar(select(cls.version).where(cls.name == name))
+
+    @classmethod
+    def bump(cls, db: Session, name: str) -> int:
+        """Move a stamp in the caller's transaction, creating it if needed,
+        and return its new version."""
+
+        db.execute(insert_ignore(cls, ["name"]), [{"name": name, "version": 0}])
+        return db.scalar(
+            update(cls)
+            .where(cls.name == name)
+            .values(version=cls.version + 1, updated_at=func.clock_timestamp())
+            .returning(cls.version)
+        )
+
+    def __str__(self):
+        return f"{self.name}@{self.version}"
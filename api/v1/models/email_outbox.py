@@ -0,0 +1,33 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Text, Integer, DateTime, Index, func
+from api.v1.models.abstract_base_model import AbstractBaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class EmailOutbox(AbstractBaseModel):
+    """Email waiting to be sent. Rows are written in the transaction that
+    needs the mail and drained by the outbox worker, status is "pending",
+    "sent" or "dead" once the attempts are exhausted."""
+
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # the worker polls for due pending rows
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    recipient: Mapped[str] = mapped_column(String(225))
+    subject: Mapped[str] = mapped_column(String(255))
+    body: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
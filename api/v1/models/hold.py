@@ -0,0 +1,47 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, DateTime, Integer, String, Index
+from typing import Optional
+from api.v1.models.abstract_base_model import AbstractBaseModel
+from datetime import datetime
+
+
+class Hold(AbstractBaseModel):
+    """A user's place in the queue of a book, ordered by seq.
+
+    A waiting hold lapses at expires_at. When a copy comes back the head of
+    the queue becomes ready, the copy is kept for it until pickup_by and
+    then passes to the next in line. Holds are deleted once borrowed,
+    cancelled or lapsed, the table only holds the current queues.
+    """
+
+    __tablename__ = "hold"
+    __table_args__ = (
+        # the queue of a book in order, its head is the first entry
+        Index("ix_hold_book_id_seq", "book_id", "seq", unique=True),
+        # one hold per user and book
+        Index("ix_hold_book_id_user_id", "book_id", "user_id", unique=True),
+    )
+
+    book_id: Mapped[str] = mapped_column(ForeignKey("book.id", ondelete="CASCADE"))
+    user_id: Mapped[str] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), index=True
+    )
+    # taken from the book's hold_seq counter, increasing within a book
+    seq: Mapped[int] = mapped_column(Integer)
+    # "waiting" in the queue, "ready" once a copy is kept for the user
+    status: Mapped[str] = mapped_column(
+        String(10), default="waiting", server_default="waiting"
+    )
+    # when a waiting hold lapses, the reaper deletes it in batches
+    expires_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), index=True
+    )
+    ready_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # when the copy kept for a ready hold passes on, set only on ready holds
+    # so the pickup timers are rebuilt from this index
+    pickup_by: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), index=True
+    )
+
+    def __repr__(self) -> str:
+        return f"{self.book_id} #{self.seq}: {self.user_id}"
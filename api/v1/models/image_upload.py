@@ -0,0 +1,33 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Text, Integer, DateTime, ForeignKey, Index, func
+from api.v1.models.abstract_base_model import AbstractBaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class ImageUpload(AbstractBaseModel):
+    """Cover image waiting to be uploaded for a book. Rows are written in the
+    transaction that creates or updates the book and drained by the upload
+    worker, status is "pending" or "failed" once the attempts are exhausted.
+    The row is deleted when the upload succeeds."""
+
+    __tablename__ = "image_upload"
+    __table_args__ = (
+        # the worker polls for due pending rows
+        Index("ix_image_upload_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    # one upload per book, a newer image replaces the queued one
+    book_id: Mapped[str] = mapped_column(
+        ForeignKey("book.id", ondelete="CASCADE"), unique=True
+    )
+    source: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    def __str__(self):
+        return f"image of {self.book_id} ({self.status})"
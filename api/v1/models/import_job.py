@@ -0,0 +1,31 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Integer, DateTime, JSON, ForeignKey
+from api.v1.models.abstract_base_model import AbstractBaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class ImportJob(AbstractBaseModel):
+    """Progress of a bulk book import, written with each batch so any worker
+    can report it. status is "running", "completed" or "failed". The reaper
+    deletes the job at expires_at."""
+
+    __tablename__ = "import_job"
+
+    user_id: Mapped[Optional[str]] = mapped_column(
+        ForeignKey("user.id", ondelete="SET NULL"), nullable=True
+    )
+    format: Mapped[str] = mapped_column(String(10))
+    status: Mapped[str] = mapped_column(String(20), default="running")
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    imported: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    # the first IMPORT_MAX_ERRORS row errors, {"row": ..., "message": ...}
+    errors: Mapped[list[dict]] = mapped_column(JSON, default=list)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+
+    def __str__(self):
+        return f"import {self.id} ({self.status})"
@@ -0,0 +1,61 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, DateTime, Integer, Index, DDL, event, text
+from typing import Optional
+from api.v1.models.abstract_base_model import AbstractBaseModel
+from datetime import datetime
+
+# open loans are the ones not returned yet, the partial indexes below only
+# hold those so they stay the size of the circulation, not of its history
+OPEN = text("returned_at IS NULL")
+
+
+class Loan(AbstractBaseModel):
+    """One copy of a book lent to a user, from borrowed_at until returned_at.
+    Returned loans stay as the circulation history, with no user once theirs
+    is deleted. A user with open loans cannot be deleted."""
+
+    __tablename__ = "loan"
+    __table_args__ = (
+        # active loans of a book, and at most one of them per user
+        Index(
+            "ix_loan_book_id_user_id_open",
+            "book_id",
+            "user_id",
+            unique=True,
+            postgresql_where=OPEN,
+        ),
+        # open loans of a user, soonest due first
+        Index(
+            "ix_loan_user_id_due_at_open",
+            "user_id",
+            "due_at",
+            postgresql_where=OPEN,
+        ),
+        # overdue loans
+        Index("ix_loan_due_at_open", "due_at", postgresql_where=OPEN),
+    )
+
+    book_id: Mapped[str] = mapped_column(ForeignKey("book.id", ondelete="CASCADE"))
+    user_id: Mapped[Optional[str]] = mapped_column(
+        ForeignKey("user.id", ondelete="SET NULL"), index=True
+    )
+    borrowed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    due_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    returned_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    renewals: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # overdue fine in cents, charged by the fine service while the loan is
+    # open and final once returned
+    fine: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+    def __repr__(self) -> str:
+        return f"{self.book_id} -> {self.user_id}"
+
+
+# The fine pass rewrites every overdue loan each night. Half of each page is
+# left free so the new versions stay on it (HOT updates) and no index entry is
+# written, which is also why no index may cover fine
+event.listen(
+    Loan.__table__,
+    "after_create",
+    DDL("ALTER TABLE loan SET (fillfactor = 50)").execute_if(dialect="postgresql"),
+)
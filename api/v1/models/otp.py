@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import pyotp
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy import Integer, ForeignKey, DateTime
@@ -11,7 +11,8 @@ class Otp(AbstractBaseModel):
     code: Mapped[int] = mapped_column(Integer, unique=True, nullable=True)
     user_id: Mapped[str] = mapped_column(ForeignKey("user.id"))
     user = relationship("User", back_populates="otpcode")
-    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    # the reaper deletes expired codes in batches
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
 
     def __str__(self):
         return self.code
@@ -19,6 +20,7 @@ class Otp(AbstractBaseModel):
     def generate_otp(self):
         secret = pyotp.random_base32()
         totp = pyotp.TOTP(secret, digits=6, interval=30)
-        self.code = totp.now()
+        # totp returns a string, asyncpg does not coerce it like psycopg2
+        self.code = int(totp.now())
 
-        self.expires_at = datetime.utcnow() + timedelta(minutes=1440)
+        self.expires_at = datetime.now(timezone.utc) + timedelta(minutes=1440)
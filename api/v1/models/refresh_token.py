@@ -0,0 +1,31 @@
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, ForeignKey, DateTime, Boolean
+from typing import Optional
+from api.v1.models.abstract_base_model import AbstractBaseModel
+from datetime import datetime
+
+
+class RefreshToken(AbstractBaseModel):
+    """A refresh token of a stateless session, found by the sha256 of the
+    token, which itself is never stored. Each use marks it used and issues
+    the next one of the same family, the family is the session."""
+
+    __tablename__ = "refresh_token"
+
+    user_id: Mapped[str] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), index=True
+    )
+    user = relationship("User", back_populates="refresh_token")
+    family_id: Mapped[str] = mapped_column(String(32), index=True)
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    # the reaper deletes expired rows in batches
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+    used_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    revoked: Mapped[bool] = mapped_column(
+        Boolean(), server_default="false", default=False
+    )
+
+    def __repr__(self) -> str:
+        return self.family_id
@@ -0,0 +1,25 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Index
+from api.v1.models.abstract_base_model import AbstractBaseModel
+from typing import Optional
+
+
+class StorageObject(AbstractBaseModel):
+    """A file already stored by a storage backend, found by its content key so
+    the same bytes are never uploaded twice."""
+
+    __tablename__ = "storage_object"
+    __table_args__ = (
+        # uploads look keys up in batches, per backend since switching backend
+        # must upload again
+        Index("ix_storage_object_backend_key", "backend", "key", unique=True),
+    )
+
+    backend: Mapped[str] = mapped_column(String(20))
+    # sha256 hex digest, with a suffix for derived files such as variants
+    key: Mapped[str] = mapped_column(String(100))
+    url: Mapped[str] = mapped_column(String(1024))
+    content_type: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+
+    def __str__(self):
+        return f"{self.backend}:{self.key}"
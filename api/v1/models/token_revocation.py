@@ -0,0 +1,24 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, DateTime
+from api.v1.models.abstract_base_model import AbstractBaseModel
+from datetime import datetime
+
+
+class TokenRevocation(AbstractBaseModel):
+    """Revokes stateless access tokens, those of one session (kind "session",
+    key the session id) or those of a user issued up to revoked_at (kind
+    "user", key the user id). Every worker holds the rows in memory, they
+    expire once the tokens they revoke have."""
+
+    __tablename__ = "token_revocation"
+
+    kind: Mapped[str] = mapped_column(String(10))
+    key: Mapped[str] = mapped_column(String(36))
+    revoked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    # the reaper deletes expired rows in batches
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+
+    def __repr__(self) -> str:
+        return f"{self.kind}:{self.key}"
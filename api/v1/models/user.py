@@ -1,14 +1,13 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import String, Enum as SQLAlchemyEnum, func, Boolean, DateTime
+from sqlalchemy import String, Enum as SQLAlchemyEnum, func, Boolean, DateTime, Index
 from api.v1.models.abstract_base_model import AbstractBaseModel
-from api.v1.models.book import BookUserAssociation
 from pydantic import EmailStr
 from enum import Enum
 from typing import Optional
 from datetime import datetime
 
 
-class Role(Enum):
+class Role(str, Enum):
     admin = "admin"
     liberian = "liberian"
     member = "member"
@@ -16,6 +15,13 @@ class Role(Enum):
 
 class User(AbstractBaseModel):
     __tablename__ = "user"
+    __table_args__ = (
+        # Keyset pagination seeks on (created_at, id)
+        Index("ix_user_created_at_id", "created_at", "id"),
+    )
+    # updated_at is set by the database, RETURNING fetches it with the write
+    # instead of a refresh after the commit
+    __mapper_args__ = {"eager_defaults": True}
 
     username: Mapped[str] = mapped_column(
         String(50),
@@ -35,18 +41,15 @@ class User(AbstractBaseModel):
     )
 
     # Relationships
-    queued_users: Mapped[list["Book"]] = relationship(
-        "Book",
-        secondary=BookUserAssociation,
-        back_populates="reservation_queue",
-        cascade="save-update, merge",
-    )
     otpcode: Mapped[int] = relationship(
         "Otp", back_populates="user", cascade="all, delete-orphan", uselist=False
     )
     access_token: Mapped[str] = relationship(
         "AccessToken", back_populates="user", cascade="all, delete-orphan"
     )
+    refresh_token: Mapped[str] = relationship(
+        "RefreshToken", back_populates="user", cascade="all, delete-orphan"
+    )
 
     def __repr__(self) -> str:
         return f"{self.first_name} {self.last_name}: @{self.username}"
@@ -0,0 +1,108 @@
+import os
+import re
+from fastapi import Request, status
+from fastapi.responses import Response
+from api.v1.utils.executors import io_executor
+
+BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an etag."""
+
+    if if_none_match.strip() == "*":
+        return True
+
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in tags
+
+
+def read_range(
+    path: str, byte_range: tuple[str, str] | None
+) -> tuple[int, int, int, bytes | None]:
+    """Read a file, or the (first, last) byte range of a Range header.
+
+    Returns the file size, the first and last byte of the range and their
+    content, None when the range is outside the file. The size is taken from
+    the open file, so a file removed meanwhile raises FileNotFoundError
+    rather than a short read.
+    """
+
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+
+        if byte_range is None:
+            return size, 0, size - 1, file.read()
+
+        first, last = byte_range
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = 0, -1
+
+        if start > end or start >= size:
+            return size, start, end, None
+
+        file.seek(start)
+        return size, start, end, file.read(end - start + 1)
+
+
+async def ranged_file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    etag: str,
+    cache_control: str = "public, max-age=31536000, immutable",
+) -> Response:
+    """
+    Serve a file with conditional GET and single byte range support, read on
+    the io executor.
+
+    Parameters:
+        - request: The request, for its If-None-Match, Range and If-Range headers.
+        - path: The file to serve.
+        - media_type: Content type of the file.
+        - etag: Quoted entity tag of the file content.
+        - cache_control: Cache-Control header of the response.
+
+    Returns:
+        - 304 when the client copy is current, 206 with the requested range,
+          416 when the range is outside the file, otherwise 200 with the file.
+          Raises FileNotFoundError when the file is gone.
+    """
+
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+
+    # several ranges, or a range on a stale copy, get the whole file
+    match = BYTE_RANGE.fullmatch(range_header.strip()) if range_header else None
+    byte_range = None
+    if match and (not if_range or if_range.strip() == etag):
+        byte_range = match.groups()
+
+    size, start, end, content = await io_executor.arun(read_range, path, byte_range)
+
+    if byte_range is None:
+        return Response(content=content, media_type=media_type, headers=headers)
+
+    if content is None:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{size}"},
+        )
+
+    return Response(
+        content=content,
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+    )
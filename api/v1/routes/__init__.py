@@ -3,6 +3,7 @@ from api.v1.routes.auth import accounts
 from api.v1.routes.user import users
 from api.v1.routes.admin import admin
 from api.v1.routes.book import books
+from api.v1.routes.media import media
 
 version_one = APIRouter(prefix="/api/v1")
 
@@ -10,3 +11,4 @@ version_one.include_router(accounts)
 version_one.include_router(users)
 version_one.include_router(admin)
 version_one.include_router(books)
+version_one.include_router(media)
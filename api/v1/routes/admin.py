@@ -1,11 +1,11 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import UUID4
 from fastapi import APIRouter, status, Depends
-from api.v1.utils.dependencies import get_db
+from api.v1.utils.dependencies import get_async_db
 from api.v1.models.user import User
-from api.v1.services.user import user_service
-from api.v1.services.admin import admin_service
-from api.v1.services.book import book_service
+from api.v1.services.user import user_service, async_user_service
+from api.v1.services.admin import admin_service, async_admin_service
+from api.v1.services.book import async_book_service
 from api.v1.schemas.admin import AdminUpdateSchema
 from api.v1.responses.success_responses import success_response
 from api.v1.docs.schemas import (
@@ -25,10 +25,14 @@ admin = APIRouter(prefix="/admin", tags=["admin"])
     responses=get_users_responses,
 )
 async def get_users(
-    db: Session = Depends(get_db), user: User = Depends(admin_service.update_role)
+    page: int = 1,
+    limit: int = 10,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(admin_service.update_role),
 ):
 
-    response = admin_service.fetch_users(db)
+    response = await async_admin_service.fetch_users(db, page, limit, cursor)
 
     return success_response(
         status_code=status.HTTP_200_OK,
@@ -37,6 +41,108 @@ async def get_users(
     )
 
 
+@admin.get("/cache", summary="Cache statistics")
+async def get_cache_stats(user: User = Depends(admin_service.update_role)):
+
+    response = admin_service.cache_stats()
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Cache statistics returned successfully",
+        data=response,
+    )
+
+
+@admin.get("/executors", summary="Executor statistics")
+async def get_executor_stats(user: User = Depends(admin_service.update_role)):
+
+    response = admin_service.executor_stats()
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Executor statistics returned successfully",
+        data=response,
+    )
+
+
+@admin.get("/outbox", summary="Email outbox statistics")
+async def get_outbox_stats(
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(admin_service.update_role),
+):
+
+    response = await async_admin_service.outbox_stats(db)
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Outbox statistics returned successfully",
+        data=response,
+    )
+
+
+@admin.get("/reaper", summary="Expired token reaper statistics")
+async def get_reaper_stats(user: User = Depends(admin_service.update_role)):
+
+    response = admin_service.reaper_stats()
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Reaper statistics returned successfully",
+        data=response,
+    )
+
+
+@admin.get("/activity", summary="Buffered last login statistics")
+async def get_activity_stats(user: User = Depends(admin_service.update_role)):
+
+    response = admin_service.activity_stats()
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Activity statistics returned successfully",
+        data=response,
+    )
+
+
+@admin.get("/admission", summary="Auth rate limiting statistics")
+async def get_admission_stats(user: User = Depends(admin_service.update_role)):
+
+    response = admin_service.admission_stats()
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Admission statistics returned successfully",
+        data=response,
+    )
+
+
+@admin.get("/circulation", summary="Borrow and return statistics")
+async def get_circulation_stats(user: User = Depends(admin_service.update_role)):
+
+    response = admin_service.circulation_stats()
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Circulation statistics returned successfully",
+        data=response,
+    )
+
+
+@admin.get("/uploads", summary="Image upload queue statistics")
+async def get_upload_stats(
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(admin_service.update_role),
+):
+
+    response = await async_admin_service.upload_stats(db)
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Upload statistics returned successfully",
+        data=response,
+    )
+
+
 @admin.patch(
     "/{id}",
     summary="Admin update user",
@@ -47,11 +153,11 @@ async def get_users(
 async def update_user_role(
     id: str,
     schema: AdminUpdateSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(admin_service.update_role),
 ):
 
-    response = user_service.update(db, schema, user, id)
+    response = await async_user_service.update(db, schema, user, id)
 
     return success_response(
         status_code=status.HTTP_200_OK, message="Updated successfully", data=response
@@ -62,10 +168,10 @@ async def update_user_role(
 @admin.delete("/{id}}", summary="Admin delete book")
 async def delete_book(
     id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(admin_service.update_role),
 ):
 
-    book_service.remove(db, id, user)
+    await async_book_service.remove(db, id, user)
 
     return success_response(message="Book remove siccessfully")
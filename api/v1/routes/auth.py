@@ -1,16 +1,23 @@
 from fastapi import APIRouter, status, Depends
-from sqlalchemy.orm import Session
-from api.v1.schemas.user import UserCreateSchema, LoginSchema, EmailVerificationSchema
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.v1.schemas.user import (
+    UserCreateSchema,
+    LoginSchema,
+    EmailVerificationSchema,
+    RefreshTokenSchema,
+)
 from api.v1.docs.schemas import (
     SuccessResponseSchema,
     VerifyResponseSchema,
     register_responses,
     login_responses,
+    refresh_responses,
     email_verify_responses,
 )
 from api.v1.models.user import User
-from api.v1.utils.dependencies import get_db
-from api.v1.services.user import user_service
+from api.v1.utils.dependencies import get_async_db
+from api.v1.services.user import user_service, async_user_service, oauth2_scheme
+from api.v1.services.admission import admission_service
 from api.v1.responses.success_responses import success_response
 
 accounts = APIRouter(prefix="/account", tags=["account"])
@@ -21,10 +28,14 @@ accounts = APIRouter(prefix="/account", tags=["account"])
     status_code=status.HTTP_201_CREATED,
     response_model=VerifyResponseSchema,
     responses=register_responses,
+    dependencies=[Depends(admission_service.admit("register"))],
 )
-async def create_user(schema: UserCreateSchema, db: Session = Depends(get_db)):
+async def create_user(
+    schema: UserCreateSchema, db: AsyncSession = Depends(get_async_db)
+):
+    admission_service.check_register(schema.email)
 
-    response = user_service.create_user(db=db, schema=schema)
+    response = await async_user_service.create_user(db=db, schema=schema)
 
     return success_response(
         status_code=status.HTTP_201_CREATED,
@@ -38,9 +49,12 @@ async def create_user(schema: UserCreateSchema, db: Session = Depends(get_db)):
     status_code=status.HTTP_200_OK,
     response_model=SuccessResponseSchema,
     responses=login_responses,
+    dependencies=[Depends(admission_service.admit("login"))],
 )
-async def login(data: LoginSchema, db: Session = Depends(get_db)):
-    response = user_service.handle_login(
+async def login(data: LoginSchema, db: AsyncSession = Depends(get_async_db)):
+    admission_service.check_login(data.email)
+
+    response = await async_user_service.handle_login(
         db=db, email=data.email, password=data.password
     )
 
@@ -49,12 +63,30 @@ async def login(data: LoginSchema, db: Session = Depends(get_db)):
     )
 
 
+@accounts.post(
+    "/refresh",
+    status_code=status.HTTP_200_OK,
+    response_model=SuccessResponseSchema,
+    responses=refresh_responses,
+)
+async def refresh(schema: RefreshTokenSchema, db: AsyncSession = Depends(get_async_db)):
+    response = await async_user_service.refresh(db, schema.refresh_token)
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Token refreshed successfully",
+        data=response,
+    )
+
+
 @accounts.post("/logout")
 async def logout(
-    user: User = Depends(user_service.get_current_user), db: Session = Depends(get_db)
+    user: User = Depends(user_service.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme),
 ):
 
-    user_service.blacklist_token(db, user)
+    await async_user_service.blacklist_token(db, user, token)
 
     return success_response(
         message="User logged out successfully",
@@ -66,10 +98,13 @@ async def logout(
     status_code=status.HTTP_200_OK,
     response_model=SuccessResponseSchema,
     responses=email_verify_responses,
+    dependencies=[Depends(admission_service.admit("verify_email"))],
 )
-async def verify_email(schema: EmailVerificationSchema, db: Session = Depends(get_db)):
+async def verify_email(
+    schema: EmailVerificationSchema, db: AsyncSession = Depends(get_async_db)
+):
 
-    data = user_service.verify_otp_code(db, schema.code)
+    data = await async_user_service.verify_otp_code(db, schema.code)
 
     return success_response(
         status_code=status.HTTP_200_OK, message="Email verified successfully", data=data
@@ -1,12 +1,25 @@
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, status, Depends
-from api.v1.utils.dependencies import get_db
+from typing import Literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, status, Depends, Request
+from fastapi.responses import StreamingResponse
+from api.v1.utils.dependencies import get_async_db
 from api.v1.services.user import user_service
-from api.v1.services.book import book_service
+from api.v1.services.book import book_service, async_book_service
+from api.v1.services.book_import import book_import_service, async_book_import_service
+from api.v1.services.loan import async_loan_service
+from api.v1.services.hold import async_hold_service
 from api.v1.models.user import User
 from api.v1.schemas.book import AddBookSchema, UpdateBookSchema
 from api.v1.responses.success_responses import success_response
-from api.v1.docs.schemas import AddBookResponseSchema, add_book_responses
+from api.v1.utils.uploads import parse_image_form
+from api.v1.docs.schemas import (
+    AddBookResponseSchema,
+    add_book_responses,
+    upload_book_responses,
+    import_responses,
+    import_job_responses,
+    loan_responses,
+)
 
 
 books = APIRouter(prefix="/books", tags=["book"])
@@ -20,11 +33,44 @@ books = APIRouter(prefix="/books", tags=["book"])
 )
 async def add_book(
     schema: AddBookSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(user_service.get_current_user),
+):
+
+    response = await async_book_service.add_book(db, user, schema)
+
+    return success_response(
+        status_code=status.HTTP_201_CREATED,
+        message="Book successfully added",
+        data=response,
+    )
+
+
+@books.post(
+    "/upload",
+    status_code=status.HTTP_201_CREATED,
+    response_model=AddBookResponseSchema,
+    responses=upload_book_responses,
+)
+async def add_book_upload(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(user_service.get_current_user),
 ):
+    """POST /books with a multipart/form-data body: the book fields as form
+    fields, authors, publishers and genre repeated for each value, and the
+    cover as a jpeg, png, gif or webp file in the `image` field. The file is
+    streamed to a size capped temporary file instead of being read into
+    memory like a base64 image in a json body."""
 
-    response = book_service.add_book(db, user, schema)
+    form = await parse_image_form(request.headers, request.stream(), "image")
+    try:
+        schema = book_service.form_schema(form.fields, form.file is not None)
+        response = await async_book_service.add_book(
+            db, user, schema, form.file, form.content_type
+        )
+    finally:
+        form.close()
 
     return success_response(
         status_code=status.HTTP_201_CREATED,
@@ -32,15 +78,87 @@ async def add_book(
         data=response,
     )
 
+
+@books.post(
+    "/import", status_code=status.HTTP_202_ACCEPTED, responses=import_responses
+)
+async def import_books(
+    request: Request,
+    format: Literal["csv", "ndjson"] | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(user_service.get_current_user),
+):
+    """Bulk import books from a csv (with a header row, list values separated
+    by "|") or ndjson request body. The job is returned once the body is
+    read and the rows are written in batches in the background; poll
+    GET /books/import/{job_id} for progress, rows that fail are reported in
+    the job errors."""
+
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type else "csv"
+
+    response = await book_import_service.start(db, user, request.stream(), format)
+
+    return success_response(
+        status_code=status.HTTP_202_ACCEPTED,
+        message="Books import started",
+        data=response,
+    )
+
+
+@books.get("/import/{job_id}", responses=import_job_responses)
+async def get_import_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(user_service.get_current_user),
+):
+
+    response = await async_book_import_service.get_job(db, user, job_id)
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Import job successfully returned",
+        data=response,
+    )
+
+
+@books.get("/export")
+async def export_books(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    search: str = "",
+    category: str = "",
+    user: User = Depends(user_service.get_current_user),
+):
+    """Stream the whole catalog, optionally filtered like GET /books."""
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+
+    return StreamingResponse(
+        book_service.export(search, category, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=books.{format}"},
+    )
+
+
 @books.get("")
 async def get_books(
         page: int = 1,
+        limit: int = 10,
+        cursor: str | None = None,
         search: str = "",
         category: str = "",
-        db: Session = Depends(get_db),
+        count: Literal["exact", "estimate", "none"] = "exact",
+        db: AsyncSession = Depends(get_async_db),
         user: User = Depends(user_service.get_current_user)):
+    """Pass `cursor` (empty for the first page) to switch from page/count
+    pagination to keyset pagination with next_cursor/prev_cursor tokens.
+    `count` picks how the total is computed in page mode: a cached exact
+    count, a planner estimate, or no count at all."""
 
-    response = book_service.fetch_all(db, search, category, page)
+    response = await async_book_service.fetch_all(
+        db, search, category, page, limit, cursor, count
+    )
 
     return success_response(
             status_code=status.HTTP_200_OK,
@@ -50,10 +168,10 @@ async def get_books(
 @books.get("/{id}")
 async def get_book(
         id: str,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         user: User = Depends(user_service.get_current_user),):
 
-    response = book_service.fetch_one(db, id)
+    response = await async_book_service.fetch_one(db, id)
 
     return success_response(
             status_code=status.HTTP_200_OK,
@@ -70,10 +188,101 @@ async def get_book(
 async def update_book(
     id: str,
     schema: UpdateBookSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(user_service.get_current_user),
 ):
 
-    response = book_service.update(db, id, user, schema)
+    response = await async_book_service.update(db, id, user, schema)
 
     return success_response(message="Book updated successfully", data=response)
+
+
+@books.post(
+    "/{id}/borrow", status_code=status.HTTP_201_CREATED, responses=loan_responses
+)
+async def borrow_book(
+    id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(user_service.get_current_user),
+):
+
+    response = await async_loan_service.borrow(db, id, user)
+
+    return success_response(
+        status_code=status.HTTP_201_CREATED,
+        message="Book borrowed successfully",
+        data=response,
+    )
+
+
+@books.post("/{id}/return", status_code=status.HTTP_200_OK, responses=loan_responses)
+async def return_book(
+    id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(user_service.get_current_user),
+):
+
+    response = await async_loan_service.return_book(db, id, user)
+
+    return success_response(message="Book returned successfully", data=response)
+
+
+@books.post("/{id}/renew", status_code=status.HTTP_200_OK, responses=loan_responses)
+async def renew_book(
+    id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(user_service.get_current_user),
+):
+
+    response = await async_loan_service.renew(db, id, user)
+
+    return success_response(message="Loan renewed successfully", data=response)
+
+
+@books.post("/{id}/hold", status_code=status.HTTP_201_CREATED, responses=loan_responses)
+async def place_hold(
+    id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(user_service.get_current_user),
+):
+
+    response = await async_hold_service.place(db, id, user)
+
+    return success_response(
+        status_code=status.HTTP_201_CREATED,
+        message="Hold placed successfully",
+        data=response,
+    )
+
+
+@books.delete("/{id}/hold", status_code=status.HTTP_200_OK, responses=loan_responses)
+async def cancel_hold(
+    id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(user_service.get_current_user),
+):
+
+    held = await async_hold_service.cancel(db, id, user)
+    # the copy kept for the user went to the next in line or back on the shelf
+    if held == "ready":
+        book_service.invalidate_books(id)
+
+    return success_response(message="Hold cancelled successfully")
+
+
+@books.get("/{id}/queue", status_code=status.HTTP_200_OK)
+async def get_hold_queue(
+    id: str,
+    page: int = 1,
+    limit: int = 10,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(user_service.get_current_user),
+):
+
+    response = await async_hold_service.fetch_queue(db, id, page, limit)
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Hold queue successfully returned",
+        data=response,
+    )
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Request
+from api.v1.services.media import media_service
+from api.v1.utils.images import IMAGE_FORMATS
+from api.v1.responses.file_responses import ranged_file_response
+
+
+media = APIRouter(prefix="/media", tags=["media"])
+
+
+@media.get("/{key}/{name}")
+async def get_image_variant(key: str, name: str, request: Request):
+    """Cover image variant, e.g. /media/{key}/thumb.webp. Public so it can be
+    used in img tags. The url never changes content, responses are cacheable
+    forever and support If-None-Match and Range."""
+
+    variant, _, format = name.partition(".")
+    etag = f'"{key}-{variant}-{format}"'
+    path = await media_service.variant(key, variant, format)
+
+    try:
+        return await ranged_file_response(request, path, IMAGE_FORMATS[format], etag)
+    except FileNotFoundError:
+        # evicted since the lookup, a cache miss
+        path = await media_service.variant(key, variant, format)
+        return await ranged_file_response(request, path, IMAGE_FORMATS[format], etag)
@@ -1,14 +1,17 @@
 from pydantic import UUID4
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, status, Depends
-from api.v1.services.user import user_service
+from api.v1.services.user import user_service, async_user_service
+from api.v1.services.loan import async_loan_service
+from api.v1.services.fine import async_fine_service
 from api.v1.schemas.user import UserUpdateSchema, UserResponseSchema
 from api.v1.models.user import User
-from api.v1.utils.dependencies import get_db
+from api.v1.utils.dependencies import get_async_db
 from api.v1.docs.schemas import (
     SuccessResponseSchema,
     update_responses,
     delete_responses,
+    get_users_responses,
 )
 from api.v1.responses.success_responses import success_response
 
@@ -25,10 +28,10 @@ async def update_user(
     id: UUID4,
     schema: UserUpdateSchema,
     user: User = Depends(user_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
 
-    response = user_service.update(db, schema, user, id)
+    response = await async_user_service.update(db, schema, user, id)
 
     return success_response(
         status_code=status.HTTP_200_OK,
@@ -41,12 +44,48 @@ async def update_user(
 async def delete_user(
     id: UUID4,
     user: User = Depends(user_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
 
-    user_service.delete_user(db, id, user)
+    await async_user_service.delete_user(db, id, user)
 
     return success_response(
         status_code=status.HTTP_200_OK,
         message="User deleted successfully",
     )
+
+
+@users.get("/{id}/loans", status_code=status.HTTP_200_OK, responses=get_users_responses)
+async def get_user_loans(
+    id: str,
+    page: int = 1,
+    limit: int = 10,
+    user: User = Depends(user_service.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+
+    response = await async_loan_service.fetch_open(db, id, user, page, limit)
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Loans successfully returned",
+        data=response,
+    )
+
+
+@users.get("/{id}/fines", status_code=status.HTTP_200_OK, responses=get_users_responses)
+async def get_user_fines(
+    id: str,
+    page: int = 1,
+    limit: int = 10,
+    user: User = Depends(user_service.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+
+    response = await async_fine_service.fetch(db, id, user, page, limit)
+
+    return success_response(
+        status_code=status.HTTP_200_OK,
+        message="Fines successfully returned",
+        data=response,
+    )
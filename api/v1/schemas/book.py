@@ -1,7 +1,8 @@
 from pydantic import BaseModel, ConfigDict
-from api.v1.schemas.user import BookUserSchema
+from datetime import datetime
 from typing import Optional
 from api.v1.models.book import Book
+from api.v1.utils.images import variant_urls
 
 
 class AddBookSchema(BaseModel):
@@ -23,10 +24,10 @@ class BookResponseSchema(AddBookSchema):
 
     id: str
     copies_available: int
-    borrowers: list[dict] | None = None
-    reservation_queue: list[BookUserSchema] | None = None
+    image_status: str = "ready"
+    # thumb and medium covers as webp and jpeg, list pages should use these
+    image_variants: dict[str, dict[str, str]] | None = None
     history: list[str] | None = None
-    fine_details: dict[str, int] | None = None
 
     @classmethod
     def book_payload(cls, book: Book):
@@ -36,6 +37,8 @@ class BookResponseSchema(AddBookSchema):
             authors=book.authors,
             publishers=book.publishers,
             image=book.image,
+            image_status=book.image_status,
+            image_variants=variant_urls(book.image_key),
             year=book.year,
             genre=[genre.name for genre in book.genre],
             isbn=book.isbn,
@@ -55,3 +58,20 @@ class UpdateBookSchema(AddBookSchema):
     year: int | None = None
     isbn: str | None = None
     total_copies: int | None = None
+
+
+class ImportRowErrorSchema(BaseModel):
+    row: int
+    message: str
+
+
+class ImportJobSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    status: str = "running"
+    processed: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: list[ImportRowErrorSchema] = []
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,18 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import Optional
+
+
+class HoldResponseSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    book_id: str
+    user_id: str
+    seq: int
+    status: str
+    # place in the queue counting from 1, set when listing a queue
+    position: Optional[int] = None
+    expires_at: Optional[datetime] = None
+    ready_at: Optional[datetime] = None
+    pickup_by: Optional[datetime] = None
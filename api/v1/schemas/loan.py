@@ -0,0 +1,16 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import Optional
+
+
+class LoanResponseSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    book_id: str
+    user_id: Optional[str] = None
+    borrowed_at: datetime
+    due_at: datetime
+    returned_at: Optional[datetime] = None
+    renewals: int = 0
+    fine: int = 0
@@ -35,6 +35,12 @@ class LoginSchema(BaseModel):
     password: str
 
 
+class RefreshTokenSchema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    refresh_token: str
+
+
 class EmailVerificationSchema(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -0,0 +1,139 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from api.v1.models.user import User
+from api.v1.utils.database import AsyncSessionLocal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two writes of the buffered last_login values, 0 writes them
+# in the login transaction instead of buffering
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get("ACTIVITY_FLUSH_INTERVAL", 5))
+# Users updated per transaction when the buffer is written
+ACTIVITY_FLUSH_BATCH = int(os.environ.get("ACTIVITY_FLUSH_BATCH", 1000))
+
+
+class ActivityService:
+    """Write-behind buffer for user.last_login.
+
+    A login records its time in memory, the user row is not written in the
+    login transaction. Every ACTIVITY_FLUSH_INTERVAL seconds the latest time
+    of each user is written with one executemany UPDATE per batch, in user
+    id order so the flushes of several workers lock rows in the same order.
+    An update never moves last_login backwards.
+
+    last_login in the database lags by up to the interval, and the values
+    still buffered are lost if the process is killed. The buffer is flushed
+    on shutdown.
+    """
+
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.pending: dict[str, datetime] = {}
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def touch(self, db: Session, user: User, at: datetime):
+        """Record a login of user at the given time. The instance shows the
+        new value without being marked as changed."""
+
+        if ACTIVITY_FLUSH_INTERVAL <= 0:
+            user.last_login = at
+            return
+
+        set_committed_value(user, "last_login", at)
+        latest = self.pending.get(user.id)
+        if latest is None or latest < at:
+            self.pending[user.id] = at
+
+    def write_batch(self, db: Session, batch: list[tuple[str, datetime]]):
+        users = User.__table__
+        db.execute(
+            update(users)
+            .where(users.c.id == bindparam("user_id"))
+            .where(
+                or_(
+                    users.c.last_login.is_(None),
+                    users.c.last_login < bindparam("at"),
+                )
+            )
+            .values(last_login=bindparam("at")),
+            [{"user_id": user_id, "at": at} for user_id, at in batch],
+        )
+        db.commit()
+
+    async def flush(self) -> int:
+        """Write the buffered values, returns the number of users updated.
+        Values of a failed batch go back to the buffer."""
+
+        pending, self.pending = self.pending, {}
+        items = sorted(pending.items())
+        written = 0
+
+        async with AsyncSessionLocal() as db:
+            for start in range(0, len(items), ACTIVITY_FLUSH_BATCH):
+                batch = items[start : start + ACTIVITY_FLUSH_BATCH]
+                try:
+                    await db.run_sync(self.write_batch, batch)
+                except BaseException:
+                    self.failures += 1
+                    for user_id, at in items[start:]:
+                        latest = self.pending.get(user_id)
+                        if latest is None or latest < at:
+                            self.pending[user_id] = at
+                    raise
+                written += len(batch)
+
+        if written:
+            self.flushed += written
+            self.flushes += 1
+        return written
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(ACTIVITY_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("last_login flush failed, retrying")
+
+    def start(self):
+        if self.task is None and ACTIVITY_FLUSH_INTERVAL > 0:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("last_login flush failed on shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "running": self.task is not None,
+            "interval": ACTIVITY_FLUSH_INTERVAL,
+            "pending": len(self.pending),
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+        }
+
+
+activity_service = ActivityService()
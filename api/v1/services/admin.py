@@ -1,10 +1,26 @@
 from fastapi import Depends, status, HTTPException
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from api.v1.utils.dependencies import get_db
 from api.v1.models.user import User
 from api.v1.services.user import user_service
 from api.v1.schemas.user import UserResponseSchema
+from api.v1.utils.paginate import paginate_query, cursor_paginate_query, count_cache
+from api.v1.utils.cache import result_caches
+from api.v1.utils.executors import executors
+from api.v1.services.taxonomy import taxonomy_service
+from api.v1.services.email_outbox import email_outbox_service
+from api.v1.services.image_upload import image_upload_service
+from api.v1.services.media import media_service
+from api.v1.services.principal import principal_service
+from api.v1.services.session import session_service
+from api.v1.services.reaper import reaper_service
+from api.v1.services.activity import activity_service
+from api.v1.services.admission import admission_service
+from api.v1.services.loan import loan_service
+from api.v1.services.hold import hold_service
+from api.v1.services.pickup import pickup_service
+from api.v1.services.fine import fine_service
+from api.v1.utils.async_service import AsyncService
 
 
 class AdminService:
@@ -25,10 +41,77 @@ class AdminService:
         return response
 
     # fetch all users
-    def fetch_users(self, db: Session):
-        users = db.query(User).all()
+    def fetch_users(
+        self,
+        db: Session,
+        page: int = 1,
+        limit: int = 10,
+        cursor: str | None = None,
+    ):
+        query = db.query(User)
+
+        if cursor is not None:
+            response = cursor_paginate_query(
+                query, (User.created_at, User.id), cursor, limit
+            )
+        else:
+            query = query.order_by(User.created_at.desc(), User.id.desc())
+            response = paginate_query(db, query, page, limit, count_key=("user", None))
+
+        response["results"] = [
+            UserResponseSchema(**jsonable_encoder(user))
+            for user in response.get("results")
+        ]
+
+        return response
+
+    # hit, miss and eviction counters of the caches of this process
+    def cache_stats(self):
+        stats = {name: cache.stats() for name, cache in result_caches.items()}
+        stats["count"] = count_cache.stats()
+        for model, cache in taxonomy_service.caches.items():
+            stats[model.__tablename__] = cache.stats()
+        stats["media"] = media_service.cache.stats()
+        stats["principal"] = principal_service.stats()
+        stats["revocation"] = session_service.stats()
+
+        return stats
+
+    # load of the io and cpu executors of this process
+    def executor_stats(self):
+        return {executor.name: executor.stats() for executor in executors}
+
+    # outbox rows by status and the counters of this process' worker
+    def outbox_stats(self, db: Session):
+        return email_outbox_service.stats(db)
+
+    # queued image uploads by status and the counters of this process' worker
+    def upload_stats(self, db: Session):
+        return image_upload_service.stats(db)
+
+    # expired rows removed by the reaper of this process
+    def reaper_stats(self):
+        return reaper_service.stats()
+
+    # last_login values buffered by this process and written so far
+    def activity_stats(self):
+        return activity_service.stats()
+
+    # rate limiter counters and auth requests in progress in this process
+    def admission_stats(self):
+        return admission_service.stats()
 
-        return jsonable_encoder(users)
+    # borrows and returns of this process, borrows retried after a conflict
+    # or refused once the retries ran out, holds placed and served, and the
+    # pickup and fine background passes
+    def circulation_stats(self):
+        return {
+            **loan_service.stats(),
+            "holds": hold_service.stats(),
+            "pickup": pickup_service.stats(),
+            "fines": fine_service.stats(),
+        }
 
 
 admin_service = AdminService()
+async_admin_service = AsyncService(admin_service)
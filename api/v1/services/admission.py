@@ -0,0 +1,121 @@
+import os
+import math
+from collections import defaultdict
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+from api.v1.utils.ratelimit import rate_limiter
+
+load_dotenv()
+
+# Requests per client IP over the login, register and verify routes: a burst
+# of AUTH_IP_BURST, refilled by AUTH_IP_RATE a second
+AUTH_IP_BURST = float(os.environ.get("AUTH_IP_BURST", 20))
+AUTH_IP_RATE = float(os.environ.get("AUTH_IP_RATE", 0.2))
+# Login attempts per account in a sliding window of seconds
+LOGIN_ACCOUNT_LIMIT = int(os.environ.get("LOGIN_ACCOUNT_LIMIT", 10))
+LOGIN_ACCOUNT_WINDOW = float(os.environ.get("LOGIN_ACCOUNT_WINDOW", 900))
+# Registrations per email address in a sliding window of seconds, each one
+# sends a mail
+REGISTER_ACCOUNT_LIMIT = int(os.environ.get("REGISTER_ACCOUNT_LIMIT", 3))
+REGISTER_ACCOUNT_WINDOW = float(os.environ.get("REGISTER_ACCOUNT_WINDOW", 3600))
+# Requests of one auth route in progress in a worker, past it they fail with a
+# 503 before any work is done
+AUTH_CONCURRENCY = int(os.environ.get("AUTH_CONCURRENCY", 32))
+# Proxies in front of the app that append to X-Forwarded-For, 0 trusts none
+# and uses the peer address
+RATE_LIMIT_FORWARDED_HOPS = int(os.environ.get("RATE_LIMIT_FORWARDED_HOPS", 0))
+
+# Seconds a client is asked to wait when a route is at its concurrency cap
+CONCURRENCY_RETRY_AFTER = 1
+
+
+class AdmissionService:
+    """Admission control for the auth routes, which run bcrypt and send mail.
+
+    Requests are refused before any of that work, by a token bucket per
+    client IP, a sliding window per account and a cap on the requests of a
+    route in progress. A refused request runs no query and no hash, it gets
+    a 429, or a 503 at the cap, with a Retry-After header.
+
+    The buckets and windows live in rate_limiter(), per process or shared
+    through sqlite, the concurrency caps are always per process.
+    """
+
+    def __init__(self):
+        self.limiter = rate_limiter()
+        self.in_flight: dict[str, int] = defaultdict(int)
+        self.rejected: dict[str, int] = defaultdict(int)
+
+    def client_ip(self, request: Request) -> str:
+        if RATE_LIMIT_FORWARDED_HOPS > 0:
+            forwarded = request.headers.get("x-forwarded-for", "").split(",")
+            if len(forwarded) >= RATE_LIMIT_FORWARDED_HOPS:
+                return forwarded[-RATE_LIMIT_FORWARDED_HOPS].strip()
+
+        return request.client.host if request.client else "unknown"
+
+    def too_many(self, retry_after: float, detail: str):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    def check_ip(self, request: Request, route: str):
+        retry_after = self.limiter.take(
+            f"ip:{self.client_ip(request)}", AUTH_IP_BURST, AUTH_IP_RATE
+        )
+        if retry_after:
+            self.rejected[route] += 1
+            self.too_many(retry_after, "Too many requests, please retry later")
+
+    def check_account(self, route: str, account: str, limit: int, window: float):
+        retry_after = self.limiter.hit(
+            f"{route}:{account.strip().lower()}", limit, window
+        )
+        if retry_after:
+            self.rejected[route] += 1
+            self.too_many(retry_after, "Too many attempts for this account")
+
+    def check_login(self, email: str):
+        self.check_account("login", email, LOGIN_ACCOUNT_LIMIT, LOGIN_ACCOUNT_WINDOW)
+
+    def check_register(self, email: str):
+        self.check_account(
+            "register", email, REGISTER_ACCOUNT_LIMIT, REGISTER_ACCOUNT_WINDOW
+        )
+
+    def admit(self, route: str):
+        """A dependency admitting a request to an auth route: checks the
+        client's bucket and holds one of the route's concurrency slots until
+        the request is done."""
+
+        async def dependency(request: Request):
+            if self.in_flight[route] >= AUTH_CONCURRENCY:
+                self.rejected[route] += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please retry shortly",
+                    headers={"Retry-After": str(CONCURRENCY_RETRY_AFTER)},
+                )
+
+            self.check_ip(request, route)
+
+            self.in_flight[route] += 1
+            try:
+                yield
+            finally:
+                self.in_flight[route] -= 1
+
+        return dependency
+
+    def stats(self) -> dict:
+        return {
+            **self.limiter.stats(),
+            "concurrency": AUTH_CONCURRENCY,
+            "in_flight": dict(self.in_flight),
+            "rejected": dict(self.rejected),
+        }
+
+
+admission_service = AdmissionService()
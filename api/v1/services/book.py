@@ -1,17 +1,73 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import text, any_
+import io
+import os
+import csv
+import json
+from typing import BinaryIO
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import text, any_, case, func, select, update
 from fastapi import HTTPException, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.encoders import jsonable_encoder
 from api.v1.schemas.book import AddBookSchema, BookResponseSchema, UpdateBookSchema
-from api.v1.models.book import Book
-from api.v1.models.user import User
+from api.v1.models.book import Book, BookGenreAssociation
 from api.v1.models.genre import Genre
 from api.v1.models.category import Category
-from api.v1.utils.storage import upload
-from api.v1.utils.paginate import paginate_query
+from api.v1.models.user import User
+from api.v1.utils.database import SessionLocal
+from api.v1.utils.cache import result_cache, invalidate_results
+from api.v1.utils.async_service import AsyncService
+from api.v1.utils.executors import io_executor
+from api.v1.utils.storage import read_source
+from api.v1.utils.images import variant_urls
+from api.v1.utils.paginate import (
+    paginate_query,
+    cursor_paginate_query,
+    count_query,
+    invalidate_counts,
+)
+from api.v1.utils.upsert import insert_ignore
+from api.v1.services.search import search_service
+from api.v1.services.taxonomy import taxonomy_service
+from api.v1.services.image_upload import image_upload_service
+from api.v1.services.book_import import LIST_COLUMNS, LIST_SEPARATOR
+from api.v1.services.hold import hold_service
+
+load_dotenv()
+
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 1000))
+# same columns and order the csv import reads, plus id and copies_available
+EXPORT_COLUMNS = (
+    "id",
+    "title",
+    "authors",
+    "publishers",
+    "image",
+    "year",
+    "genre",
+    "isbn",
+    "category",
+    "total_copies",
+    "copies_available",
+)
 
 
 class BookService:
+    """Book catalog operations.
+
+    fetch_all and fetch_one answer from the "book_list" and "book" result
+    caches. Every write to books must call invalidate_books() once committed.
+    """
+
+    def invalidate_books(self, book_id: str | None = None):
+        """Drop cached listings, and the cached book when one is given. Cached
+        counts are dropped by invalidate_counts in the transaction of the
+        writes that change them."""
+
+        invalidate_results("book_list")
+        if book_id is not None:
+            invalidate_results("book", book_id)
 
     def get_detailed_book(self, db: Session, id: str):
         book = (
@@ -33,12 +89,60 @@ class BookService:
             return True
         return False
 
-    def add_book(self, db: Session, user: User, schema: AddBookSchema):
+    def check_image(self, image: str) -> str:
+        """Key of an image source, see read_source. A data uri is decoded and
+        hashed on the io executor."""
+
+        try:
+            return io_executor.run(read_source, image)[0]
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    def form_schema(
+        self, fields: dict[str, list[str]], has_file: bool
+    ) -> AddBookSchema:
+        """AddBookSchema from multipart form fields. Authors, publishers and
+        genre take every value sent for them, the image is the uploaded file
+        when there is one."""
+
+        data = {
+            name: values if name in LIST_COLUMNS else values[-1]
+            for name, values in fields.items()
+        }
+        if has_file:
+            data["image"] = ""
+
+        try:
+            return AddBookSchema.model_validate(data)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+
+    def add_genres(self, db: Session, book_id: str, genre_ids: list[str]):
+        """Link genres to a book in one statement, skipping existing links."""
+
+        if not genre_ids:
+            return
+
+        db.execute(
+            insert_ignore(BookGenreAssociation, ["genre_id", "book_id"]),
+            [{"book_id": book_id, "genre_id": id} for id in genre_ids],
+        )
+
+    def add_book(
+        self,
+        db: Session,
+        user: User,
+        schema: AddBookSchema,
+        image_file: BinaryIO | None = None,
+        image_type: str | None = None,
+    ):
+        """Add a book. Its image is schema.image, or image_file, an uploaded
+        image of type image_type, when given."""
 
         if user.role == "member":
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                message="you do not have the permission to add book",
+                detail="you do not have the permission to add book",
             )
 
         schema_dict = schema.model_dump()
@@ -48,92 +152,144 @@ class BookService:
         image = schema_dict.pop("image")
         isbn = schema_dict.pop("isbn")
 
-        if not self.get_by_isbn(db, isbn):
+        if image_file is None:
+            key = self.check_image(image)
+
+        if self.get_by_isbn(db, isbn):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Book with the isbn already exist",
             )
 
-        book = Book(**schema_dict)
-
-        # upload image for storage
-        image = upload(image)
-        book.image = image
-
-        book.update_copies(total_copies)
-
-        # add genre
-        for name in genre:
-            genre = db.query(Genre).filter(Genre.name == name).first()
-
-            if not genre:
-                genre = Genre(name=name)
-
-                db.add(genre)
-            book.genre.append(genre)
-
-        # category check
-        category = db.query(Category).filter(Category.name == categoryName).first()
+        # the image is uploaded in the background, see image_upload_service
+        book = Book(
+            **schema_dict,
+            isbn=isbn,
+            image="",
+            total_copies=total_copies,
+            copies_available=total_copies,
+        )
 
-        if not category:
-            category = Category(name=categoryName)
-            db.add(category)
-        book.category = category
+        # resolve genre and category ids through the taxonomy cache
+        genre = genre or []
+        genre_ids = taxonomy_service.genre_ids(db, genre)
+        book.category_id = taxonomy_service.category_id(db, categoryName)
+        book.refresh_search_document(genre, categoryName)
 
         db.add(book)
+        db.flush()
+        self.add_genres(db, book.id, genre_ids)
+        if image_file is None:
+            image_upload_service.enqueue(db, book, image, key)
+        else:
+            image_upload_service.enqueue_file(db, book, image_file, image_type)
+        invalidate_counts(db, "book")
         db.commit()
         db.refresh(book)
+        self.invalidate_books()
+        image_upload_service.notify()
 
         return BookResponseSchema(
-            **jsonable_encoder(book), category=categoryName, genre=schema.genre
+            **jsonable_encoder(book),
+            category=categoryName,
+            genre=schema.genre,
+            image_variants=variant_urls(book.image_key),
         )
 
+    def set_copies(self, db: Session, book_id: str, total_copies: int):
+        """Set the book's total copies, in the caller's transaction. Copies
+        on loan stay on loan, copies added are kept for the hold queue first,
+        see hold_service.release_copies."""
+
+        books = Book.__table__
+        # locks the row, so the copies added are counted from the total the
+        # update replaces
+        current = (
+            select(books.c.id, books.c.total_copies)
+            .where(books.c.id == book_id)
+            .with_for_update()
+            .subquery()
+        )
+        added = total_copies - current.c.total_copies
+        row = db.execute(
+            update(books)
+            .where(books.c.id == current.c.id)
+            .where(books.c.copies_available + added >= 0)
+            .values(
+                total_copies=total_copies,
+                copies_available=case(
+                    (added < 0, books.c.copies_available + added),
+                    else_=books.c.copies_available,
+                ),
+            )
+            .returning(added)
+        ).first()
+
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="total_copies is fewer than the copies on loan",
+            )
+        if row[0] > 0:
+            hold_service.release_copies(db, book_id, row[0])
+
     def update(self, db: Session, book_id: str, user: User, schema: UpdateBookSchema):
 
         schema_dict = schema.model_dump()
         genre = schema_dict.pop("genre")
         categoryName = schema_dict.pop("category")
         total_copies = schema_dict.pop("total_copies")
+        image = schema_dict.pop("image")
 
-        book = db.query(Book).filter(Book.id == book_id).first()
+        book = (
+            db.query(Book)
+            .options(selectinload(Book.genre), joinedload(Book.category))
+            .filter(Book.id == book_id)
+            .first()
+        )
 
         if not book:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Book does not exist"
             )
 
+        # update book copies
+        if total_copies is not None:
+            self.set_copies(db, book.id, total_copies)
+
         for key, value in schema_dict.items():
             if hasattr(book, key):
                 setattr(book, key, value)
 
-        # update book copies
-        book.update_copies(total_copies)
-
-        # add genre
-        for name in genre:
-            genre = db.query(Genre).filter(Genre.name == name).first()
-            if not genre:
-                genre = Genre(name=name)
-                db.add(genre)
-
-            if genre not in book.genre:
-                book.genre.append(genre)
-
-        category = db.query(Category).filter(Category.name == categoryName).first()
-
-        if not category:
-            category = Category(name=categoryName)
-            db.add(category)
-        book.category = category
-
+        # resolve genre and category ids through the taxonomy cache
+        genre = genre or []
+        genre_ids = taxonomy_service.genre_ids(db, genre)
+        if categoryName:
+            book.category_id = taxonomy_service.category_id(db, categoryName)
+
+        genre_names = [item.name for item in book.genre]
+        genre_names.extend(name for name in genre if name not in genre_names)
+        book.refresh_search_document(genre_names, categoryName)
+        self.add_genres(db, book.id, genre_ids)
+
+        # a new image is uploaded in the background, the current one is
+        # served until it is ready
+        if image and image != book.image:
+            key = self.check_image(image)
+            image_upload_service.enqueue(db, book, image, key)
+
+        # the book may move in or out of searches and category filters
+        invalidate_counts(db, "book")
         db.commit()
         db.refresh(book)
+        self.invalidate_books(book.id)
+        image_upload_service.notify()
 
         return BookResponseSchema.book_payload(book)
 
     def remove(self, db: Session, book_id: str, user: User):
         if user.role != "admin":
-            raise HTTPExcpetion(
+            raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You do not have permission to delete a book",
             )
@@ -146,27 +302,71 @@ class BookService:
             )
 
         db.delete(book)
+        invalidate_counts(db, "book")
         db.commit()
+        self.invalidate_books(book_id)
+
+    def filter_books(self, db: Session, query, search: str, category: str):
+        """Apply the catalog search and category filters to a Book query."""
+
+        # full-text match on title, authors, publishers, genre, category and
+        # isbn
+        query = search_service.apply(db, query, search)
+
+        if category != "":
+            category_id = taxonomy_service.category_id(db, category, create=False)
+            query = query.filter(Book.category_id == category_id)
+
+        return query
 
     def fetch_all(
-        self, db: Session, search: str = "", category: str = "", page: int = 1
+        self,
+        db: Session,
+        search: str = "",
+        category: str = "",
+        page: int = 1,
+        limit: int = 10,
+        cursor: str | None = None,
+        count: str = "exact",
     ):
+        tokens = tuple(search_service.tokenize(search))
+        if cursor is not None:
+            key = (tokens, category, limit, cursor)
+        else:
+            key = (tokens, category, limit, page, count)
+
+        cache = result_cache("book_list")
+        generation = cache.generation
+        response = cache.get(key)
+        if response is not None:
+            return response
+
         query = db.query(Book).options(
             joinedload(Book.genre), joinedload(Book.category)
         )
 
-        if search != "":
-            query = query.filter(
-                Book.authors.any(str(search)) 
-                | Book.title.icontains(search)
-                | Book.isbn.icontains(search)
-            )
-
-        if category != "":
-            category = db.query(Category).filter(Category.name == category).first()
-            query = query.filter(Book.category == category)
+        # the ranking matches the search on its own, it is given the query
+        # without it
+        filtered = self.filter_books(db, query, "", category)
+        query = search_service.apply(db, filtered, search)
+        count_key = ("book", (tokens, category))
 
-        response = paginate_query(db, query, page)
+        # Cursor pages are ordered by the keyset instead of relevance
+        if cursor is not None:
+            response = cursor_paginate_query(
+                query, (Book.created_at, Book.id), cursor, limit
+            )
+        elif tokens:
+            # the ranking picks its plan by the number of matches, this exact
+            # count is the cached one paginate_query reads again
+            total, _ = count_query(db, query, "exact", count_key)
+            fetch = search_service.ranked(db, filtered, search, total)
+            response = paginate_query(
+                db, query, page, limit, count, count_key, fetch=fetch
+            )
+        else:
+            query = query.order_by(Book.created_at.desc(), Book.id.desc())
+            response = paginate_query(db, query, page, limit, count, count_key)
 
         data = [
             BookResponseSchema.book_payload(book) for book in response.get("results")
@@ -174,9 +374,19 @@ class BookService:
 
         response["results"] = data
 
+        # cached already encoded, a hit then skips the payload construction
+        response = jsonable_encoder(response)
+        cache.set(key, response, generation=generation)
+
         return response
 
     def fetch_one(self, db: Session, book_id: str):
+        cache = result_cache("book")
+        generation = cache.generation
+        response = cache.get(book_id)
+        if response is not None:
+            return response
+
         book = (
             db.query(Book)
             .filter(Book.id == book_id)
@@ -189,8 +399,73 @@ class BookService:
                 status_code=status.HTTP_404_NOT_FOUND, detail="Book does not exist"
             )
 
-        response = BookResponseSchema.book_payload(book)
+        response = jsonable_encoder(BookResponseSchema.book_payload(book))
+        cache.set(book_id, response, generation=generation)
+
         return response
 
+    def export(self, search: str = "", category: str = "", format: str = "ndjson"):
+        """Yield the catalog as ndjson or csv lines, filtered like fetch_all.
+
+        Rows are read through a server-side cursor in chunks of EXPORT_CHUNK_SIZE
+        and only the exported columns are selected, so memory stays constant
+        whatever the catalog size. The generator owns its session because the
+        response outlives the request dependencies."""
+
+        with SessionLocal() as db:
+            genres = (
+                select(func.string_agg(Genre.name, LIST_SEPARATOR))
+                .join(BookGenreAssociation, BookGenreAssociation.c.genre_id == Genre.id)
+                .where(BookGenreAssociation.c.book_id == Book.id)
+                .scalar_subquery()
+            )
+
+            query = db.query(
+                Book.id,
+                Book.title,
+                Book.authors,
+                Book.publishers,
+                Book.image,
+                Book.year,
+                genres.label("genre"),
+                Book.isbn,
+                Category.name.label("category"),
+                Book.total_copies,
+                Book.copies_available,
+            ).join(Category, Category.id == Book.category_id)
+
+            query = self.filter_books(db, query, search, category)
+            query = query.order_by(Book.created_at, Book.id).yield_per(
+                EXPORT_CHUNK_SIZE
+            )
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if format == "csv":
+                writer.writerow(EXPORT_COLUMNS)
+
+            # one chunk per EXPORT_CHUNK_SIZE rows rather than one per row
+            for number, row in enumerate(query, start=1):
+                record = row._asdict()
+                record["genre"] = (
+                    record["genre"].split(LIST_SEPARATOR) if record["genre"] else []
+                )
+
+                if format == "csv":
+                    for column in LIST_COLUMNS:
+                        record[column] = LIST_SEPARATOR.join(record[column] or [])
+                    writer.writerow([record[column] for column in EXPORT_COLUMNS])
+                else:
+                    buffer.write(json.dumps(record) + "\n")
+
+                if number % EXPORT_CHUNK_SIZE == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+
+            if buffer.tell():
+                yield buffer.getvalue()
+
 
 book_service = BookService()
+async_book_service = AsyncService(book_service)
@@ -0,0 +1,528 @@
+import os
+import csv
+import json
+import codecs
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import case, select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.v1.models.book import Book, BookGenreAssociation, build_search_document
+from api.v1.models.genre import Genre
+from api.v1.models.category import Category
+from api.v1.models.import_job import ImportJob
+from api.v1.models.user import User
+from api.v1.schemas.book import AddBookSchema, ImportJobSchema, ImportRowErrorSchema
+from api.v1.utils.async_service import AsyncService
+from api.v1.utils.cache import invalidate_results
+from api.v1.utils.database import AsyncSessionLocal
+from api.v1.utils.executors import io_executor
+from api.v1.utils.paginate import invalidate_counts
+from api.v1.utils.storage import SOURCE_PREFIXES, read_source
+from api.v1.utils.upsert import insert_ignore
+from api.v1.services.taxonomy import taxonomy_service
+from api.v1.services.storage import storage_service
+from api.v1.services.image_upload import image_upload_service
+from api.v1.services.hold import hold_service
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 1000))
+# Only the first errors are kept so a bad file cannot grow the job unbounded
+IMPORT_MAX_ERRORS = int(os.environ.get("IMPORT_MAX_ERRORS", 1000))
+# Bytes of an import body held in memory, the rest is spooled to a temporary
+# file until the job has read it
+IMPORT_MEMORY_BYTES = int(os.environ.get("IMPORT_MEMORY_BYTES", 1024 * 1024))
+# Largest import body accepted, in bytes, a bigger one is refused with a 413
+IMPORT_MAX_BYTES = int(os.environ.get("IMPORT_MAX_BYTES", 100 * 1024 * 1024))
+# Seconds a job can be looked up after it started, then the reaper deletes it
+IMPORT_JOB_TTL = int(os.environ.get("IMPORT_JOB_TTL", 24 * 3600))
+# Bytes read from the spooled body at once
+IMPORT_READ_BYTES = 64 * 1024
+
+# authors, publishers and genre hold several values separated by "|" in csv
+LIST_COLUMNS = ("authors", "publishers", "genre")
+LIST_SEPARATOR = "|"
+
+
+async def iter_lines(stream: AsyncIterator[bytes]):
+    """Decode a byte stream into lines without holding more than one chunk."""
+
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+
+    buffer += decoder.decode(b"", final=True)
+    if buffer.strip():
+        yield buffer.rstrip("\r")
+
+
+async def iter_file(file: SpooledTemporaryFile):
+    """Read a spooled body back as a byte stream, off the event loop."""
+
+    while chunk := await io_executor.arun(file.read, IMPORT_READ_BYTES):
+        yield chunk
+
+
+async def iter_csv_records(stream: AsyncIterator[bytes]):
+    """Yield (row number, record) from a csv stream with a header row. Quoted
+    fields may span lines. A record is a dict, or an error message."""
+
+    header = None
+    pending = []
+    row = 0
+
+    async for line in iter_lines(stream):
+        pending.append(line)
+        text = "\n".join(pending)
+
+        # an odd number of quotes means a quoted field continues on the next line
+        if text.count('"') % 2:
+            continue
+        pending = []
+
+        if not text.strip():
+            continue
+
+        fields = next(csv.reader([text]))
+
+        if header is None:
+            header = [field.strip() for field in fields]
+            continue
+
+        row += 1
+        if len(fields) != len(header):
+            yield row, f"expected {len(header)} columns, got {len(fields)}"
+            continue
+
+        record = dict(zip(header, fields))
+        for column in LIST_COLUMNS:
+            if column in record:
+                record[column] = [
+                    value.strip()
+                    for value in record[column].split(LIST_SEPARATOR)
+                    if value.strip()
+                ]
+        yield row, record
+
+    if pending:
+        yield row + 1, "unterminated quoted field"
+
+
+async def iter_ndjson_records(stream: AsyncIterator[bytes]):
+    """Yield (row number, record) from a stream of JSON objects, one per line."""
+
+    row = 0
+
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+
+        row += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row, f"invalid json: {e.msg}"
+            continue
+
+        if not isinstance(record, dict):
+            yield row, "expected a json object"
+            continue
+        yield row, record
+
+
+def image_keys(images: list[str]) -> list[str | None]:
+    """Key of each image source, see read_source, None for a data uri that
+    does not decode."""
+
+    keys = []
+    for image in images:
+        try:
+            keys.append(read_source(image)[0])
+        except ValueError:
+            keys.append(None)
+    return keys
+
+
+class BookImportService:
+    """Bulk book import from a streamed csv or ndjson upload.
+
+    The request body is spooled to a temporary file and the job is returned
+    as soon as it is read, the rows are imported by a background task of the
+    worker that took the upload. Progress is written to the import_job row
+    with each batch, so a poll on any worker sees it.
+
+    Rows are validated with AddBookSchema and written in batches of
+    IMPORT_BATCH_SIZE, one transaction each: taxonomy names are resolved
+    through the taxonomy cache, books are upserted on isbn with a single
+    batched INSERT ... ON CONFLICT and genre links are added with one more
+    insert. Images already stored (see storage_service) are set right away,
+    the others are queued for upload, so importing the same catalog again
+    makes no upload call.
+    """
+
+    def __init__(self):
+        self.tasks: set[asyncio.Task] = set()
+
+    def get_job(self, db: Session, user: User, job_id: str) -> ImportJobSchema:
+        job = db.get(ImportJob, job_id)
+
+        if not job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Import job does not exist"
+            )
+
+        if job.user_id != user.id and user.role == "member":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="you do not have the permission to view this import job",
+            )
+
+        return ImportJobSchema.model_validate(job)
+
+    def save_job(self, db: Session, job: ImportJobSchema, **values):
+        """Write the job's progress, in the caller's transaction."""
+
+        jobs = ImportJob.__table__
+        db.execute(
+            update(jobs)
+            .where(jobs.c.id == job.id)
+            .values(
+                status=job.status,
+                processed=job.processed,
+                imported=job.imported,
+                failed=job.failed,
+                errors=[error.model_dump() for error in job.errors],
+                **values,
+            )
+        )
+
+    def add_error(self, job: ImportJobSchema, row: int, message: str):
+        job.failed += 1
+        if len(job.errors) < IMPORT_MAX_ERRORS:
+            job.errors.append(ImportRowErrorSchema(row=row, message=message))
+
+    def validate(self, job: ImportJobSchema, row: int, record) -> AddBookSchema | None:
+        if isinstance(record, str):
+            self.add_error(job, row, record)
+            return None
+
+        try:
+            schema = AddBookSchema.model_validate(record)
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(loc) for loc in error["loc"])
+            self.add_error(job, row, f"{field}: {error['msg']}")
+            return None
+
+        if not schema.category:
+            self.add_error(job, row, "category: Field required")
+            return None
+
+        if not schema.image.startswith(SOURCE_PREFIXES):
+            self.add_error(job, row, "image: must be an http(s) url or a data uri")
+            return None
+
+        return schema
+
+    def upsert(
+        self,
+        db: Session,
+        items: list[tuple[int, AddBookSchema]],
+        keys: dict[str, str],
+    ) -> list[int]:
+        """Write a batch of rows, keys holds the image key of each isbn.
+        Returns the rows refused for lowering total_copies below the copies
+        on loan."""
+
+        if not items:
+            return []
+
+        keys = {schema.isbn: keys[schema.isbn] for _, schema in items}
+        genre_ids = taxonomy_service.resolve(
+            db, Genre, [name for _, schema in items for name in schema.genre or []]
+        )
+        category_ids = taxonomy_service.resolve(
+            db, Category, [schema.category for _, schema in items]
+        )
+        # locks the books imported again, in the same order in every worker, so
+        # the copies added are counted from the totals the upsert replaces
+        totals = dict(
+            db.execute(
+                select(Book.isbn, Book.total_copies)
+                .where(Book.isbn.in_([schema.isbn for _, schema in items]))
+                .order_by(Book.id)
+                .with_for_update()
+            ).all()
+        )
+        stored = storage_service.lookup(db, list(keys.values()))
+        ready = {isbn: key for isbn, key in keys.items() if key in stored}
+
+        rows = [
+            {
+                "title": schema.title,
+                "authors": schema.authors,
+                "publishers": schema.publishers,
+                "image": stored.get(keys[schema.isbn], ""),
+                "image_key": ready.get(schema.isbn),
+                "image_status": "ready" if schema.isbn in ready else "pending",
+                "year": schema.year,
+                "isbn": schema.isbn,
+                "category_id": category_ids[schema.category],
+                "copies_available": schema.total_copies,
+                "total_copies": schema.total_copies,
+                "search_document": build_search_document(
+                    schema.title,
+                    schema.authors,
+                    schema.publishers,
+                    schema.genre,
+                    schema.category,
+                    schema.isbn,
+                ),
+            }
+            for _, schema in items
+        ]
+
+        insert = postgresql.insert(Book)
+        # a book keeps its image until the new one is uploaded
+        image_ready = insert.excluded.image_status == "ready"
+        # copies already lent out stay lent out, a row that would leave fewer
+        # copies than are on loan updates nothing and is reported. Copies added
+        # are kept for the hold queue first, below
+        added = insert.excluded.total_copies - Book.total_copies
+        insert = insert.on_conflict_do_update(
+            index_elements=["isbn"],
+            set_={
+                "title": insert.excluded.title,
+                "authors": insert.excluded.authors,
+                "publishers": insert.excluded.publishers,
+                "image": case((image_ready, insert.excluded.image), else_=Book.image),
+                "image_key": case(
+                    (image_ready, insert.excluded.image_key), else_=Book.image_key
+                ),
+                "image_status": insert.excluded.image_status,
+                "year": insert.excluded.year,
+                "category_id": insert.excluded.category_id,
+                "search_document": insert.excluded.search_document,
+                "copies_available": case(
+                    (added < 0, Book.copies_available + added),
+                    else_=Book.copies_available,
+                ),
+                "total_copies": insert.excluded.total_copies,
+            },
+            where=Book.copies_available + added >= 0,
+        ).returning(Book.id, Book.isbn)
+
+        ids = {isbn: id for id, isbn in db.execute(insert, rows)}
+        refused = [row for row, schema in items if schema.isbn not in ids]
+        items = [(row, schema) for row, schema in items if schema.isbn in ids]
+
+        for _, schema in items:
+            if schema.total_copies > totals.get(schema.isbn, schema.total_copies):
+                hold_service.release_copies(
+                    db, ids[schema.isbn], schema.total_copies - totals[schema.isbn]
+                )
+
+        links = [
+            {"book_id": ids[schema.isbn], "genre_id": genre_ids[name]}
+            for _, schema in items
+            for name in dict.fromkeys(schema.genre or [])
+        ]
+        if links:
+            db.execute(
+                insert_ignore(BookGenreAssociation, ["genre_id", "book_id"]), links
+            )
+
+        image_upload_service.enqueue_many(
+            db,
+            {
+                ids[schema.isbn]: schema.image
+                for _, schema in items
+                if schema.isbn not in ready
+            },
+        )
+
+        return refused
+
+    def refuse(self, job: ImportJobSchema, rows: list[int]):
+        for row in rows:
+            self.add_error(job, row, "total_copies: fewer than the copies on loan")
+
+    def import_batch(
+        self, db: Session, job: ImportJobSchema, batch: list[tuple[int, AddBookSchema]]
+    ):
+        # the last row wins when an isbn repeats inside a batch
+        items = list({schema.isbn: (row, schema) for row, schema in batch}.values())
+
+        # data uris are decoded and hashed on the io executor
+        images = io_executor.run(image_keys, [schema.image for _, schema in items])
+        keys = {}
+        for (row, schema), key in zip(items, images):
+            if key is None:
+                self.add_error(job, row, "image: not a valid base64 data uri")
+            else:
+                keys[schema.isbn] = key
+        items = [(row, schema) for row, schema in items if schema.isbn in keys]
+
+        try:
+            refused = self.upsert(db, items, keys)
+        except IntegrityError:
+            db.rollback()
+            refused = None
+
+        if refused is not None:
+            self.refuse(job, refused)
+            job.imported += len(items) - len(refused)
+        else:
+            # retry row by row to report the rows that conflict, e.g. on title
+            for row, schema in items:
+                try:
+                    with db.begin_nested():
+                        refused = self.upsert(db, [(row, schema)], keys)
+                    self.refuse(job, refused)
+                    job.imported += 1 - len(refused)
+                except IntegrityError as e:
+                    # async drivers wrap the driver error, report the original
+                    error = e.orig.__cause__ or e.orig
+                    self.add_error(job, row, str(error).splitlines()[0])
+
+        invalidate_counts(db, "book")
+        self.save_job(db, job)
+        db.commit()
+
+        # upserts may change books already cached one by one
+        invalidate_results("book_list")
+        invalidate_results("book")
+        image_upload_service.notify()
+
+    def finish_job(self, db: Session, job: ImportJobSchema):
+        self.save_job(db, job, finished_at=datetime.now(timezone.utc))
+        db.commit()
+
+    async def spool(self, stream: AsyncIterator[bytes]) -> SpooledTemporaryFile:
+        body = SpooledTemporaryFile(max_size=IMPORT_MEMORY_BYTES)
+        size = 0
+
+        try:
+            async for chunk in stream:
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Import body is larger than {IMPORT_MAX_BYTES} bytes",
+                    )
+                # past the memory threshold the body is on disk, written off
+                # the event loop
+                if size > IMPORT_MEMORY_BYTES:
+                    await io_executor.arun(body.write, chunk)
+                else:
+                    body.write(chunk)
+            body.seek(0)
+        except BaseException:
+            body.close()
+            raise
+
+        return body
+
+    async def start(
+        self, db: AsyncSession, user: User, stream: AsyncIterator[bytes], format: str
+    ) -> ImportJobSchema:
+        """Read the upload and start importing it in the background, returns
+        the job to poll."""
+
+        if user.role == "member":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="you do not have the permission to import books",
+            )
+
+        body = await self.spool(stream)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=IMPORT_JOB_TTL)
+
+        try:
+            job = ImportJob(
+                user_id=user.id,
+                format=format,
+                status="running",
+                errors=[],
+                expires_at=expires_at,
+            )
+            db.add(job)
+            await db.commit()
+        except BaseException:
+            body.close()
+            raise
+
+        response = ImportJobSchema.model_validate(job)
+
+        task = asyncio.create_task(self.run(response.model_copy(), body, format))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+        return response
+
+    async def run(self, job: ImportJobSchema, body: SpooledTemporaryFile, format: str):
+        if format == "ndjson":
+            records = iter_ndjson_records(iter_file(body))
+        else:
+            records = iter_csv_records(iter_file(body))
+
+        batch = []
+        try:
+            async with AsyncSessionLocal() as db:
+                async for row, record in records:
+                    job.processed += 1
+
+                    schema = self.validate(job, row, record)
+                    if schema is None:
+                        continue
+
+                    batch.append((row, schema))
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        await db.run_sync(self.import_batch, job, batch)
+                        batch = []
+
+                if batch:
+                    await db.run_sync(self.import_batch, job, batch)
+
+                job.status = "completed"
+                await db.run_sync(self.finish_job, job)
+        except BaseException as e:
+            # cancelled at shutdown, or failed: the rows imported so far stay
+            if not isinstance(e, asyncio.CancelledError):
+                logger.exception("import job %s failed", job.id)
+            job.status = "failed"
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.run_sync(self.finish_job, job)
+            except Exception:
+                logger.exception("import job %s could not be saved", job.id)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            body.close()
+
+    async def stop(self):
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+book_import_service = BookImportService()
+async_book_import_service = AsyncService(book_import_service)
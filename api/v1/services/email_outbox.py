@@ -0,0 +1,214 @@
+import os
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from api.v1.models.email_outbox import EmailOutbox
+from api.v1.utils.database import AsyncSessionLocal
+from api.v1.utils.mail import MailError, build_message, get_transport
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 50))
+# Seconds between polls when the outbox is empty, a new row wakes the worker
+# of the same process right away
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 5))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_BACKOFF_BASE = float(os.environ.get("OUTBOX_BACKOFF_BASE", 30))
+OUTBOX_BACKOFF_MAX = float(os.environ.get("OUTBOX_BACKOFF_MAX", 3600))
+# A claimed row is retried after this many seconds if its worker died
+OUTBOX_LEASE = float(os.environ.get("OUTBOX_LEASE", 300))
+# The SMTP connection is closed after this many idle seconds
+OUTBOX_IDLE_CLOSE = float(os.environ.get("OUTBOX_IDLE_CLOSE", 60))
+
+
+class EmailOutboxService:
+    """Transactional email outbox.
+
+    enqueue() adds the mail to the caller's transaction, so it is sent if and
+    only if that transaction commits. The worker claims due rows in batches
+    with SELECT ... FOR UPDATE SKIP LOCKED, leases them for OUTBOX_LEASE
+    seconds and sends them over one reused connection. Failed rows are
+    retried with exponential backoff and jitter, and marked "dead" after
+    OUTBOX_MAX_ATTEMPTS or on a permanent (5xx) error.
+    """
+
+    def __init__(self):
+        self.transport = get_transport()
+        self.task: asyncio.Task | None = None
+        self.wakeup: asyncio.Event | None = None
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+
+    def enqueue(self, db: Session, recipient: str, subject: str, body: str):
+        db.add(EmailOutbox(recipient=recipient, subject=subject, body=body))
+
+    def notify(self):
+        """Wake the worker, call it once the enqueueing transaction committed."""
+
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def claim(self, db: Session, limit: int) -> list[tuple]:
+        now = datetime.now(timezone.utc)
+
+        ids = db.scalars(
+            select(EmailOutbox.id)
+            .where(EmailOutbox.status == "pending")
+            .where(EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        if not ids:
+            db.rollback()
+            return []
+
+        rows = db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(ids))
+            .values(
+                attempts=EmailOutbox.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=OUTBOX_LEASE),
+            )
+            .returning(
+                EmailOutbox.id,
+                EmailOutbox.recipient,
+                EmailOutbox.subject,
+                EmailOutbox.body,
+                EmailOutbox.attempts,
+            )
+        ).all()
+        db.commit()
+
+        return rows
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+        return delay * random.uniform(0.5, 1.0)
+
+    def record(self, db: Session, sent: list[str], failed: list[tuple]):
+        """Mark sent ids and reschedule or dead-letter failed
+        (id, attempts, error, permanent) rows."""
+
+        now = datetime.now(timezone.utc)
+
+        if sent:
+            db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(sent))
+                .values(status="sent", sent_at=now, last_error=None)
+            )
+
+        for id, attempts, error, permanent in failed:
+            values = {"last_error": error}
+            if permanent or attempts >= OUTBOX_MAX_ATTEMPTS:
+                values["status"] = "dead"
+                self.dead += 1
+            else:
+                values["next_attempt_at"] = now + timedelta(
+                    seconds=self.backoff(attempts)
+                )
+                self.retried += 1
+
+            db.execute(
+                update(EmailOutbox).where(EmailOutbox.id == id).values(**values)
+            )
+
+        db.commit()
+        self.sent += len(sent)
+
+    async def drain(self) -> int:
+        """Send one batch of due mail, returns the number of rows claimed."""
+
+        async with AsyncSessionLocal() as db:
+            rows = await db.run_sync(self.claim, OUTBOX_BATCH_SIZE)
+            if not rows:
+                return 0
+
+            sent, failed = [], []
+            for id, recipient, subject, body, attempts in rows:
+                try:
+                    await self.transport.send(build_message(recipient, subject, body))
+                    sent.append(id)
+                except MailError as e:
+                    logger.warning("sending outbox mail %s failed: %s", id, e)
+                    failed.append((id, attempts, str(e), e.permanent))
+
+            await db.run_sync(self.record, sent, failed)
+
+        return len(rows)
+
+    async def run(self):
+        idle_since = None
+
+        while True:
+            # cleared before draining so a notify() during the batch is kept
+            self.wakeup.clear()
+            try:
+                claimed = await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("email outbox worker failed, retrying")
+                claimed = 0
+
+            if claimed >= OUTBOX_BATCH_SIZE:
+                continue
+
+            if claimed:
+                idle_since = None
+            elif idle_since is None:
+                idle_since = asyncio.get_running_loop().time()
+            elif asyncio.get_running_loop().time() - idle_since > OUTBOX_IDLE_CLOSE:
+                await self.transport.close()
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.transport.close()
+
+    def stats(self, db: Session) -> dict:
+        counts = dict(
+            db.execute(
+                select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)
+            ).all()
+        )
+
+        return {
+            "pending": counts.get("pending", 0),
+            "sent": counts.get("sent", 0),
+            "dead": counts.get("dead", 0),
+            "worker": {
+                "running": self.task is not None,
+                "sent": self.sent,
+                "retried": self.retried,
+                "dead": self.dead,
+                "connections": self.transport.connections,
+            },
+        }
+
+
+email_outbox_service = EmailOutboxService()
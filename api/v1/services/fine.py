@@ -0,0 +1,187 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, Integer, case, cast, func, literal, select, update
+from sqlalchemy.orm import Session
+from api.v1.models.loan import Loan
+from api.v1.models.user import User
+from api.v1.schemas.loan import LoanResponseSchema
+from api.v1.utils.async_service import AsyncService
+from api.v1.utils.database import AsyncSessionLocal
+from api.v1.utils.paginate import paginate_query
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Fine of a loan per full day overdue, in cents
+FINE_PER_DAY = int(os.environ.get("FINE_PER_DAY", 25))
+# Most a single loan is fined, in cents
+FINE_MAX = int(os.environ.get("FINE_MAX", 1000))
+# Wall clock time, HH:MM in UTC, of the fine pass over the open loans
+FINE_AT = os.environ.get("FINE_AT", "00:05")
+# Seconds between two runs of the fine pass, counted from FINE_AT
+FINE_INTERVAL = float(os.environ.get("FINE_INTERVAL", 86400))
+# Postgres advisory lock taken by the worker running the fine pass
+FINE_LOCK_KEY = 0x66696E65
+
+
+class FineService:
+    """Overdue fines, FINE_PER_DAY for each full day past due_at up to
+    FINE_MAX, stored in cents on the loan.
+
+    The fines of the open loans are charged by a scheduled pass, a single
+    UPDATE over the overdue ones through ix_loan_due_at_open that computes
+    every fine in the database and only writes the rows whose fine changed.
+    A loan returned late gets its final fine in the return's own update.
+
+    The pass runs at FINE_AT and every FINE_INTERVAL after it, the same wall
+    clock times in every worker. The first to take the FINE_LOCK_KEY
+    advisory lock runs it, the others skip it; one starting after the pass
+    committed finds every fine up to date and writes nothing.
+    """
+
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.runs = 0
+        self.skipped = 0
+        self.charged = 0
+        self.last_run: datetime | None = None
+        self.last_duration: float | None = None
+
+    def accrued(self, due_at, now: datetime):
+        """SQL expression of the fine of a loan due at due_at, as of now."""
+
+        now = literal(now, DateTime(timezone=True))
+        days = cast(func.floor(func.extract("epoch", now - due_at) / 86400), Integer)
+        fine = days * FINE_PER_DAY
+
+        return case(
+            (due_at >= now, 0),
+            (fine > FINE_MAX, FINE_MAX),
+            else_=fine,
+        )
+
+    def charge(self, db: Session) -> int | None:
+        """Bring the fine of every overdue open loan up to date, returns the
+        number of loans whose fine changed, or None when another worker is
+        running the pass."""
+
+        if not db.scalar(select(func.pg_try_advisory_xact_lock(FINE_LOCK_KEY))):
+            db.rollback()
+            return None
+
+        loans = Loan.__table__
+        now = datetime.now(timezone.utc)
+        fine = self.accrued(loans.c.due_at, now)
+
+        charged = db.execute(
+            update(loans)
+            .where(loans.c.returned_at.is_(None))
+            .where(loans.c.due_at < now)
+            .where(loans.c.fine != fine)
+            .values(fine=fine)
+        ).rowcount
+        db.commit()
+
+        return charged
+
+    def next_run(self, now: datetime) -> datetime:
+        """The first run of the pass after now, on the FINE_AT schedule."""
+
+        hour, minute = (int(part) for part in FINE_AT.split(":"))
+        start = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        runs = math.floor((now - start).total_seconds() / FINE_INTERVAL) + 1
+        return start + timedelta(seconds=runs * FINE_INTERVAL)
+
+    async def run_once(self) -> int | None:
+        start = time.perf_counter()
+
+        async with AsyncSessionLocal() as db:
+            charged = await db.run_sync(self.charge)
+
+        if charged is None:
+            self.skipped += 1
+            return None
+
+        self.runs += 1
+        self.charged += charged
+        self.last_run = datetime.now(timezone.utc)
+        self.last_duration = time.perf_counter() - start
+        return charged
+
+    async def run(self):
+        while True:
+            now = datetime.now(timezone.utc)
+            await asyncio.sleep((self.next_run(now) - now).total_seconds())
+
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("fine pass failed, retrying")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def fetch(
+        self, db: Session, user_id: str, user: User, page: int = 1, limit: int = 10
+    ) -> dict:
+        """Loans of a user with a fine, latest first, and the total fined.
+        Members only see their own."""
+
+        if user.id != user_id and user.role == "member":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You do not have permission to view these fines",
+            )
+
+        query = (
+            db.query(Loan)
+            .filter(Loan.user_id == user_id)
+            .filter(Loan.fine > 0)
+            .order_by(Loan.due_at.desc(), Loan.id)
+        )
+        response = paginate_query(db, query, page, limit)
+        response["results"] = [
+            LoanResponseSchema.model_validate(loan) for loan in response["results"]
+        ]
+        response["total"] = db.scalar(
+            select(func.coalesce(func.sum(Loan.fine), 0))
+            .where(Loan.user_id == user_id)
+            .where(Loan.fine > 0)
+        )
+
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "running": self.task is not None,
+            "interval": FINE_INTERVAL,
+            "next_run": self.next_run(datetime.now(timezone.utc)),
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "charged": self.charged,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+        }
+
+
+fine_service = FineService()
+async_fine_service = AsyncService(fine_service)
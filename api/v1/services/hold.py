@@ -0,0 +1,268 @@
+import os
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import delete, event, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from api.v1.models.book import Book
+from api.v1.models.hold import Hold
+from api.v1.models.loan import Loan
+from api.v1.models.user import User
+from api.v1.schemas.hold import HoldResponseSchema
+from api.v1.utils.async_service import AsyncService
+from api.v1.utils.paginate import paginate_query, MAX_LIMIT
+from api.v1.utils.timers import TimerHeap
+
+load_dotenv()
+
+# Days a hold waits in the queue before it lapses
+HOLD_EXPIRE_DAYS = int(os.environ.get("HOLD_EXPIRE_DAYS", 90))
+# Days a copy kept for a hold waits to be borrowed before it passes to the next
+# in line
+HOLD_PICKUP_DAYS = float(os.environ.get("HOLD_PICKUP_DAYS", 7))
+
+
+class HoldService:
+    """Hold queues of the books with no copy left.
+
+    A hold takes the next seq of its book from book.hold_seq, the queue is
+    the book's holds in seq order. When a copy comes back release_copy keeps
+    it for the head of the queue with one UPDATE through the (book_id, seq)
+    index, whatever the length of the queue, and only puts it back on the
+    shelf when nobody is waiting.
+
+    The pickup deadline of each ready hold is also kept in memory, in
+    pickups, once its transaction commits. The pickup service expires them
+    from there without polling the table.
+    """
+
+    def __init__(self):
+        self.pickups = TimerHeap()
+        self.placed = 0
+        self.handed_off = 0
+
+    @property
+    def pickup_window(self) -> timedelta:
+        return timedelta(days=HOLD_PICKUP_DAYS)
+
+    def not_found(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Book does not exist"
+        )
+
+    def place(self, db: Session, book_id: str, user: User) -> HoldResponseSchema:
+        books = Book.__table__
+        book = db.execute(
+            update(books)
+            .where(books.c.id == book_id)
+            .values(hold_seq=books.c.hold_seq + 1)
+            .returning(books.c.hold_seq, books.c.copies_available)
+        ).first()
+
+        if book is None:
+            raise self.not_found()
+        if book.copies_available > 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Copies are available, borrow the book instead",
+            )
+
+        borrowed = db.scalar(
+            select(Loan.id)
+            .where(Loan.book_id == book_id)
+            .where(Loan.user_id == user.id)
+            .where(Loan.returned_at.is_(None))
+        )
+        if borrowed is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="You have already borrowed this book",
+            )
+
+        hold = Hold(
+            book_id=book_id,
+            user_id=user.id,
+            seq=book.hold_seq,
+            status="waiting",
+            expires_at=datetime.now(timezone.utc) + timedelta(days=HOLD_EXPIRE_DAYS),
+        )
+        db.add(hold)
+
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="You already have a hold on this book",
+            )
+        self.placed += 1
+
+        return HoldResponseSchema.model_validate(hold)
+
+    def hand_off(self, db: Session, book_id: str):
+        """Keep a copy for the head of the book's queue, in the caller's
+        transaction. Returns its id and user_id, or None when the queue is
+        empty."""
+
+        holds = Hold.__table__
+        now = datetime.now(timezone.utc)
+        # concurrent returns of the book skip each other's head instead of
+        # waiting on it
+        head = (
+            select(holds.c.id)
+            .where(holds.c.book_id == book_id)
+            .where(holds.c.status == "waiting")
+            .where(holds.c.expires_at > now)
+            .order_by(holds.c.seq)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+
+        ready = db.execute(
+            update(holds)
+            .where(holds.c.id == head)
+            .values(
+                status="ready",
+                ready_at=now,
+                pickup_by=now + self.pickup_window,
+                expires_at=None,
+            )
+            .returning(holds.c.id, holds.c.user_id, holds.c.pickup_by)
+        ).first()
+
+        if ready is not None:
+            db.info.setdefault("hold_pickups", []).append(
+                (ready.id, ready.pickup_by.timestamp())
+            )
+        return ready
+
+    def release_copies(self, db: Session, book_id: str, count: int) -> list[str]:
+        """Copies of the book are free, in the caller's transaction: they are
+        kept for the head of the queue one by one, the rest are put back on
+        the shelf. Returns the users copies are kept for."""
+
+        users = []
+        while len(users) < count:
+            head = self.hand_off(db, book_id)
+            if head is None:
+                break
+            users.append(head.user_id)
+        self.handed_off += len(users)
+
+        if len(users) < count:
+            books = Book.__table__
+            db.execute(
+                update(books)
+                .where(books.c.id == book_id)
+                .values(
+                    copies_available=books.c.copies_available + count - len(users)
+                )
+            )
+        return users
+
+    def release_copy(self, db: Session, book_id: str) -> str | None:
+        """A copy of the book is free again, see release_copies. Returns the
+        user the copy is kept for."""
+
+        users = self.release_copies(db, book_id, 1)
+        return users[0] if users else None
+
+    def claim(self, db: Session, book_id: str, user: User) -> str | None:
+        """Remove the user's hold on the book, in the caller's transaction.
+        Returns its status, "ready" when a copy was kept for the user."""
+
+        holds = Hold.__table__
+        return db.scalar(
+            delete(holds)
+            .where(holds.c.book_id == book_id)
+            .where(holds.c.user_id == user.id)
+            .returning(holds.c.status)
+        )
+
+    def cancel(self, db: Session, book_id: str, user: User) -> str:
+        """Cancel the user's hold on the book, returns its status."""
+
+        held = self.claim(db, book_id, user)
+
+        if held is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="You have no hold on this book",
+            )
+
+        # the copy kept for the user goes to the next in line
+        if held == "ready":
+            self.release_copy(db, book_id)
+        db.commit()
+
+        return held
+
+    def remove_user(self, db: Session, user_id: str) -> list[str]:
+        """Remove every hold of the user, in the caller's transaction. The
+        copies kept for its ready holds are released, see release_copy.
+        Returns the books of those."""
+
+        holds = Hold.__table__
+        removed = db.execute(
+            delete(holds)
+            .where(holds.c.user_id == user_id)
+            .returning(holds.c.book_id, holds.c.status)
+        ).all()
+        released = [book_id for book_id, held in removed if held == "ready"]
+
+        # the same lock order in every worker
+        for book_id in sorted(released):
+            self.release_copy(db, book_id)
+        return released
+
+    def fetch_queue(
+        self, db: Session, book_id: str, page: int = 1, limit: int = 10
+    ) -> dict:
+        """The holds of a book in queue order, lapsed ones left out."""
+
+        if db.scalar(select(Book.id).where(Book.id == book_id)) is None:
+            raise self.not_found()
+
+        query = (
+            db.query(Hold)
+            .filter(Hold.book_id == book_id)
+            .filter(
+                or_(
+                    Hold.expires_at.is_(None),
+                    Hold.expires_at > datetime.now(timezone.utc),
+                )
+            )
+            .order_by(Hold.seq)
+        )
+        response = paginate_query(db, query, page, limit)
+
+        offset = (page - 1) * min(limit, MAX_LIMIT)
+        response["results"] = [
+            HoldResponseSchema.model_validate(hold).model_copy(
+                update={"position": offset + number}
+            )
+            for number, hold in enumerate(response["results"], start=1)
+        ]
+
+        return response
+
+    def committed(self, db: Session):
+        # a timer of a hold borrowed or cancelled meanwhile fires for nothing
+        for hold_id, pickup_by in db.info.pop("hold_pickups", []):
+            self.pickups.schedule(hold_id, pickup_by)
+
+    def rolled_back(self, db: Session):
+        db.info.pop("hold_pickups", None)
+
+    def stats(self) -> dict:
+        return {"placed": self.placed, "handed_off": self.handed_off}
+
+
+hold_service = HoldService()
+async_hold_service = AsyncService(hold_service)
+
+event.listen(Session, "after_commit", hold_service.committed)
+event.listen(Session, "after_rollback", hold_service.rolled_back)
@@ -0,0 +1,378 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import BinaryIO
+from dotenv import load_dotenv
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.orm import Session
+from api.v1.models.book import Book
+from api.v1.models.image_upload import ImageUpload
+from api.v1.utils.cache import invalidate_results
+from api.v1.utils.database import AsyncSessionLocal
+from api.v1.utils.executors import io_executor
+from api.v1.utils.storage import LocalStorage, read_source
+from api.v1.services.storage import storage_service
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Uploads claimed at once, they run in parallel on the io executor
+IMAGE_UPLOAD_BATCH_SIZE = int(os.environ.get("IMAGE_UPLOAD_BATCH_SIZE", 8))
+# Seconds between polls when the queue is empty, a new row wakes the worker
+# of the same process right away
+IMAGE_UPLOAD_POLL_INTERVAL = float(os.environ.get("IMAGE_UPLOAD_POLL_INTERVAL", 5))
+IMAGE_UPLOAD_MAX_ATTEMPTS = int(os.environ.get("IMAGE_UPLOAD_MAX_ATTEMPTS", 6))
+IMAGE_UPLOAD_BACKOFF_BASE = float(os.environ.get("IMAGE_UPLOAD_BACKOFF_BASE", 10))
+IMAGE_UPLOAD_BACKOFF_MAX = float(os.environ.get("IMAGE_UPLOAD_BACKOFF_MAX", 1800))
+# A claimed row is retried after this many seconds if its worker died
+IMAGE_UPLOAD_LEASE = float(os.environ.get("IMAGE_UPLOAD_LEASE", 300))
+# Uploaded files wait here for the worker, every host running it must see the
+# same directory
+IMAGE_UPLOAD_SPOOL_DIR = os.environ.get("IMAGE_UPLOAD_SPOOL_DIR", "./spool")
+# Spooled files no queued upload refers to are removed once this many seconds
+# old, which leaves time for the enqueueing transaction to commit
+IMAGE_UPLOAD_SPOOL_GRACE = float(os.environ.get("IMAGE_UPLOAD_SPOOL_GRACE", 600))
+
+# Source of a spooled file, "spool:/<key><extension>", never a client value
+SPOOL_PREFIX = "spool:"
+
+
+class ImageUploadService:
+    """Background cover image uploads.
+
+    enqueue() adds the upload to the caller's transaction and marks the book
+    "pending", so the book is saved without waiting on the image host. The
+    worker claims due rows in batches with SELECT ... FOR UPDATE SKIP LOCKED,
+    leases them for IMAGE_UPLOAD_LEASE seconds and stores them in parallel
+    through storage_service, which skips images already stored. A success
+    patches Book.image and marks the book "ready", failures are retried with
+    exponential backoff and jitter and mark the book "failed" after
+    IMAGE_UPLOAD_MAX_ATTEMPTS.
+
+    Uploaded files are copied to IMAGE_UPLOAD_SPOOL_DIR by enqueue_file() and
+    handed to the storage backend as open files, the worker removes them once
+    no queued upload refers to them.
+    """
+
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.wakeup: asyncio.Event | None = None
+        self.spool = LocalStorage(IMAGE_UPLOAD_SPOOL_DIR, SPOOL_PREFIX)
+        self.next_sweep = 0.0
+        self.uploaded = 0
+        self.retried = 0
+        self.failed = 0
+        self.swept = 0
+
+    def stored(self, db: Session, book: Book, key: str) -> bool:
+        """Set the image of the book when its key is already stored."""
+
+        url = storage_service.lookup(db, [key]).get(key)
+        if url is None:
+            return False
+
+        book.image = url
+        book.image_key = key
+        book.image_status = "ready"
+        return True
+
+    def enqueue(self, db: Session, book: Book, source: str, key: str):
+        """Queue the upload of a book image, replacing any queued one, or set
+        it right away when it is already stored. key is the key of source,
+        see read_source. The book must already be flushed."""
+
+        db.execute(delete(ImageUpload).where(ImageUpload.book_id == book.id))
+
+        if self.stored(db, book, key):
+            return
+
+        db.add(ImageUpload(book_id=book.id, source=source))
+        book.image_status = "pending"
+
+    def enqueue_file(self, db: Session, book: Book, file: BinaryIO, content_type: str):
+        """enqueue() for an uploaded file. It is hashed and copied to the spool
+        directory in chunks on the io executor, the queued row refers to the
+        copy, so the caller may close the file once this returns."""
+
+        db.execute(delete(ImageUpload).where(ImageUpload.book_id == book.id))
+
+        key = io_executor.run(read_source, file)[0]
+        if self.stored(db, book, key):
+            return
+
+        source = io_executor.run(self.spool_file, key, file, content_type)
+        db.add(ImageUpload(book_id=book.id, source=source))
+        book.image_status = "pending"
+
+    def spool_path(self, source: str) -> str:
+        return os.path.join(IMAGE_UPLOAD_SPOOL_DIR, os.path.basename(source))
+
+    def spool_file(self, key: str, file: BinaryIO, content_type: str) -> str:
+        source = self.spool.put(key, file, content_type)
+        # an existing copy is kept, touched so the sweep leaves it alone
+        os.utime(self.spool_path(source))
+        return source
+
+    def open_source(self, source: str):
+        """The source to store, spooled files opened, or the error opening it."""
+
+        if not source.startswith(SPOOL_PREFIX):
+            return source
+
+        try:
+            return open(self.spool_path(source), "rb")
+        except OSError as e:
+            return e
+
+    def enqueue_many(self, db: Session, sources: dict[str, str]):
+        """Queue {book id: source} uploads of books written with Core
+        statements, which set image_status themselves."""
+
+        if not sources:
+            return
+
+        db.execute(delete(ImageUpload).where(ImageUpload.book_id.in_(list(sources))))
+        db.execute(
+            insert(ImageUpload),
+            [{"book_id": id, "source": source} for id, source in sources.items()],
+        )
+
+    def notify(self):
+        """Wake the worker, call it once the enqueueing transaction committed."""
+
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def claim(self, db: Session, limit: int) -> list[tuple]:
+        now = datetime.now(timezone.utc)
+
+        ids = db.scalars(
+            select(ImageUpload.id)
+            .where(ImageUpload.status == "pending")
+            .where(ImageUpload.next_attempt_at <= now)
+            .order_by(ImageUpload.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        if not ids:
+            db.rollback()
+            return []
+
+        rows = db.execute(
+            update(ImageUpload)
+            .where(ImageUpload.id.in_(ids))
+            .values(
+                attempts=ImageUpload.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=IMAGE_UPLOAD_LEASE),
+            )
+            .returning(
+                ImageUpload.id,
+                ImageUpload.book_id,
+                ImageUpload.source,
+                ImageUpload.attempts,
+            )
+        ).all()
+        db.commit()
+
+        return rows
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(
+            IMAGE_UPLOAD_BACKOFF_BASE * 2 ** (attempts - 1), IMAGE_UPLOAD_BACKOFF_MAX
+        )
+        return delay * random.uniform(0.5, 1.0)
+
+    def record(self, db: Session, uploaded: list[tuple], failed: list[tuple]):
+        """Patch the books of uploaded (id, book_id, key, url) rows and reschedule
+        or give up on failed (id, attempts, error) rows. Rows replaced by a
+        newer image while uploading are left alone."""
+
+        now = datetime.now(timezone.utc)
+        books = []
+
+        for id, book_id, key, url in uploaded:
+            if db.execute(delete(ImageUpload).where(ImageUpload.id == id)).rowcount:
+                db.execute(
+                    update(Book)
+                    .where(Book.id == book_id)
+                    .values(image=url, image_key=key, image_status="ready")
+                )
+                books.append(book_id)
+                self.uploaded += 1
+
+        for id, attempts, error in failed:
+            values = {"last_error": error}
+            if attempts >= IMAGE_UPLOAD_MAX_ATTEMPTS:
+                values["status"] = "failed"
+            else:
+                values["next_attempt_at"] = now + timedelta(
+                    seconds=self.backoff(attempts)
+                )
+
+            book_id = db.scalar(
+                update(ImageUpload)
+                .where(ImageUpload.id == id)
+                .values(**values)
+                .returning(ImageUpload.book_id)
+            )
+            if book_id is None:
+                continue
+
+            if attempts >= IMAGE_UPLOAD_MAX_ATTEMPTS:
+                db.execute(
+                    update(Book).where(Book.id == book_id).values(image_status="failed")
+                )
+                books.append(book_id)
+                self.failed += 1
+            else:
+                self.retried += 1
+
+        db.commit()
+
+        if books:
+            invalidate_results("book_list")
+            for book_id in books:
+                invalidate_results("book", book_id)
+
+    async def drain(self) -> int:
+        """Upload one batch of due images, returns the number of rows claimed."""
+
+        async with AsyncSessionLocal() as db:
+            rows = await db.run_sync(self.claim, IMAGE_UPLOAD_BATCH_SIZE)
+            if not rows:
+                return 0
+
+            sources = [self.open_source(source) for _, _, source, _ in rows]
+            opened = [item for item in sources if not isinstance(item, Exception)]
+            try:
+                stored = iter(await storage_service.store_many(db, opened))
+            finally:
+                for item in sources:
+                    if hasattr(item, "close"):
+                        item.close()
+
+            results = [
+                item if isinstance(item, Exception) else next(stored)
+                for item in sources
+            ]
+
+            uploaded, failed = [], []
+            for (id, book_id, _, attempts), result in zip(rows, results):
+                if isinstance(result, Exception):
+                    logger.warning("uploading image %s failed: %r", id, result)
+                    failed.append((id, attempts, repr(result)))
+                else:
+                    uploaded.append((id, book_id, *result))
+
+            await db.run_sync(self.record, uploaded, failed)
+
+        return len(rows)
+
+    def spooled(self, db: Session) -> set[str]:
+        return set(
+            db.scalars(
+                select(ImageUpload.source).where(
+                    ImageUpload.source.startswith(SPOOL_PREFIX)
+                )
+            )
+        )
+
+    def sweep_spool(self, sources: set[str]) -> int:
+        """Remove spooled files, and leftovers of interrupted copies, older
+        than IMAGE_UPLOAD_SPOOL_GRACE that none of the sources refer to."""
+
+        cutoff = time.time() - IMAGE_UPLOAD_SPOOL_GRACE
+        referenced = {os.path.basename(source) for source in sources}
+        removed = 0
+
+        try:
+            entries = list(os.scandir(IMAGE_UPLOAD_SPOOL_DIR))
+        except FileNotFoundError:
+            return 0
+
+        for entry in entries:
+            if entry.name in referenced or entry.stat().st_mtime > cutoff:
+                continue
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+
+        return removed
+
+    async def sweep(self):
+        """Remove unreferenced spooled files, at most once per grace period."""
+
+        if time.monotonic() < self.next_sweep:
+            return
+        self.next_sweep = time.monotonic() + IMAGE_UPLOAD_SPOOL_GRACE
+
+        # sources are read before the files are listed, a file spooled after
+        # the query is younger than the grace period
+        async with AsyncSessionLocal() as db:
+            sources = await db.run_sync(self.spooled)
+        self.swept += await io_executor.arun(self.sweep_spool, sources)
+
+    async def run(self):
+        while True:
+            # cleared before draining so a notify() during the batch is kept
+            self.wakeup.clear()
+            try:
+                claimed = await self.drain()
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("image upload worker failed, retrying")
+                claimed = 0
+
+            if claimed >= IMAGE_UPLOAD_BATCH_SIZE:
+                continue
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), IMAGE_UPLOAD_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self, db: Session) -> dict:
+        counts = dict(
+            db.execute(
+                select(ImageUpload.status, func.count()).group_by(ImageUpload.status)
+            ).all()
+        )
+
+        return {
+            "pending": counts.get("pending", 0),
+            "failed": counts.get("failed", 0),
+            "storage": storage_service.stats(),
+            "worker": {
+                "running": self.task is not None,
+                "uploaded": self.uploaded,
+                "retried": self.retried,
+                "failed": self.failed,
+                "swept": self.swept,
+            },
+        }
+
+
+image_upload_service = ImageUploadService()
@@ -0,0 +1,247 @@
+import os
+import time
+import random
+import asyncio
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from api.v1.models.book import Book
+from api.v1.models.loan import Loan
+from api.v1.models.user import User
+from api.v1.schemas.loan import LoanResponseSchema
+from api.v1.utils.async_service import AsyncService
+from api.v1.utils.paginate import paginate_query
+from api.v1.services.book import book_service
+from api.v1.services.hold import hold_service
+from api.v1.services.fine import fine_service
+
+load_dotenv()
+
+# Days a copy is lent for, and added to the due date by each renewal
+LOAN_PERIOD_DAYS = int(os.environ.get("LOAN_PERIOD_DAYS", 14))
+# Renewals allowed per loan
+LOAN_MAX_RENEWALS = int(os.environ.get("LOAN_MAX_RENEWALS", 2))
+# Retries of a borrow the database aborted for conflicting with another, and
+# the base of their jittered exponential backoff in seconds
+BORROW_RETRIES = int(os.environ.get("BORROW_RETRIES", 3))
+BORROW_RETRY_DELAY = float(os.environ.get("BORROW_RETRY_DELAY", 0.01))
+
+# SQLSTATEs of a postgres transaction aborted by a concurrent one, a
+# serialization failure or a deadlock
+RETRYABLE_SQLSTATES = ("40001", "40P01")
+# Seconds a client is asked to wait when a borrow kept conflicting
+BORROW_RETRY_AFTER = 1
+
+
+class LoanService:
+    """Circulation: borrowing, returning and renewing copies of books.
+
+    Each operation touches the book's row and one open loan, found through
+    the partial indexes on loans not returned yet, so its cost does not grow
+    with the book's history. Copies are taken and given back by conditional
+    updates of copies_available, never read and written back, so concurrent
+    borrows in any number of workers cannot lend more copies than there are.
+    Every operation invalidates the cached book once committed.
+    """
+
+    def __init__(self):
+        self.borrowed = 0
+        self.returned = 0
+        self.conflicts = 0
+        self.busy = 0
+
+    @property
+    def period(self) -> timedelta:
+        return timedelta(days=LOAN_PERIOD_DAYS)
+
+    def not_borrowed(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="You have not borrowed this book",
+        )
+
+    def unavailable(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No copies available, place a hold to join the queue",
+        )
+
+    def retryable(self, error: DBAPIError) -> bool:
+        return getattr(error.orig, "pgcode", None) in RETRYABLE_SQLSTATES
+
+    def backoff(self, attempt: int):
+        delay = random.uniform(0, BORROW_RETRY_DELAY * 2**attempt)
+
+        if in_greenlet():
+            await_only(asyncio.sleep(delay))
+        else:
+            time.sleep(delay)
+
+    def reserve_copy(self, db: Session, book_id: str, user: User) -> Loan:
+        # borrowing ends the user's hold, a copy kept for it is theirs
+        if hold_service.claim(db, book_id, user) != "ready":
+            self.take_copy(db, book_id)
+
+        now = datetime.now(timezone.utc)
+        loan = Loan(
+            book_id=book_id,
+            user_id=user.id,
+            borrowed_at=now,
+            due_at=now + self.period,
+            renewals=0,
+        )
+        db.add(loan)
+        db.commit()
+
+        return loan
+
+    def take_copy(self, db: Session, book_id: str):
+        # a single conditional update takes the copy, concurrent borrows of
+        # the book queue on its row and each sees the count the previous one
+        # left. Core table, the ORM update would only add overhead here
+        books = Book.__table__
+        reserved = db.execute(
+            update(books)
+            .where(books.c.id == book_id)
+            .where(books.c.copies_available > 0)
+            .values(copies_available=books.c.copies_available - 1)
+            .returning(books.c.copies_available)
+        ).first()
+
+        if reserved is None:
+            if db.scalar(select(books.c.id).where(books.c.id == book_id)) is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Book does not exist"
+                )
+            raise self.unavailable()
+
+    def borrow(self, db: Session, book_id: str, user: User) -> LoanResponseSchema:
+        """Lend a copy of a book to user. A borrow the database aborts for
+        conflicting with another is retried up to BORROW_RETRIES times."""
+
+        for attempt in range(BORROW_RETRIES + 1):
+            try:
+                loan = self.reserve_copy(db, book_id, user)
+                break
+            except IntegrityError:
+                # the open loan index refused a second loan, the rollback
+                # gives the copy back
+                db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="You have already borrowed this book",
+                )
+            except DBAPIError as error:
+                db.rollback()
+                if not self.retryable(error):
+                    raise
+                self.conflicts += 1
+                if attempt < BORROW_RETRIES:
+                    self.backoff(attempt)
+        else:
+            self.busy += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Book is busy, please retry shortly",
+                headers={"Retry-After": str(BORROW_RETRY_AFTER)},
+            )
+
+        self.borrowed += 1
+        book_service.invalidate_books(book_id)
+
+        return LoanResponseSchema.model_validate(loan)
+
+    def return_book(self, db: Session, book_id: str, user: User) -> LoanResponseSchema:
+        now = datetime.now(timezone.utc)
+        # a late return settles the loan's final fine
+        loan = db.scalar(
+            update(Loan)
+            .where(Loan.book_id == book_id)
+            .where(Loan.user_id == user.id)
+            .where(Loan.returned_at.is_(None))
+            .values(returned_at=now, fine=fine_service.accrued(Loan.due_at, now))
+            .returning(Loan)
+        )
+
+        if loan is None:
+            raise self.not_borrowed()
+
+        # the copy goes to the head of the book's hold queue, if any
+        hold_service.release_copy(db, book_id)
+        db.commit()
+        self.returned += 1
+        book_service.invalidate_books(book_id)
+
+        return LoanResponseSchema.model_validate(loan)
+
+    def renew(self, db: Session, book_id: str, user: User) -> LoanResponseSchema:
+        loan = db.scalar(
+            select(Loan)
+            .where(Loan.book_id == book_id)
+            .where(Loan.user_id == user.id)
+            .where(Loan.returned_at.is_(None))
+            .with_for_update()
+        )
+
+        if loan is None:
+            raise self.not_borrowed()
+        if loan.renewals >= LOAN_MAX_RENEWALS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"A loan can be renewed at most {LOAN_MAX_RENEWALS} times",
+            )
+        # its fine is charged up to now, renewing would leave it on a loan
+        # that is no longer overdue
+        if loan.due_at <= datetime.now(timezone.utc):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="An overdue loan cannot be renewed, return the book",
+            )
+
+        loan.due_at = loan.due_at + self.period
+        loan.renewals += 1
+        db.commit()
+
+        return LoanResponseSchema.model_validate(loan)
+
+    def fetch_open(
+        self, db: Session, user_id: str, user: User, page: int = 1, limit: int = 10
+    ) -> dict:
+        """Open loans of a user, soonest due first. Members only see their
+        own."""
+
+        if user.id != user_id and user.role == "member":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You do not have permission to view these loans",
+            )
+
+        query = (
+            db.query(Loan)
+            .filter(Loan.user_id == user_id)
+            .filter(Loan.returned_at.is_(None))
+            .order_by(Loan.due_at, Loan.id)
+        )
+        response = paginate_query(db, query, page, limit)
+        response["results"] = [
+            LoanResponseSchema.model_validate(loan) for loan in response["results"]
+        ]
+
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "borrowed": self.borrowed,
+            "returned": self.returned,
+            "conflicts": self.conflicts,
+            "busy": self.busy,
+            "retries": BORROW_RETRIES,
+        }
+
+
+loan_service = LoanService()
+async_loan_service = AsyncService(loan_service)
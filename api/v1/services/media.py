@@ -0,0 +1,132 @@
+import os
+import re
+import asyncio
+import logging
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from PIL import Image, UnidentifiedImageError
+from api.v1.utils.cache import DiskCache
+from api.v1.utils.database import AsyncSessionLocal
+from api.v1.utils.executors import io_executor, cpu_executor
+from api.v1.utils.images import (
+    IMAGE_FORMATS,
+    IMAGE_VARIANTS,
+    render_variant,
+    variant_key,
+)
+from api.v1.utils.storage import get_storage
+from api.v1.services.storage import storage_service
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_DIR = os.environ.get("MEDIA_CACHE_DIR", "./media_cache")
+MEDIA_CACHE_SIZE = int(os.environ.get("MEDIA_CACHE_SIZE", 256 * 1024 * 1024))
+
+STORAGE_KEY = re.compile(r"[0-9a-f]{64}")
+
+
+class MediaService:
+    """Cover image variants served from a local disk cache.
+
+    A variant missing from the cache is read back from the storage backend
+    when it was rendered before, otherwise it is rendered from the original
+    with Pillow on the cpu executor and stored through the storage layer,
+    so each variant is rendered once per backend and fetched once per host.
+    Concurrent requests for the same missing variant share one fill.
+    """
+
+    def __init__(self):
+        self.cache = DiskCache(MEDIA_CACHE_DIR, MEDIA_CACHE_SIZE)
+        self.fills: dict[str, asyncio.Future] = {}
+        self.fetched = 0
+        self.rendered = 0
+
+    def check(self, key: str, variant: str, format: str):
+        if (
+            not STORAGE_KEY.fullmatch(key)
+            or variant not in IMAGE_VARIANTS
+            or format not in IMAGE_FORMATS
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Image does not exist"
+            )
+
+    async def fill(self, key: str, variant: str, format: str) -> str:
+        name = variant_key(key, variant, format)
+        storage = get_storage()
+
+        async with AsyncSessionLocal() as db:
+            urls = await db.run_sync(storage_service.lookup, [name, key])
+
+            if name in urls:
+                content = await io_executor.arun(storage.get, urls[name])
+                self.fetched += 1
+            elif key in urls:
+                original = await io_executor.arun(storage.get, urls[key])
+                try:
+                    content = await cpu_executor.arun(
+                        render_variant, original, variant, format
+                    )
+                except (
+                    UnidentifiedImageError,
+                    Image.DecompressionBombError,
+                    OSError,
+                ) as e:
+                    logger.warning("rendering %s failed: %r", name, e)
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail="Image cannot be resized",
+                    )
+
+                url = await io_executor.arun(
+                    storage.put, name, content, IMAGE_FORMATS[format]
+                )
+                await db.run_sync(
+                    storage_service.remember,
+                    [{"key": name, "url": url, "content_type": IMAGE_FORMATS[format]}],
+                )
+                await db.commit()
+                self.rendered += 1
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Image does not exist"
+                )
+
+        return await io_executor.arun(self.cache.put, name, content)
+
+    def filled(self, name: str, future: asyncio.Future):
+        self.fills.pop(name, None)
+        # retrieved so a failure nobody waits on any more is not logged
+        if not future.cancelled():
+            future.exception()
+
+    async def variant(self, key: str, variant: str, format: str) -> str:
+        """Path of a variant in the local cache, filled on a miss."""
+
+        self.check(key, variant, format)
+        name = variant_key(key, variant, format)
+
+        path = await io_executor.arun(self.cache.path, name)
+        if path is not None:
+            return path
+
+        fill = self.fills.get(name)
+        if fill is None:
+            fill = asyncio.ensure_future(self.fill(key, variant, format))
+            self.fills[name] = fill
+            fill.add_done_callback(lambda future: self.filled(name, future))
+
+        # a client going away must not cancel the fill the others wait on
+        return await asyncio.shield(fill)
+
+    def stats(self) -> dict:
+        return {
+            "cache": self.cache.stats(),
+            "fetched": self.fetched,
+            "rendered": self.rendered,
+        }
+
+
+media_service = MediaService()
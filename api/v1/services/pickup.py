@@ -0,0 +1,263 @@
+import os
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, literal, null, select, true, update
+from sqlalchemy.orm import Session
+from api.v1.models.book import Book
+from api.v1.models.hold import Hold
+from api.v1.services.book import book_service
+from api.v1.services.hold import hold_service
+from api.v1.utils.database import AsyncSessionLocal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two looks at the earliest pickup deadline, nothing touches
+# the database unless one has passed
+PICKUP_TICK = float(os.environ.get("PICKUP_TICK", 1))
+# Ready holds expired per transaction
+PICKUP_BATCH_SIZE = int(os.environ.get("PICKUP_BATCH_SIZE", 1000))
+# Seconds between two reloads of the pickup deadlines from the database, to
+# pick up the holds made ready by other workers. Each reload only reads the
+# deadlines due before the next one
+PICKUP_RESYNC_INTERVAL = float(os.environ.get("PICKUP_RESYNC_INTERVAL", 3600))
+
+
+class PickupService:
+    """Expires the copies kept for ready holds once their pickup window is
+    over, the copy passes to the next in line or back on the shelf.
+
+    The deadlines live in hold_service.pickups, a heap filled as hand-offs
+    commit and reloaded from the pickup_by index every
+    PICKUP_RESYNC_INTERVAL, only with the deadlines due before the next
+    reload, so a worker holds the timers of the next interval rather than
+    of every ready hold. Between deadlines a tick only reads the top of the
+    heap. Due holds are claimed with FOR UPDATE SKIP LOCKED, like the
+    reaper does: the workers whose timers fire for the same holds skip
+    each other's instead of waiting on them, and timers of holds borrowed,
+    cancelled or already expired fire for nothing. A batch is one
+    statement, which deletes the due holds, makes the next in line of each
+    book ready and puts the copies nobody waits for back on the shelf.
+    """
+
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.expired = 0
+        self.advanced = 0
+        self.batches = 0
+        self.last_sync: datetime | None = None
+
+    def load(self, db: Session) -> int:
+        """Schedule the pickup deadlines due before the next reload, returns
+        their number."""
+
+        holds = Hold.__table__
+        horizon = datetime.now(timezone.utc) + timedelta(
+            seconds=PICKUP_RESYNC_INTERVAL
+        )
+        # holds made ready while this runs are in the rows read or scheduled
+        # by their commit after it
+        hold_service.pickups.clear()
+        rows = db.execute(
+            select(holds.c.id, holds.c.pickup_by).where(
+                holds.c.pickup_by <= horizon
+            )
+        ).all()
+        db.commit()
+
+        for hold_id, pickup_by in rows:
+            hold_service.pickups.schedule(hold_id, pickup_by.timestamp())
+
+        self.last_sync = datetime.now(timezone.utc)
+        return len(rows)
+
+    def expire_batch(self, db: Session, ids: list[str]) -> tuple[int, set[str]]:
+        """Expire the ready holds among ids whose pickup window is over, in one
+        statement. Returns how many expired and the books whose copy went
+        back on the shelf."""
+
+        holds = Hold.__table__
+        books = Book.__table__
+        now = datetime.now(timezone.utc)
+
+        claimed = (
+            select(holds.c.id)
+            .where(holds.c.id.in_(ids))
+            .where(holds.c.status == "ready")
+            .where(holds.c.pickup_by <= now)
+            .with_for_update(skip_locked=True)
+        )
+        deleted = (
+            delete(holds)
+            .where(holds.c.id.in_(claimed.scalar_subquery()))
+            .returning(holds.c.book_id)
+            .cte("expired")
+        )
+        # copies freed per book
+        freed = (
+            select(deleted.c.book_id, func.count().label("copies"))
+            .group_by(deleted.c.book_id)
+            .cte("freed")
+        )
+
+        # as many heads of each queue as copies were freed, concurrent returns
+        # of the book skip them like they skip each other's, see hand_off
+        heads = (
+            select(holds.c.id)
+            .where(holds.c.book_id == freed.c.book_id)
+            .where(holds.c.status == "waiting")
+            .where(holds.c.expires_at > now)
+            .order_by(holds.c.seq)
+            .limit(freed.c.copies)
+            .with_for_update(skip_locked=True)
+            .lateral("heads")
+        )
+        promoted = (
+            update(holds)
+            .where(
+                holds.c.id.in_(select(heads.c.id).select_from(freed.join(heads, true())))
+            )
+            .values(
+                status="ready",
+                ready_at=now,
+                pickup_by=now + hold_service.pickup_window,
+                expires_at=None,
+            )
+            .returning(holds.c.id, holds.c.book_id, holds.c.pickup_by)
+            .cte("promoted")
+        )
+
+        # the copies left go back on the shelf, the books locked in the same
+        # order in every worker
+        locked = (
+            select(books.c.id)
+            .where(books.c.id.in_(select(freed.c.book_id)))
+            .order_by(books.c.id)
+            .with_for_update()
+            .cte("locked")
+        )
+        left = freed.c.copies - (
+            select(func.count())
+            .where(promoted.c.book_id == freed.c.book_id)
+            .scalar_subquery()
+        )
+        restocked = (
+            update(books)
+            .where(books.c.id == locked.c.id)
+            .where(books.c.id == freed.c.book_id)
+            .where(left > 0)
+            .values(copies_available=books.c.copies_available + left)
+            .returning(books.c.id, left.label("copies"))
+            .cte("shelved")
+        )
+
+        rows = db.execute(
+            select(
+                promoted.c.book_id,
+                promoted.c.id,
+                promoted.c.pickup_by,
+                literal(1).label("copies"),
+            ).union_all(select(restocked.c.id, null(), null(), restocked.c.copies))
+        ).all()
+
+        expired, advanced, shelved = 0, 0, set()
+        for book_id, hold_id, pickup_by, copies in rows:
+            expired += copies
+            if hold_id is None:
+                shelved.add(book_id)
+            else:
+                advanced += 1
+                # scheduled once committed, see hold_service.committed
+                db.info.setdefault("hold_pickups", []).append(
+                    (hold_id, pickup_by.timestamp())
+                )
+        db.commit()
+
+        hold_service.handed_off += advanced
+        self.expired += expired
+        self.advanced += advanced
+        return expired, shelved
+
+    async def tick(self) -> int:
+        """Expire one batch of due holds, returns the number of timers fired."""
+
+        due = hold_service.pickups.pop_due(time.time(), PICKUP_BATCH_SIZE)
+        if not due:
+            return 0
+
+        try:
+            async with AsyncSessionLocal() as db:
+                _, shelved = await db.run_sync(self.expire_batch, due)
+        except Exception:
+            # fired again on the next tick
+            now = time.time()
+            for hold_id in due:
+                hold_service.pickups.schedule(hold_id, now)
+            raise
+
+        self.batches += 1
+        for book_id in shelved:
+            book_service.invalidate_books(book_id)
+        return len(due)
+
+    async def sync(self):
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(self.load)
+
+    async def run(self):
+        synced_at = None
+
+        while True:
+            fired = 0
+            try:
+                if synced_at is None or time.monotonic() - synced_at >= (
+                    PICKUP_RESYNC_INTERVAL
+                ):
+                    await self.sync()
+                    synced_at = time.monotonic()
+                fired = await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("pickup expiry failed, retrying")
+
+            # a full batch may leave more due holds behind it
+            if fired < PICKUP_BATCH_SIZE:
+                await asyncio.sleep(PICKUP_TICK)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self) -> dict:
+        next_deadline = hold_service.pickups.next_deadline()
+
+        return {
+            "running": self.task is not None,
+            "scheduled": len(hold_service.pickups),
+            "next_deadline": (
+                None
+                if next_deadline is None
+                else datetime.fromtimestamp(next_deadline, timezone.utc)
+            ),
+            "expired": self.expired,
+            "advanced": self.advanced,
+            "batches": self.batches,
+            "last_sync": self.last_sync,
+        }
+
+
+pickup_service = PickupService()
@@ -0,0 +1,163 @@
+import os
+import time
+import hashlib
+from datetime import timedelta
+from dotenv import load_dotenv
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session, make_transient_to_detached
+from api.v1.models.user import User
+from api.v1.models.cache_version import CacheVersion
+from api.v1.utils.cache import TTLCache
+
+load_dotenv()
+
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 10000))
+# Longest a resolved token is trusted without a query, never past its expiry
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", 300))
+# How often a worker reads the revocations made by the others. Until it does, a
+# token logged out or a user changed or deleted on another worker is still
+# served from this worker's cache, so this is how long a revoked token may keep
+# working there. 0 checks on every request
+PRINCIPAL_VERSION_CHECK = float(os.environ.get("PRINCIPAL_VERSION_CHECK", 1))
+# Seconds of revocations read again on each check, so one whose transaction
+# was still open at the previous check is not missed
+PRINCIPAL_CHECK_OVERLAP = 10
+
+
+class PrincipalService:
+    """Users resolved from bearer tokens, cached per worker process.
+
+    Entries are keyed by the sha256 of the token, so the cache never holds a
+    usable credential, and hold the user's column values rather than an
+    instance bound to a finished session. A hit is attached to the request's
+    session with merge(load=False), which runs no query.
+
+    Logging out, changing or deleting a user must call revoke() in the same
+    transaction. It bumps the user's own "principal:<user id>" version
+    stamp, so revocations of different users never wait on one row. The
+    worker that commits drops the user's entries right away, the others
+    read the stamps moved since their last check every
+    PRINCIPAL_VERSION_CHECK seconds and drop the entries of those users
+    only, the rest of their cache stays warm.
+    """
+
+    version_prefix = "principal:"
+
+    def __init__(self):
+        self.cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+        # stamps seen by the last check, by name
+        self.versions: dict[str, int] = {}
+        # when this worker learned of each user's last revocation, entries
+        # loaded before that are stale
+        self.revoked: dict[str, float] = {}
+        self.checked_until = None
+        self.checked_at = 0.0
+        self.revocations = 0
+
+    def key(self, token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def drop(self, user_id: str):
+        self.revoked[user_id] = time.monotonic()
+        self.revocations += 1
+
+    def check_versions(self, db: Session):
+        if time.monotonic() - self.checked_at < PRINCIPAL_VERSION_CHECK:
+            return
+
+        # the cache starts empty, only later revocations matter
+        now = db.scalar(select(func.now()))
+        if self.checked_until is not None:
+            rows = db.execute(
+                select(CacheVersion.name, CacheVersion.version)
+                .where(CacheVersion.name.startswith(self.version_prefix))
+                .where(
+                    CacheVersion.updated_at
+                    > self.checked_until - timedelta(seconds=PRINCIPAL_CHECK_OVERLAP)
+                )
+            ).all()
+
+            versions = {}
+            for name, version in rows:
+                if self.versions.get(name) != version:
+                    self.drop(name.removeprefix(self.version_prefix))
+                versions[name] = version
+            self.versions = versions
+
+        # an entry lives PRINCIPAL_CACHE_TTL at most, older revocations
+        # cannot match one
+        horizon = time.monotonic() - 2 * PRINCIPAL_CACHE_TTL
+        self.revoked = {
+            user_id: at for user_id, at in self.revoked.items() if at > horizon
+        }
+        self.checked_until = now
+        self.checked_at = time.monotonic()
+
+    def get(self, db: Session, token: str) -> User | None:
+        """The cached user of a token, attached to db, or None."""
+
+        self.check_versions(db)
+
+        key = self.key(token)
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+
+        values, loaded_at = entry
+        if self.revoked.get(values["id"], float("-inf")) >= loaded_at:
+            self.cache.delete(key)
+            return None
+
+        user = User(**values)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    def remember(self, token: str, user: User, expires_at: float, loaded_at: float):
+        """Cache the user of a token until expires_at, a unix timestamp.
+        loaded_at is the time.monotonic() read before the user was loaded,
+        a revocation seen since then drops the entry."""
+
+        ttl = min(PRINCIPAL_CACHE_TTL, expires_at - time.time())
+        if ttl <= 0:
+            return
+
+        values = {
+            attribute.key: getattr(user, attribute.key)
+            for attribute in inspect(User).column_attrs
+        }
+        self.cache.set(self.key(token), (values, loaded_at), ttl=ttl)
+
+    def revoke(self, db: Session, user_id: str):
+        """Bump the user's revocation version, call it in the transaction that
+        blacklists one of their tokens or updates or deletes them."""
+
+        name = f"{self.version_prefix}{user_id}"
+        db.info.setdefault("principal_versions", {})[name] = CacheVersion.bump(
+            db, name
+        )
+
+    def committed(self, db: Session):
+        # taken as seen, the next check does not drop the users again
+        for name, version in db.info.pop("principal_versions", {}).items():
+            self.drop(name.removeprefix(self.version_prefix))
+            self.versions[name] = version
+
+    def rolled_back(self, db: Session):
+        db.info.pop("principal_versions", None)
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+
+        return {
+            **stats,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+            "revoked_users": len(self.revoked),
+            "revocations": self.revocations,
+        }
+
+
+principal_service = PrincipalService()
+
+event.listen(Session, "after_commit", principal_service.committed)
+event.listen(Session, "after_rollback", principal_service.rolled_back)
@@ -0,0 +1,119 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+from api.v1.models.access_token import AccessToken
+from api.v1.models.otp import Otp
+from api.v1.models.refresh_token import RefreshToken
+from api.v1.models.token_revocation import TokenRevocation
+from api.v1.models.hold import Hold
+from api.v1.models.import_job import ImportJob
+from api.v1.utils.database import AsyncSessionLocal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two sweeps of the expired rows
+REAPER_INTERVAL = float(os.environ.get("REAPER_INTERVAL", 600))
+# Rows deleted per transaction, so a sweep never holds many locks at once
+REAPER_BATCH_SIZE = int(os.environ.get("REAPER_BATCH_SIZE", 5000))
+
+
+class ReaperService:
+    """Deletes expired tokens, otp codes, revocations, lapsed holds and old
+    import jobs in the background.
+
+    Every login adds an access token row, the reaper keeps the table to the
+    tokens still valid. Rows are deleted in batches of REAPER_BATCH_SIZE,
+    each in its own transaction, picked with FOR UPDATE SKIP LOCKED so the
+    reapers of several workers split the work instead of queueing on it.
+    """
+
+    expiring = (
+        (AccessToken, AccessToken.expiry_time),
+        (Otp, Otp.expires_at),
+        (RefreshToken, RefreshToken.expires_at),
+        (TokenRevocation, TokenRevocation.expires_at),
+        # only waiting holds expire, a ready one has no expires_at
+        (Hold, Hold.expires_at),
+        (ImportJob, ImportJob.expires_at),
+    )
+
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.removed = {model.__tablename__: 0 for model, _ in self.expiring}
+        self.last_run: datetime | None = None
+
+    def reap_batch(self, db: Session, model, expires_at, limit: int) -> int:
+        ids = db.scalars(
+            select(model.id)
+            .where(expires_at < datetime.now(timezone.utc))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        if ids:
+            db.execute(delete(model).where(model.id.in_(ids)))
+        db.commit()
+
+        return len(ids)
+
+    async def reap(self) -> dict[str, int]:
+        """Delete every expired row, returns the number removed per table."""
+
+        removed = {}
+
+        async with AsyncSessionLocal() as db:
+            for model, expires_at in self.expiring:
+                name = model.__tablename__
+                removed[name] = 0
+                while True:
+                    count = await db.run_sync(
+                        self.reap_batch, model, expires_at, REAPER_BATCH_SIZE
+                    )
+                    removed[name] += count
+                    self.removed[name] += count
+                    if count < REAPER_BATCH_SIZE:
+                        break
+
+        self.last_run = datetime.now(timezone.utc)
+        return removed
+
+    async def run(self):
+        while True:
+            try:
+                await self.reap()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("reaper failed, retrying")
+
+            await asyncio.sleep(REAPER_INTERVAL)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.task is not None,
+            "interval": REAPER_INTERVAL,
+            "last_run": self.last_run,
+            "removed": self.removed,
+        }
+
+
+reaper_service = ReaperService()
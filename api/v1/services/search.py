@@ -0,0 +1,155 @@
+import math
+import os
+import re
+from typing import Callable
+from dotenv import load_dotenv
+from sqlalchemy import func, literal_column, select, tuple_
+from sqlalchemy.orm import Session, Query, joinedload, selectinload
+from api.v1.models.book import Book
+from api.v1.utils.paginate import estimate_count
+
+load_dotenv()
+
+# Searches with at most SEARCH_RANK_LIMIT matches have every match ranked
+SEARCH_RANK_LIMIT = int(os.environ.get("SEARCH_RANK_LIMIT", 10_000))
+# Broader searches rank about SEARCH_RANK_WINDOW of their newest matches, the
+# other matches follow them newest first, so a prefix that hits most of the
+# catalog is not ranked row by row
+SEARCH_RANK_WINDOW = int(os.environ.get("SEARCH_RANK_WINDOW", 1000))
+
+ISBN_HYPHEN = re.compile(r"(?<=\d)-(?=\d)")
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchService:
+    """Ranked full-text search over the book search document.
+
+    Matches against the GIN indexed search_vector column and ranks the matches
+    with ts_rank_cd. When there are more than SEARCH_RANK_LIMIT of them only
+    the newest SEARCH_RANK_WINDOW are ranked and the rest follow newest first.
+    Every term is a prefix match so partially typed words from the catalog UI
+    still hit the index.
+    """
+
+    def tokenize(self, search: str) -> list[str]:
+        search = ISBN_HYPHEN.sub("", search.lower())
+        return TOKEN.findall(search)
+
+    def tsquery(self, tokens: list[str]) -> str:
+        return " & ".join(f"{token}:*" for token in tokens)
+
+    def ts_query(self, search: str):
+        """The tsquery of the search terms, None when there is nothing to search
+        for."""
+
+        tokens = self.tokenize(search)
+
+        if not tokens:
+            return None
+
+        return func.to_tsquery(literal_column("'simple'"), self.tsquery(tokens))
+
+    def apply(self, db: Session, query: Query, search: str) -> Query:
+        """Filter a Book query by the search terms. Returns the query untouched
+        when there is nothing to search for."""
+
+        ts_query = self.ts_query(search)
+
+        if ts_query is None:
+            return query
+
+        return query.filter(Book.search_vector.op("@@")(ts_query))
+
+    def ranked(
+        self, db: Session, query: Query, search: str, total: int
+    ) -> Callable[[int, int], list]:
+        """Page fetcher for paginate_query that searches a Book query and orders
+        it by relevance. The query has every filter but the search, total is
+        the exact number of its matches.
+
+        Up to SEARCH_RANK_LIMIT matches postgres ranks them all and keeps only
+        the page. Past that, the ranked window is the search matches among the
+        newest books, as many books as should hold SEARCH_RANK_WINDOW matches,
+        walked through the (created_at, id) index. The other filters of the
+        query still apply to it. The matches older than the window follow it
+        newest first through the same index.
+        """
+
+        ts_query = self.ts_query(search)
+        rank = func.ts_rank_cd(Book.search_vector, ts_query)
+        newest = (Book.created_at.desc(), Book.id.desc())
+        matches = query.filter(Book.search_vector.op("@@")(ts_query))
+
+        if total <= SEARCH_RANK_LIMIT:
+            ranked = matches.order_by(rank.desc(), *newest)
+            return lambda offset, limit: ranked.offset(offset).limit(limit).all()
+
+        # twice the books the match density asks for, so an uneven spread of
+        # the matches still fills the window
+        books = estimate_count(db, db.query(Book.id))
+        walk = min(books, math.ceil(2 * SEARCH_RANK_WINDOW * books / total))
+        # matched outside the limited subquery, postgres cannot turn the walk
+        # into a GIN scan of every match
+        newest_books = (
+            select(Book.id, Book.created_at, Book.search_vector)
+            .order_by(*newest)
+            .limit(walk)
+            .subquery()
+        )
+        window = db.execute(
+            select(newest_books.c.id, newest_books.c.created_at)
+            .where(newest_books.c.search_vector.op("@@")(ts_query))
+            .order_by(newest_books.c.created_at.desc(), newest_books.c.id.desc())
+            .limit(SEARCH_RANK_WINDOW)
+        ).all()
+
+        if not window:
+            tail = matches.order_by(*newest)
+            return lambda offset, limit: tail.offset(offset).limit(limit).all()
+
+        # the window rows already match, matching them again would have postgres
+        # AND in a GIN scan of every match
+        last = window[-1]
+        ranked = query.filter(Book.id.in_([row.id for row in window])).order_by(
+            rank.desc(), *newest
+        )
+        tail = matches.filter(
+            tuple_(Book.created_at, Book.id) < tuple_(last.created_at, last.id)
+        ).order_by(*newest)
+
+        def fetch(offset: int, limit: int) -> list:
+            results = []
+            if offset < len(window):
+                results = ranked.offset(offset).limit(limit).all()
+            if len(results) < limit:
+                skip = max(offset - len(window), 0)
+                results += tail.offset(skip).limit(limit - len(results)).all()
+            return results
+
+        return fetch
+
+    def reindex(self, db: Session, batch_size: int = 1000):
+        """Rebuild the search document of every book, used after bulk changes
+        that bypass the ORM."""
+
+        last_id = ""
+        while True:
+            books = (
+                db.query(Book)
+                .options(selectinload(Book.genre), joinedload(Book.category))
+                .filter(Book.id > last_id)
+                .order_by(Book.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not books:
+                break
+
+            for book in books:
+                book.refresh_search_document()
+
+            db.commit()
+            last_id = books[-1].id
+
+
+search_service = SearchService()
@@ -0,0 +1,237 @@
+import os
+import time
+import uuid
+import secrets
+import hashlib
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session, make_transient_to_detached
+from api.v1.models.user import User
+from api.v1.models.refresh_token import RefreshToken
+from api.v1.models.token_revocation import TokenRevocation
+from api.v1.models.cache_version import CacheVersion
+from api.v1.schemas.user import UserResponseSchema
+
+load_dotenv()
+
+# "stateless" issues short lived access tokens checked by signature and the
+# in-memory revocation list, with a refresh token to renew them. "stateful"
+# stores every access token and looks it up on each request
+AUTH_MODE = os.environ.get("AUTH_MODE", "stateful")
+STATELESS_ACCESS_TOKEN_MINUTES = int(
+    os.environ.get("STATELESS_ACCESS_TOKEN_MINUTES", 15)
+)
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+# How often a worker reads the shared revocation version, a revocation made by
+# another worker is enforced within this many seconds
+REVOCATION_CHECK_INTERVAL = float(os.environ.get("REVOCATION_CHECK_INTERVAL", 1))
+
+
+class SessionService:
+    """Refresh tokens and revocations of stateless sessions.
+
+    A login opens a session: a family of refresh tokens, its id is the sid
+    claim of the access tokens. Refreshing marks the token used and issues
+    the next one of the family. A used token presented again means it was
+    stolen, the whole family is revoked.
+
+    Logging out revokes the session, changing or deleting a user revokes the
+    access tokens it was issued so far, they come back with new claims
+    through a refresh. Revocations are rows in token_revocation, every worker
+    holds them in memory and reloads them when the shared version stamp
+    moves, checked at most every REVOCATION_CHECK_INTERVAL seconds.
+    """
+
+    version_name = "token_revocation"
+
+    def __init__(self):
+        # session id and user id -> timestamp of the revocation
+        self.sessions: dict[str, float] = {}
+        self.users: dict[str, float] = {}
+        self.version = None
+        self.checked_at = 0.0
+        self.refreshed = 0
+        self.reused = 0
+
+    @property
+    def stateless(self) -> bool:
+        return AUTH_MODE == "stateless"
+
+    @property
+    def access_lifetime(self) -> timedelta:
+        return timedelta(minutes=STATELESS_ACCESS_TOKEN_MINUTES)
+
+    def hash(self, token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def issue(self, db: Session, user_id: str, family_id: str) -> dict:
+        token = secrets.token_urlsafe(32)
+        expires_at = datetime.now(timezone.utc) + timedelta(
+            days=REFRESH_TOKEN_EXPIRE_DAYS
+        )
+        db.add(
+            RefreshToken(
+                user_id=user_id,
+                family_id=family_id,
+                token_hash=self.hash(token),
+                expires_at=expires_at,
+            )
+        )
+
+        return {
+            "sid": family_id,
+            "refresh_token": token,
+            "refresh_expiry_time": expires_at,
+        }
+
+    def open(self, db: Session, user: User) -> dict:
+        """Start a session for user, in the caller's transaction. Returns its
+        sid, first refresh token and the token's expiry."""
+
+        return self.issue(db, user.id, uuid.uuid4().hex)
+
+    def rotate(self, db: Session, token: str) -> tuple[User, dict]:
+        """Exchange a refresh token for the next one of its session, in the
+        caller's transaction. Returns the user and the same fields as open."""
+
+        credential_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+        )
+        token_hash = self.hash(token)
+        now = datetime.now(timezone.utc)
+
+        # one statement claims the token, two concurrent refreshes cannot
+        # both succeed
+        row = db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.token_hash == token_hash)
+            .where(RefreshToken.used_at.is_(None))
+            .where(RefreshToken.revoked.is_(False))
+            .where(RefreshToken.expires_at > now)
+            .values(used_at=now)
+            .returning(RefreshToken.user_id, RefreshToken.family_id)
+        ).first()
+
+        if row is None:
+            used = db.execute(
+                select(RefreshToken.family_id, RefreshToken.used_at).where(
+                    RefreshToken.token_hash == token_hash
+                )
+            ).first()
+            if used is not None and used.used_at is not None:
+                self.revoke_session(db, used.family_id)
+                self.reused += 1
+                db.commit()
+            raise credential_exception
+
+        user = db.get(User, row.user_id)
+        if user is None or not user.is_active:
+            raise credential_exception
+
+        self.refreshed += 1
+        return user, self.issue(db, user.id, row.family_id)
+
+    def revoke(self, db: Session, kind: str, key: str):
+        now = datetime.now(timezone.utc)
+        db.add(
+            TokenRevocation(
+                kind=kind,
+                key=key,
+                revoked_at=now,
+                expires_at=now + self.access_lifetime,
+            )
+        )
+        db.info.setdefault("token_revocations", []).append(
+            (kind, key, now.timestamp())
+        )
+        CacheVersion.bump(db, self.version_name)
+
+    def revoke_session(self, db: Session, sid: str):
+        """Revoke a session and its refresh tokens, in the caller's
+        transaction."""
+
+        db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.family_id == sid)
+            .values(revoked=True)
+        )
+        self.revoke(db, "session", sid)
+
+    def revoke_user(self, db: Session, user_id: str):
+        """Revoke the access tokens issued to a user so far, its sessions
+        stay open. Does nothing in stateful mode."""
+
+        if self.stateless:
+            self.revoke(db, "user", str(user_id))
+
+    def principal(self, db: Session, claims: dict) -> User:
+        """The user of a stateless token, built from its user claim and
+        attached to db without a query."""
+
+        user = User(**UserResponseSchema(**claims).model_dump())
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    def add(self, kind: str, key: str, revoked_at: float):
+        revocations = self.sessions if kind == "session" else self.users
+        revocations[key] = max(revocations.get(key, 0.0), revoked_at)
+
+    def check_version(self, db: Session):
+        if time.monotonic() - self.checked_at < REVOCATION_CHECK_INTERVAL:
+            return
+
+        version = CacheVersion.current(db, self.version_name)
+        if version != self.version:
+            rows = db.execute(
+                select(
+                    TokenRevocation.kind,
+                    TokenRevocation.key,
+                    TokenRevocation.revoked_at,
+                ).where(TokenRevocation.expires_at > datetime.now(timezone.utc))
+            ).all()
+
+            self.sessions, self.users = {}, {}
+            for row in rows:
+                self.add(row.kind, row.key, row.revoked_at.timestamp())
+            self.version = version
+        self.checked_at = time.monotonic()
+
+    def is_revoked(self, db: Session, payload: dict) -> bool:
+        """Whether a stateless access token was revoked, without a query
+        unless the version is due for a check."""
+
+        self.check_version(db)
+
+        if payload["sid"] in self.sessions:
+            return True
+
+        revoked_at = self.users.get(payload["id"])
+        return revoked_at is not None and payload["iat"] <= revoked_at
+
+    def committed(self, db: Session):
+        # enforced here at once, the version is left for check_version since
+        # revocations of other workers may fall between
+        for kind, key, revoked_at in db.info.pop("token_revocations", []):
+            self.add(kind, key, revoked_at)
+
+    def rolled_back(self, db: Session):
+        db.info.pop("token_revocations", None)
+
+    def stats(self) -> dict:
+        return {
+            "mode": AUTH_MODE,
+            "revoked_sessions": len(self.sessions),
+            "revoked_users": len(self.users),
+            "version": self.version,
+            "refreshed": self.refreshed,
+            "reused": self.reused,
+        }
+
+
+session_service = SessionService()
+
+event.listen(Session, "after_commit", session_service.committed)
+event.listen(Session, "after_rollback", session_service.rolled_back)
@@ -0,0 +1,112 @@
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.v1.models.storage_object import StorageObject
+from api.v1.utils.executors import io_executor
+from api.v1.utils.storage import get_storage, read_source
+from api.v1.utils.upsert import insert_ignore
+
+
+class StorageService:
+    """Content-addressed uploads through the configured storage backend.
+
+    Every stored file is recorded in storage_object under its content key
+    (see read_source), and a source whose key is already recorded for the
+    backend is answered from there with no upload call. Sources repeated in
+    one batch are uploaded once.
+    """
+
+    def __init__(self):
+        self.uploads = 0
+        self.hits = 0
+
+    def lookup(self, db: Session, keys: list[str]) -> dict[str, str]:
+        """Urls of the keys already stored by the backend, in one query."""
+
+        if not keys:
+            return {}
+
+        rows = db.execute(
+            select(StorageObject.key, StorageObject.url)
+            .where(StorageObject.backend == get_storage().name)
+            .where(StorageObject.key.in_(set(keys)))
+        ).all()
+        self.hits += len(rows)
+
+        return dict(rows)
+
+    def remember(self, db: Session, objects: list[dict]):
+        """Record stored {key, url, content_type} objects in the caller's
+        transaction. A key recorded concurrently is kept as is."""
+
+        if not objects:
+            return
+
+        backend = get_storage().name
+        db.execute(
+            insert_ignore(StorageObject, ["backend", "key"]),
+            [{**object, "backend": backend} for object in objects],
+        )
+
+    async def store_many(self, db: AsyncSession, sources: list) -> list:
+        """Store sources in parallel on the io executor and return, for each,
+        its (key, url) or the exception that stopped it. New objects are
+        recorded in the session, the caller commits."""
+
+        prepared = await asyncio.gather(
+            *[io_executor.arun(read_source, source) for source in sources],
+            return_exceptions=True,
+        )
+
+        keys = [item[0] for item in prepared if not isinstance(item, Exception)]
+        urls = await db.run_sync(self.lookup, keys)
+        # repeats of a key in the batch are hits too
+        self.hits += len(keys) - len(urls) - len(set(keys) - set(urls))
+
+        missing = {}
+        for item in prepared:
+            if isinstance(item, Exception) or item[0] in urls:
+                continue
+            missing.setdefault(item[0], item)
+
+        storage = get_storage()
+        puts = await asyncio.gather(
+            *[io_executor.arun(storage.put, *item) for item in missing.values()],
+            return_exceptions=True,
+        )
+
+        errors = {}
+        stored = []
+        for (key, _, content_type), result in zip(missing.values(), puts):
+            if isinstance(result, Exception) or not result:
+                errors[key] = result or ValueError("storage returned no url")
+            else:
+                urls[key] = result
+                stored.append(
+                    {"key": key, "url": result, "content_type": content_type}
+                )
+
+        await db.run_sync(self.remember, stored)
+        self.uploads += len(missing)
+
+        results = []
+        for item in prepared:
+            if isinstance(item, Exception):
+                results.append(item)
+            elif item[0] in urls:
+                results.append((item[0], urls[item[0]]))
+            else:
+                results.append(errors[item[0]])
+
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "backend": get_storage().name,
+            "uploads": self.uploads,
+            "hits": self.hits,
+        }
+
+
+storage_service = StorageService()
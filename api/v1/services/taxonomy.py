@@ -0,0 +1,116 @@
+import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from api.v1.models.genre import Genre
+from api.v1.models.category import Category
+from api.v1.models.cache_version import CacheVersion
+from api.v1.utils.cache import TTLCache
+from api.v1.utils.upsert import insert_ignore
+
+load_dotenv()
+
+TAXONOMY_CACHE_SIZE = int(os.environ.get("TAXONOMY_CACHE_SIZE", 4096))
+TAXONOMY_CACHE_TTL = float(os.environ.get("TAXONOMY_CACHE_TTL", 300))
+# How often a worker reads the shared version stamp
+TAXONOMY_VERSION_CHECK = float(os.environ.get("TAXONOMY_VERSION_CHECK", 5))
+
+
+class TaxonomyService:
+    """Resolve genre and category names to ids through an in-process cache.
+
+    Hits cost no query. Misses are looked up with a single IN (...) query and
+    names that still do not exist are created with one bulk upsert. Ids are
+    only cached once read back from the database, so a rolled back insert can
+    never leave a dangling id behind. Renames and deletes must call
+    invalidate(), which bumps the shared "taxonomy" version stamp so every
+    worker drops its cache within TAXONOMY_VERSION_CHECK seconds.
+    """
+
+    version_name = "taxonomy"
+
+    def __init__(self):
+        self.caches = {
+            Genre: TTLCache(TAXONOMY_CACHE_SIZE, TAXONOMY_CACHE_TTL),
+            Category: TTLCache(TAXONOMY_CACHE_SIZE, TAXONOMY_CACHE_TTL),
+        }
+        self.version = None
+        self.checked_at = 0.0
+
+    def clear(self):
+        for cache in self.caches.values():
+            cache.clear()
+
+    def check_version(self, db: Session):
+        if time.monotonic() - self.checked_at < TAXONOMY_VERSION_CHECK:
+            return
+
+        version = CacheVersion.current(db, self.version_name)
+        if version != self.version:
+            self.clear()
+            self.version = version
+        self.checked_at = time.monotonic()
+
+    def invalidate(self, db: Session):
+        """Bump the shared version stamp, call it in the transaction that
+        renames or deletes a genre or category."""
+
+        CacheVersion.bump(db, self.version_name)
+        self.clear()
+        self.checked_at = 0.0
+
+    def resolve(
+        self, db: Session, model, names: list[str], create: bool = True
+    ) -> dict[str, str]:
+        """Map names of a Genre or Category to their ids, creating the missing
+        ones unless create is False."""
+
+        self.check_version(db)
+        cache = self.caches[model]
+
+        ids = {}
+        missing = []
+        for name in dict.fromkeys(names):
+            id = cache.get(name)
+            if id is None:
+                missing.append(name)
+            else:
+                ids[name] = id
+
+        if missing:
+            rows = db.execute(
+                select(model.name, model.id).where(model.name.in_(missing))
+            ).all()
+            for name, id in rows:
+                ids[name] = id
+                cache.set(name, id)
+
+        new = [name for name in missing if name not in ids]
+        if new and create:
+            created = db.execute(
+                insert_ignore(model, ["name"]).returning(model.name, model.id),
+                [{"name": name} for name in new],
+            ).all()
+            ids.update(created)
+
+            # created by a concurrent request between our select and insert
+            raced = [name for name in new if name not in ids]
+            if raced:
+                ids.update(
+                    db.execute(
+                        select(model.name, model.id).where(model.name.in_(raced))
+                    ).all()
+                )
+
+        return ids
+
+    def genre_ids(self, db: Session, names: list[str]) -> list[str]:
+        ids = self.resolve(db, Genre, names)
+        return [ids[name] for name in dict.fromkeys(names)]
+
+    def category_id(self, db: Session, name: str, create: bool = True) -> str | None:
+        return self.resolve(db, Category, [name], create).get(name)
+
+
+taxonomy_service = TaxonomyService()
@@ -1,8 +1,8 @@
 import os
-import smtplib
+import time
+import uuid
 import pyotp
 from typing import Annotated
-from email.mime.text import MIMEText
 from fastapi import HTTPException, status, Depends, BackgroundTasks
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer
@@ -10,31 +10,35 @@ from dotenv import load_dotenv
 from pydantic import EmailStr, UUID4
 from datetime import datetime, timezone, timedelta
 import jwt
-from passlib.context import CryptContext
-from sqlalchemy import desc
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from api.v1.schemas.user import UserCreateSchema, UserResponseSchema, UserUpdateSchema
 from api.v1.models.user import User
 from api.v1.models.otp import Otp
 from api.v1.models.access_token import AccessToken
-from api.v1.utils.dependencies import get_db
+from api.v1.models.loan import Loan
+from api.v1.utils.dependencies import get_async_db
+from api.v1.utils.paginate import invalidate_counts
+from api.v1.utils.async_service import AsyncService
+from api.v1.utils.executors import cpu_executor
+from api.v1.utils import hashing
+from api.v1.services.email_outbox import email_outbox_service
+from api.v1.services.principal import principal_service
+from api.v1.services.activity import activity_service
+from api.v1.services.session import session_service
+from api.v1.services.hold import hold_service
+from api.v1.services.book import book_service
 
 load_dotenv()
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/account/login")
-hash_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
 ALGORITHM = os.environ.get("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-# Email env variables
-SENDER = os.environ.get("EMAIL_HOST_USER")
-PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
-EMAIL_HOST = os.environ.get("EMAIL_HOST")
-EMAIL_PORT = os.environ.get("EMAIL_PORT")
-
 
 class UserService:
     def verify_otp_code(self, db: Session, code: int):
@@ -47,20 +51,12 @@ class UserService:
             )
         user = db.query(User).filter(User.id == otp.user_id).first()
 
+        # activation and the first token commit together
         user.is_active = True
-
-        db.commit()
-        db.refresh(user)
-
-        access_token, expiry = self.generate_access_token(db, user).values()
-
-        user.last_login = datetime.now(timezone.utc)
-        db.commit()
-        db.refresh(user)
+        activity_service.touch(db, user, datetime.now(timezone.utc))
 
         response = {
-            "access_token": access_token,
-            "expiry_time": expiry,
+            **self.issue_tokens(db, user),
             "user": UserResponseSchema(**jsonable_encoder(user)),
         }
         return response
@@ -70,37 +66,39 @@ class UserService:
         otp.generate_otp()
 
         db.add(otp)
-        db.commit()
-        db.refresh(otp)
+        db.flush()
 
         return otp.code
 
-    def send_mail(self, receiver: str, code: int):
-        msg = MIMEText(f"Use this otp code to verify your email account {code}")
-        msg["Subject"] = "Email Verification"
-        msg["From"] = SENDER
-        msg["To"] = receiver
+    def send_mail(self, db: Session, receiver: str, code: int):
+        """Queue the verification mail in the outbox, it is sent once the
+        current transaction commits."""
 
-        try:
-            with smtplib.SMTP(str(EMAIL_HOST), EMAIL_PORT, timeout=60) as server:
-                server.starttls()
-                server.login(SENDER, PASSWORD)
-                server.sendmail(SENDER, receiver, msg.as_string())
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Error sending email: {str(e)}"
-            )
+        email_outbox_service.enqueue(
+            db,
+            receiver,
+            "Email Verification",
+            f"Use this otp code to verify your email account {code}",
+        )
 
     def get_user_by_email(self, db: Session, email: str) -> User:
         user = db.query(User).filter(User.email == email).first()
 
         return user
 
+    # bcrypt is deliberately slow, it runs on the cpu executor
     def verify_password(self, plain_password: str, hashed_password: str):
-        return hash_context.verify(plain_password, hashed_password)
+        return cpu_executor.run(
+            hashing.verify_password, plain_password, hashed_password
+        )
+
+    def verify_and_update(self, plain_password: str, hashed_password: str):
+        return cpu_executor.run(
+            hashing.verify_and_update, plain_password, hashed_password
+        )
 
     def hash_password(self, password: str):
-        return hash_context.hash(password)
+        return cpu_executor.run(hashing.hash_password, password)
 
     def generate_access_token(self, db: Session, user: User):
         payload = {
@@ -113,16 +111,72 @@ class UserService:
             minutes=ACCESS_TOKEN_EXPIRE_MINUTES
         )
 
-        payload.update({"exp": expire})
+        # the jti identifies the token for revocation, the token is not stored
+        jti = uuid.uuid4().hex
+        payload.update({"exp": expire, "jti": jti})
         token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
-        access_token = AccessToken(user_id=user.id, token=token, expiry_time=expire)
+        access_token = AccessToken(user_id=user.id, jti=jti, expiry_time=expire)
 
         db.add(access_token)
         db.commit()
-        db.refresh(access_token)
 
         return {"token": token, "expiry_time": expire}
 
+    def generate_stateless_token(self, user: User, sid: str):
+        """A short lived access token of session sid, carrying the user's
+        profile so it is checked without a query."""
+
+        expire = datetime.now(timezone.utc) + session_service.access_lifetime
+        payload = {
+            "id": str(user.id),
+            "email": user.email,
+            "username": user.username,
+            "sid": sid,
+            "jti": uuid.uuid4().hex,
+            # a float, a token issued in the second of a revocation is told
+            # apart from the ones it revokes
+            "iat": time.time(),
+            "exp": expire,
+            "user": jsonable_encoder(UserResponseSchema(**jsonable_encoder(user))),
+        }
+        token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+        return {"token": token, "expiry_time": expire}
+
+    def session_tokens(self, user: User, session: dict):
+        access_token, expiry = self.generate_stateless_token(
+            user, session["sid"]
+        ).values()
+
+        return {
+            "access_token": access_token,
+            "expiry_time": expiry,
+            "refresh_token": session["refresh_token"],
+            "refresh_expiry_time": session["refresh_expiry_time"],
+        }
+
+    def issue_tokens(self, db: Session, user: User):
+        """The tokens of a login, committed with the caller's changes. In
+        stateless mode a session is opened and a refresh token returned."""
+
+        if not session_service.stateless:
+            access_token, expiry = self.generate_access_token(db, user).values()
+            return {"access_token": access_token, "expiry_time": expiry}
+
+        session = session_service.open(db, user)
+        db.commit()
+
+        return self.session_tokens(user, session)
+
+    def refresh(self, db: Session, refresh_token: str):
+        """Rotate a refresh token, returning a new access and refresh token
+        of the same session."""
+
+        user, session = session_service.rotate(db, refresh_token)
+        db.commit()
+
+        return self.session_tokens(user, session)
+
     def user_exist(self, db: Session, email: str, username: str):
         check_user_email = db.query(User).filter(User.email == email).first()
 
@@ -159,18 +213,16 @@ class UserService:
             user = User(**schema.model_dump())
 
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            db.flush()
 
-            try:
-                # Send mail
-                otp = self.create_otp_for_user(db, user)
-                self.send_mail(user.email, otp)
-                print("email sent")
+            # the user, its otp and the verification mail commit together
+            otp = self.create_otp_for_user(db, user)
+            self.send_mail(db, user.email, otp)
+            invalidate_counts(db, "user")
 
-            except Exception as email_error:
-                db.rollback()
-                raise email_error
+            db.commit()
+            db.refresh(user)
+            email_outbox_service.notify()
 
             response = {
                 "user": UserResponseSchema(**jsonable_encoder(user)),
@@ -184,9 +236,15 @@ class UserService:
         return response
 
     def handle_login(self, db: Session, email: EmailStr, password: str):
+        """One read and one write transaction: the user is loaded, the token
+        row inserted, last_login is buffered by activity_service."""
 
         user = db.query(User).filter(User.email == email).first()
 
+        # end the read transaction, the connection goes back to the pool
+        # while bcrypt runs
+        db.commit()
+
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User does not exist"
@@ -194,7 +252,7 @@ class UserService:
 
         # Verify password
 
-        verify_password = self.verify_password(password, user.password)
+        verify_password, new_hash = self.verify_and_update(password, user.password)
 
         if not verify_password:
             raise HTTPException(
@@ -207,53 +265,54 @@ class UserService:
                 detail="Inactive user, please verify your email",
             )
 
-        # check if user has access token
-        user_access_token = (
-            db.query(AccessToken)
-            .filter(AccessToken.user_id == user.id)
-            .order_by(desc(AccessToken.created_at))
-            .first()
-        )
+        # a hash in an older scheme or cost is replaced, in the token's
+        # transaction
+        if new_hash is not None:
+            user.password = new_hash
 
-        if user_access_token.is_expired or user_access_token.blacklisted:
-            # generate access token
-            access_token, expiry = self.generate_access_token(db, user).values()
-        else:
-            access_token = user_access_token.token
-            expiry = user_access_token.expiry_time
-
-        # update last login
-
-        user.last_login = datetime.now(timezone.utc)
-
-        db.commit()
-        db.refresh(user)
+        activity_service.touch(db, user, datetime.now(timezone.utc))
 
+        # every login gets its own token, so logging out of one session
+        # leaves the others alone, expired ones are deleted by the reaper
         response = {
-            "access_token": access_token,
-            "expiry_time": expiry,
+            **self.issue_tokens(db, user),
             "user": UserResponseSchema(**jsonable_encoder(user)),
         }
 
         return response
 
-    def blacklist_token(self, db: Session, user: User):
+    def blacklist_token(self, db: Session, user: User, token: str):
+        """Revoke the token the user authenticated with."""
 
-        access_token = (
-            db.query(AccessToken).filter(AccessToken.user_id == user.id).first()
-        )
+        # authenticate() already checked the signature
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
-        access_token.blacklisted = True
+        if "sid" in payload:
+            session_service.revoke_session(db, payload["sid"])
+        else:
+            db.execute(
+                update(AccessToken)
+                .where(AccessToken.jti == payload.get("jti"))
+                .where(AccessToken.user_id == user.id)
+                .values(blacklisted=True)
+            )
+            principal_service.revoke(db, user.id)
 
         db.commit()
-        db.refresh(access_token)
 
-    def get_current_user(
+    async def get_current_user(
         self,
         token: str = Depends(oauth2_scheme),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
     ):
 
+        return await db.run_sync(self.authenticate, token)
+
+    def authenticate(self, db: Session, token: str):
+        """Return the active user a bearer token belongs to. Resolved tokens
+        are cached by principal_service, the signature and expiry are still
+        checked on every call."""
+
         credential_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
@@ -263,29 +322,48 @@ class UserService:
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
-            email: str = payload.get("email")
+            jti: str = payload.get("jti")
 
-            if not email:
+            if not jti:
                 raise credential_exception
 
         except jwt.InvalidTokenError:
             raise credential_exception
 
-        access_token = db.query(AccessToken).filter(AccessToken.token == token).first()
+        # a stateless token carries the user, only revocations are checked
+        if "sid" in payload:
+            if session_service.is_revoked(db, payload):
+                raise credential_exception
+            return session_service.principal(db, payload["user"])
 
-        if access_token and access_token.blacklisted:
-            raise credential_exception
+        user = principal_service.get(db, token)
+        if user is not None:
+            return user
 
-        user = self.get_user_by_email(db, email)
+        # read before the queries, a revocation committed meanwhile drops the
+        # entry instead of letting it be served
+        loaded_at = time.monotonic()
 
-        if not user:
+        # one lookup on the unique jti index, a token of a deleted user or
+        # one already reaped has no row
+        row = db.execute(
+            select(User, AccessToken.blacklisted)
+            .join(AccessToken, AccessToken.user_id == User.id)
+            .where(AccessToken.jti == jti)
+        ).first()
+
+        if not row or row.blacklisted:
             raise credential_exception
 
+        user = row.User
+
         if user.is_active == False:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive User"
             )
 
+        principal_service.remember(token, user, payload["exp"], loaded_at)
+
         return user
 
     # User management functions
@@ -304,6 +382,8 @@ class UserService:
                 continue
             setattr(user, key, value)
 
+        principal_service.revoke(db, user.id)
+        session_service.revoke_user(db, user.id)
         db.commit()
         db.refresh(user)
 
@@ -316,13 +396,35 @@ class UserService:
                 detail="You don't have the permission to delete this user",
             )
 
-        user = db.query(User).filter(User.id == str(user_id)).first()
+        # locked so no loan is opened for the user until it is deleted
+        user = db.query(User).filter(User.id == str(user_id)).with_for_update().first()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User does not exist"
             )
+
+        borrowed = db.scalar(
+            select(Loan.id)
+            .where(Loan.user_id == user.id)
+            .where(Loan.returned_at.is_(None))
+            .limit(1)
+        )
+        if borrowed is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Return the borrowed books before deleting the account",
+            )
+
+        # the copies kept for the user's ready holds go to the next in line
+        released = hold_service.remove_user(db, user.id)
         db.delete(user)
+        principal_service.revoke(db, user.id)
+        session_service.revoke_user(db, user.id)
+        invalidate_counts(db, "user")
         db.commit()
+        for book_id in released:
+            book_service.invalidate_books(book_id)
 
 
 user_service = UserService()
+async_user_service = AsyncService(user_service)
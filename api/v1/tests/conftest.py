@@ -0,0 +1,86 @@
+"""Fixtures of the tests that run the app.
+
+They use the database of DATABASE_URL, which must be a disposable postgres
+database: its tables are created if missing and every test adds its own
+users and books. The app is only imported by the fixtures, so tests that
+need none of them run without a database.
+
+usage: DATABASE_URL=postgresql://... python -m pytest api/v1/tests
+"""
+
+import os
+import uuid
+import pytest
+
+os.environ.setdefault("EMAIL_BACKEND", "locmem")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("SECRET_KEY", uuid.uuid4().hex)
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def db():
+    from api.v1.utils.database import SessionLocal
+
+    with SessionLocal() as db:
+        yield db
+
+
+@pytest.fixture
+def make_user(db):
+    """Create a user, returns it and the headers of a request made by it."""
+
+    from api.v1.models import User
+    from api.v1.models.user import Role
+    from api.v1.services.user import user_service
+
+    def make_user(role: Role = Role.member) -> tuple[User, dict]:
+        user = User(
+            username=f"test-{uuid.uuid4().hex[:8]}",
+            email=f"{uuid.uuid4().hex[:8]}@example.com",
+            password="x",
+            role=role,
+            is_active=True,
+        )
+        db.add(user)
+        db.commit()
+
+        token = user_service.generate_access_token(db, user)["token"]
+        return user, {"Authorization": f"Bearer {token}"}
+
+    return make_user
+
+
+@pytest.fixture
+def make_book(db):
+    """Create a book with the given number of copies, returns its id."""
+
+    from api.v1.models import Book, Category
+
+    def make_book(copies: int = 1) -> str:
+        category = Category(name=f"test-{uuid.uuid4().hex[:8]}")
+        book = Book(
+            title=f"test {uuid.uuid4().hex}",
+            authors=["Test Author"],
+            publishers=["Test Publisher"],
+            image="https://example.com/cover.jpg",
+            year=2000,
+            isbn=uuid.uuid4().hex,
+            category=category,
+            copies_available=copies,
+            total_copies=copies,
+        )
+        db.add(book)
+        db.commit()
+        return book.id
+
+    return make_book
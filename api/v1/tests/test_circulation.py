@@ -0,0 +1,244 @@
+"""Borrows, returns, hold hand-offs, pickup expiry and the fine pass, each
+raced from several threads where they may run concurrently."""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+import pytest
+from sqlalchemy import func, select, update
+from sqlalchemy.engine import make_url
+
+if make_url(os.environ.get("DATABASE_URL") or "sqlite://").get_backend_name() != (
+    "postgresql"
+):
+    pytest.skip("the tests need a postgres DATABASE_URL", allow_module_level=True)
+
+from api.v1.models import Book, Loan
+from api.v1.models.hold import Hold
+from api.v1.services.fine import fine_service, FINE_PER_DAY, FINE_LOCK_KEY
+from api.v1.services.pickup import pickup_service
+from api.v1.utils.database import SessionLocal
+
+
+def race(fn, args: list) -> list:
+    """Call fn with each of args at once, from as many threads."""
+
+    barrier = threading.Barrier(len(args))
+
+    def call(arg):
+        barrier.wait()
+        return fn(arg)
+
+    with ThreadPoolExecutor(len(args)) as executor:
+        return list(executor.map(call, args))
+
+
+def copies_available(db, book_id: str) -> int:
+    db.expire_all()
+    return db.get(Book, book_id).copies_available
+
+
+def queue(db, book_id: str) -> list[tuple[str, str]]:
+    """(user_id, status) of the holds of a book, in queue order."""
+
+    return db.execute(
+        select(Hold.user_id, Hold.status)
+        .where(Hold.book_id == book_id)
+        .order_by(Hold.seq)
+    ).all()
+
+
+def test_concurrent_borrows_take_each_copy_once(client, db, make_user, make_book):
+    book_id = make_book(copies=3)
+    users = [make_user() for _ in range(10)]
+
+    codes = race(
+        lambda headers: client.post(
+            f"/api/v1/books/{book_id}/borrow", headers=headers
+        ).status_code,
+        [headers for _, headers in users],
+    )
+
+    assert sorted(codes) == [201] * 3 + [409] * 7
+    assert copies_available(db, book_id) == 0
+    open_loans = db.scalars(
+        select(Loan.id)
+        .where(Loan.book_id == book_id)
+        .where(Loan.returned_at.is_(None))
+    ).all()
+    assert len(open_loans) == 3
+
+
+def test_return_hands_copy_to_head_of_queue(client, db, make_user, make_book):
+    book_id = make_book(copies=1)
+    (borrower, borrower_headers), (first, first_headers), (second, second_headers) = (
+        make_user(),
+        make_user(),
+        make_user(),
+    )
+
+    client.post(f"/api/v1/books/{book_id}/borrow", headers=borrower_headers)
+    for headers in (first_headers, second_headers):
+        assert (
+            client.post(f"/api/v1/books/{book_id}/hold", headers=headers).status_code
+            == 201
+        )
+
+    response = client.post(f"/api/v1/books/{book_id}/return", headers=borrower_headers)
+    assert response.status_code == 200
+    assert copies_available(db, book_id) == 0
+    assert queue(db, book_id) == [(first.id, "ready"), (second.id, "waiting")]
+
+    # the copy is kept for the head of the queue
+    response = client.post(f"/api/v1/books/{book_id}/borrow", headers=second_headers)
+    assert response.status_code == 409
+    response = client.post(f"/api/v1/books/{book_id}/borrow", headers=first_headers)
+    assert response.status_code == 201
+    assert queue(db, book_id) == [(second.id, "waiting")]
+
+
+def test_concurrent_returns_hand_off_to_distinct_holds(
+    client, db, make_user, make_book
+):
+    book_id = make_book(copies=2)
+    borrowers = [make_user() for _ in range(2)]
+    waiting = [make_user() for _ in range(3)]
+
+    for _, headers in borrowers:
+        client.post(f"/api/v1/books/{book_id}/borrow", headers=headers)
+    for _, headers in waiting:
+        client.post(f"/api/v1/books/{book_id}/hold", headers=headers)
+
+    codes = race(
+        lambda headers: client.post(
+            f"/api/v1/books/{book_id}/return", headers=headers
+        ).status_code,
+        [headers for _, headers in borrowers],
+    )
+
+    assert codes == [200, 200]
+    assert copies_available(db, book_id) == 0
+    statuses = sorted(status for _, status in queue(db, book_id))
+    assert statuses == ["ready", "ready", "waiting"]
+
+
+def test_pickup_expiry_passes_copy_on(client, db, make_user, make_book):
+    book_id = make_book(copies=1)
+    (_, borrower_headers), (first, first_headers), (second, second_headers) = (
+        make_user(),
+        make_user(),
+        make_user(),
+    )
+
+    client.post(f"/api/v1/books/{book_id}/borrow", headers=borrower_headers)
+    client.post(f"/api/v1/books/{book_id}/hold", headers=first_headers)
+    client.post(f"/api/v1/books/{book_id}/hold", headers=second_headers)
+    client.post(f"/api/v1/books/{book_id}/return", headers=borrower_headers)
+
+    def lapse():
+        db.execute(
+            update(Hold)
+            .where(Hold.book_id == book_id)
+            .where(Hold.status == "ready")
+            .values(pickup_by=datetime.now(timezone.utc) - timedelta(minutes=1))
+        )
+        db.commit()
+        return db.scalars(select(Hold.id).where(Hold.book_id == book_id)).all()
+
+    # two workers fire the timer of the same hold, only one expires it
+    ids = lapse()
+
+    def expire(_):
+        with SessionLocal() as session:
+            return pickup_service.expire_batch(session, ids)[0]
+
+    assert sorted(race(expire, [None, None])) == [0, 1]
+    assert queue(db, book_id) == [(second.id, "ready")]
+    assert copies_available(db, book_id) == 0
+
+    # nobody is left in line, the copy goes back on the shelf
+    ids = lapse()
+    expired, shelved = pickup_service.expire_batch(db, ids)
+    assert (expired, shelved) == (1, {book_id})
+    assert queue(db, book_id) == []
+    assert copies_available(db, book_id) == 1
+
+
+def test_pickup_expiry_batch_splits_copies(client, db, make_user, make_book):
+    book_id = make_book(copies=2)
+    borrowers = [make_user() for _ in range(2)]
+    waiting = [make_user() for _ in range(3)]
+
+    for _, headers in borrowers:
+        client.post(f"/api/v1/books/{book_id}/borrow", headers=headers)
+    for _, headers in waiting:
+        client.post(f"/api/v1/books/{book_id}/hold", headers=headers)
+    for _, headers in borrowers:
+        client.post(f"/api/v1/books/{book_id}/return", headers=headers)
+
+    def lapse():
+        db.execute(
+            update(Hold)
+            .where(Hold.book_id == book_id)
+            .where(Hold.status == "ready")
+            .values(pickup_by=datetime.now(timezone.utc) - timedelta(minutes=1))
+        )
+        db.commit()
+        return db.scalars(select(Hold.id).where(Hold.book_id == book_id)).all()
+
+    # both copies lapse in one batch, one person is left to take one of them
+    expired, shelved = pickup_service.expire_batch(db, lapse())
+    assert (expired, shelved) == (2, {book_id})
+    assert queue(db, book_id) == [(waiting[2][0].id, "ready")]
+    assert copies_available(db, book_id) == 1
+
+
+def test_fine_pass_charges_overdue_loans_once(client, db, make_user, make_book):
+    user, headers = make_user()
+    book_ids = [make_book() for _ in range(3)]
+    for book_id in book_ids:
+        client.post(f"/api/v1/books/{book_id}/borrow", headers=headers)
+
+    now = datetime.now(timezone.utc)
+    for book_id, days in zip(book_ids, (-1, 2.5, 4)):
+        db.execute(
+            update(Loan)
+            .where(Loan.book_id == book_id)
+            .values(due_at=now - timedelta(days=days))
+        )
+    db.commit()
+
+    # several workers start the pass at the same time, one runs it
+    def charge(_):
+        with SessionLocal() as session:
+            return fine_service.charge(session)
+
+    charged = race(charge, [None, None, None])
+    assert len([count for count in charged if count]) == 1
+    assert sum(count or 0 for count in charged) >= 2
+
+    fines = dict(
+        db.execute(
+            select(Loan.book_id, Loan.fine).where(Loan.user_id == user.id)
+        ).all()
+    )
+    assert fines == {
+        book_ids[0]: 0,
+        book_ids[1]: 2 * FINE_PER_DAY,
+        book_ids[2]: 4 * FINE_PER_DAY,
+    }
+
+    # every fine is up to date, a second pass writes nothing
+    assert fine_service.charge(db) == 0
+
+    # an overdue loan is not renewed, its fine stays with it
+    response = client.post(f"/api/v1/books/{book_ids[2]}/renew", headers=headers)
+    assert response.status_code == 400
+
+
+def test_fine_pass_skipped_while_another_runs(client):
+    with SessionLocal() as holder, SessionLocal() as other:
+        holder.execute(select(func.pg_advisory_xact_lock(FINE_LOCK_KEY)))
+        assert fine_service.charge(other) is None
+        holder.rollback()
@@ -0,0 +1,30 @@
+from typing import Any
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class AsyncService:
+    """
+    Async facade over a service whose methods take a Session first.
+
+    Every method takes an AsyncSession instead and runs on its sync session
+    with run_sync, so the queries go through the async driver and the event
+    loop serves other requests while they wait on the database.
+
+    Parameters:
+        - service: The sync service, e.g. book_service.
+    """
+
+    def __init__(self, service: Any):
+        self.service = service
+
+    def __getattr__(self, name: str):
+        method = getattr(self.service, name)
+
+        async def call(db: AsyncSession, *args, **kwargs):
+            return await db.run_sync(lambda session: method(session, *args, **kwargs))
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        # cache the wrapper, __getattr__ only runs for missing attributes
+        setattr(self, name, call)
+        return call
@@ -0,0 +1,398 @@
+import os
+import time
+import pickle
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "memory" keeps results per worker process, "sqlite" shares them between the
+# workers of one host through a local file
+RESULT_CACHE_BACKEND = os.environ.get("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_PATH = os.environ.get("RESULT_CACHE_PATH", "./result_cache.db")
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 1024))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 60))
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU mapping whose entries expire after `ttl` seconds.
+
+    Parameters:
+        - maxsize: Number of entries kept before the least recently used is evicted.
+        - ttl: Seconds an entry stays valid after it was set.
+    """
+
+    backend = "memory"
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generation = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: float | None = None,
+        generation: int | None = None,
+    ):
+        """Store a value. When generation is given the value is dropped if the
+        cache was cleared since it was read, so a result computed before a
+        write cannot outlive the invalidation."""
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    @property
+    def generation(self) -> int:
+        """Changes on every delete or clear, pass it back to set()."""
+
+        return self._generation
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache(TTLCache):
+    """
+    TTLCache stored in a local sqlite file, shared by every process of a host.
+
+    Entries of several caches live in one file, separated by namespace. Keys
+    are stored by repr so they must be built from str, int, None and tuples.
+    Values are pickled. Hit, miss and eviction counters are per process.
+
+    Parameters:
+        - path: The sqlite file.
+        - namespace: Name separating this cache from the others in the file.
+        - maxsize: Number of entries kept before the least recently used is evicted.
+        - ttl: Seconds an entry stays valid after it was set.
+    """
+
+    backend = "sqlite"
+
+    def __init__(
+        self, path: str, namespace: str, maxsize: int = 1024, ttl: float = 60.0
+    ):
+        super().__init__(maxsize, ttl)
+        self.path = path
+        self.namespace = namespace
+        self._local = threading.local()
+
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed_at "
+                "ON cache_entry (namespace, accessed_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_generation ("
+                "namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+
+        return connection
+
+    @property
+    def generation(self) -> int:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT generation FROM cache_generation WHERE namespace = ?",
+                (self.namespace,),
+            )
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def _bump_generation(self, connection: sqlite3.Connection):
+        connection.execute(
+            "INSERT INTO cache_generation (namespace, generation) VALUES (?, 1) "
+            "ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1",
+            (self.namespace,),
+        )
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.time()
+
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT value, expires_at, accessed_at FROM cache_entry "
+                "WHERE namespace = ? AND key = ?",
+                (self.namespace, repr(key)),
+            ).fetchone()
+
+            if row is None or row[1] < now:
+                self.misses += 1
+                return default
+
+            # a coarse access time is enough for the LRU and saves a write
+            # on most hits
+            if now - row[2] > 1:
+                connection.execute(
+                    "UPDATE cache_entry SET accessed_at = ? "
+                    "WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, repr(key)),
+                )
+
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: float | None = None,
+        generation: int | None = None,
+    ):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+
+        with self._connection() as connection:
+            # takes the write lock first so the generation cannot change
+            # between the check and the insert
+            connection.execute("BEGIN IMMEDIATE")
+
+            if generation is not None and generation != self.generation:
+                return
+
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entry "
+                "(namespace, key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, repr(key), pickle.dumps(value), expires_at, now),
+            )
+
+            # drop expired entries first, then the least recently used
+            connection.execute(
+                "DELETE FROM cache_entry WHERE namespace = ? AND expires_at < ?",
+                (self.namespace, now),
+            )
+            evicted = connection.execute(
+                "DELETE FROM cache_entry WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache_entry WHERE namespace = ? "
+                "ORDER BY accessed_at LIMIT max(0, "
+                "(SELECT count(*) FROM cache_entry WHERE namespace = ?) - ?))",
+                (self.namespace, self.namespace, self.namespace, self.maxsize),
+            ).rowcount
+
+        self.evictions += evicted
+
+    def delete(self, key: Hashable):
+        with self._connection() as connection:
+            self._bump_generation(connection)
+            connection.execute(
+                "DELETE FROM cache_entry WHERE namespace = ? AND key = ?",
+                (self.namespace, repr(key)),
+            )
+
+    def clear(self):
+        with self._connection() as connection:
+            self._bump_generation(connection)
+            connection.execute(
+                "DELETE FROM cache_entry WHERE namespace = ?", (self.namespace,)
+            )
+
+    def __len__(self) -> int:
+        return (
+            self._connection()
+            .execute(
+                "SELECT count(*) FROM cache_entry WHERE namespace = ?",
+                (self.namespace,),
+            )
+            .fetchone()[0]
+        )
+
+
+class DiskCache:
+    """
+    Files under a local directory kept to at most `maxsize` bytes, the least
+    recently used file is removed first. A hit refreshes the file mtime,
+    which is the LRU order, so the cache survives restarts and is shared by
+    the processes of a host. Sizes are tracked per process and recounted
+    from the directory on every eviction.
+
+    Parameters:
+        - directory: Where the files live, created on first write.
+        - maxsize: Bytes kept before the least recently used files are removed.
+    """
+
+    def __init__(self, directory: str, maxsize: int):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str | None:
+        """Path of a cached file, or None."""
+
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return path
+
+    def put(self, name: str, content: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+
+        # written aside and renamed so a reader never sees half a file
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, prefix=".", delete=False
+        ) as file:
+            file.write(content)
+        os.replace(file.name, path)
+
+        with self._lock:
+            if self.size is None:
+                self.size = self._scan()[1]
+            else:
+                self.size += len(content)
+            if self.size > self.maxsize:
+                self._evict(keep=name)
+
+        return path
+
+    def _scan(self) -> tuple[list[os.DirEntry], int]:
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.startswith(".")
+        ]
+        return entries, sum(entry.stat().st_size for entry in entries)
+
+    def _evict(self, keep: str):
+        entries, self.size = self._scan()
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+
+        for entry in entries:
+            if self.size <= self.maxsize:
+                break
+            # the file just written is about to be served
+            if entry.name == keep:
+                continue
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": "disk",
+            "size": self.size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+result_caches: dict[str, TTLCache] = {}
+
+
+def result_cache(namespace: str) -> TTLCache:
+    """Return the result cache of a namespace, created on first use with the
+    RESULT_CACHE_* settings."""
+
+    cache = result_caches.get(namespace)
+
+    if cache is None:
+        if RESULT_CACHE_BACKEND == "sqlite":
+            cache = SQLiteCache(
+                RESULT_CACHE_PATH, namespace, RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+            )
+        else:
+            cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+        result_caches[namespace] = cache
+
+    return cache
+
+
+def invalidate_results(namespace: str, key: Hashable | None = None):
+    """Drop one cached result of a namespace, or all of them when key is None.
+    Call it after the write commits."""
+
+    if key is None:
+        result_cache(namespace).clear()
+    else:
+        result_cache(namespace).delete(key)
@@ -1,14 +1,57 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 load_dotenv()
 
-SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./test.db")
+# The models use postgres types (ARRAY, TSVECTOR), no other database is supported
+SQLALCHEMY_DATABASE_URL = os.environ.get(
+    "DATABASE_URL", "postgresql://postgres@localhost/bookvault"
+)
+
+# async drivers for the synchronous DATABASE_URL schemes
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "postgres": "asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a database url for its asyncio counterpart."""
+
+    url = make_url(url)
+    backend = url.get_backend_name()
+
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(
+            f"DATABASE_URL must be a postgres url, {backend} is not supported"
+        )
+
+    return url.set(
+        drivername=f"{'postgresql' if backend == 'postgres' else backend}"
+        f"+{ASYNC_DRIVERS[backend]}"
+    ).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or async_database_url(
+    SQLALCHEMY_DATABASE_URL
+)
+
+if not make_url(ASYNC_DATABASE_URL).get_dialect().is_async:
+    raise ValueError(
+        f"{make_url(ASYNC_DATABASE_URL).drivername} is not an asyncio driver, "
+        "ASYNC_DATABASE_URL must use one such as postgresql+asyncpg"
+    )
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Objects stay loaded after commit, an expired attribute would otherwise need
+# a lazy load outside of the greenlet that runs the query
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
@@ -1,4 +1,4 @@
-from api.v1.utils.database import SessionLocal
+from api.v1.utils.database import SessionLocal, AsyncSessionLocal
 
 
 def get_db():
@@ -9,3 +9,8 @@ def get_db():
         raise e
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,173 @@
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+
+load_dotenv()
+
+# Threads for blocking I/O: smtp, cloudinary uploads
+IO_EXECUTOR_WORKERS = int(os.environ.get("IO_EXECUTOR_WORKERS", 16))
+IO_EXECUTOR_QUEUE = int(os.environ.get("IO_EXECUTOR_QUEUE", 256))
+
+# Processes for CPU bound work: password hashing. "thread" swaps the process
+# pool for threads, bcrypt releases the GIL so that also scales on cores.
+CPU_EXECUTOR_KIND = os.environ.get("CPU_EXECUTOR_KIND", "process")
+CPU_EXECUTOR_WORKERS = int(os.environ.get("CPU_EXECUTOR_WORKERS", os.cpu_count() or 1))
+CPU_EXECUTOR_QUEUE = int(os.environ.get("CPU_EXECUTOR_QUEUE", 64))
+
+# Seconds a client is asked to wait when a pool is saturated
+EXECUTOR_RETRY_AFTER = int(os.environ.get("EXECUTOR_RETRY_AFTER", 1))
+
+
+class BoundedExecutor:
+    """
+    Thread or process pool that accepts at most `max_pending` tasks at once.
+
+    A task counts as pending from submit until it finishes, queued or
+    running. Past the bound submit fails fast with a 503 and a Retry-After
+    header instead of growing the pool queue without limit.
+
+    Parameters:
+        - name: Name reported in the metrics.
+        - factory: Builds the pool with the given number of workers.
+        - workers: Number of threads or processes.
+        - max_pending: Tasks accepted before new ones are rejected.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[int], Executor],
+        workers: int,
+        max_pending: int,
+    ):
+        self.name = name
+        self.factory = factory
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.factory(self.workers)
+            return self._executor
+
+    def start(self):
+        """Create the pool and its workers ahead of the first task."""
+
+        self.executor.submit(int).result()
+
+    def _done(self, future: Future):
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        executor = self.executor
+
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please retry shortly",
+                    headers={"Retry-After": str(EXECUTOR_RETRY_AFTER)},
+                )
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+            raise
+
+        future.add_done_callback(self._done)
+        return future
+
+    def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn on the pool and return its result.
+
+        Called from a service running under AsyncSession.run_sync, the wait
+        is handed back to the event loop. Called from plain sync code it
+        blocks the calling thread like a direct call would.
+        """
+
+        future = self.submit(fn, *args, **kwargs)
+
+        if in_greenlet():
+            return await_only(asyncio.wrap_future(future))
+        return future.result()
+
+    async def arun(self, fn: Callable, *args, **kwargs) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.workers),
+            "peak_pending": self.peak_pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+def cpu_pool(workers: int) -> Executor:
+    if CPU_EXECUTOR_KIND == "thread":
+        return ThreadPoolExecutor(workers, thread_name_prefix="cpu")
+
+    # fork keeps the workers from re-importing the app module, start() runs
+    # at startup so they fork before the server spawns its threads
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    return ProcessPoolExecutor(workers, mp_context=context)
+
+
+io_executor = BoundedExecutor(
+    "io",
+    lambda workers: ThreadPoolExecutor(workers, thread_name_prefix="io"),
+    IO_EXECUTOR_WORKERS,
+    IO_EXECUTOR_QUEUE,
+)
+cpu_executor = BoundedExecutor(
+    "cpu", cpu_pool, CPU_EXECUTOR_WORKERS, CPU_EXECUTOR_QUEUE
+)
+
+executors = (io_executor, cpu_executor)
+
+
+def start_executors():
+    for executor in executors:
+        executor.start()
+
+
+def shutdown_executors():
+    for executor in executors:
+        executor.shutdown()
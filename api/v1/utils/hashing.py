@@ -0,0 +1,134 @@
+import os
+import math
+import time
+import logging
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+from passlib.registry import get_crypt_handler
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Schemes a stored hash may use. The first hashes new passwords, a hash in any
+# other is replaced on the next login, e.g. "argon2,bcrypt" moves users to
+# argon2 (needs argon2-cffi installed)
+PASSWORD_SCHEMES = os.environ.get("PASSWORD_SCHEMES", "bcrypt").split(",")
+# bcrypt cost, each step doubles the time of a hash
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+# When set, the bcrypt cost is calibrated at startup so a verify takes about
+# this many milliseconds on this machine, overriding BCRYPT_ROUNDS
+PASSWORD_HASH_TARGET_MS = float(os.environ.get("PASSWORD_HASH_TARGET_MS", 0))
+# Lowest bcrypt cost a stored hash may keep, lower ones are rehashed on the next
+# login. Defaults to BCRYPT_ROUNDS, or with calibration to one step under the
+# calibrated cost: each process calibrates on its own and may land a step
+# apart, without the slack they would rehash each other's hashes
+BCRYPT_FLOOR_ROUNDS = int(os.environ.get("BCRYPT_FLOOR_ROUNDS", 0))
+# argon2 passes, memory in KiB and lanes
+ARGON2_TIME_COST = int(os.environ.get("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.environ.get("ARGON2_MEMORY_COST", 65536))
+ARGON2_PARALLELISM = int(os.environ.get("ARGON2_PARALLELISM", 4))
+
+BCRYPT_MIN_ROUNDS = 4
+BCRYPT_MAX_ROUNDS = 31
+CALIBRATION_ROUNDS = 8
+
+
+def build_context(
+    schemes: list[str], bcrypt_rounds: int, bcrypt_floor: int | None = None
+) -> CryptContext:
+    """A context hashing with the first scheme and its configured cost. A
+    stored hash in another scheme, or with a cost under bcrypt_floor (by
+    default bcrypt_rounds) or over bcrypt_rounds, needs an update."""
+
+    return CryptContext(
+        schemes=schemes,
+        deprecated="auto",
+        bcrypt__default_rounds=bcrypt_rounds,
+        bcrypt__min_rounds=min(bcrypt_floor or bcrypt_rounds, bcrypt_rounds),
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__time_cost=ARGON2_TIME_COST,
+        argon2__memory_cost=ARGON2_MEMORY_COST,
+        argon2__parallelism=ARGON2_PARALLELISM,
+    )
+
+
+# Module level context and functions so the cpu executor can run them in its
+# workers, configure() runs before the workers fork so they inherit the policy
+hash_context = build_context(PASSWORD_SCHEMES, BCRYPT_ROUNDS, BCRYPT_FLOOR_ROUNDS)
+bcrypt_rounds = BCRYPT_ROUNDS
+bcrypt_floor = min(BCRYPT_FLOOR_ROUNDS or BCRYPT_ROUNDS, BCRYPT_ROUNDS)
+
+
+def hash_password(password: str) -> str:
+    return hash_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return hash_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Verify a password, and when its hash is not in the current policy
+    also return a new hash of it to store, else None."""
+
+    return hash_context.verify_and_update(plain_password, hashed_password)
+
+
+def time_bcrypt(rounds: int, samples: int = 3) -> float:
+    """Fastest of a few bcrypt hashes at the given cost, in seconds."""
+
+    context = build_context(["bcrypt"], rounds)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration")
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def calibrate_bcrypt(target_ms: float) -> int:
+    """The bcrypt cost whose hash takes closest to target_ms here."""
+
+    elapsed = time_bcrypt(CALIBRATION_ROUNDS)
+    rounds = CALIBRATION_ROUNDS + round(math.log2(target_ms / 1000 / elapsed))
+    return max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, rounds))
+
+
+def configure():
+    """Set the hashing policy from the environment, calibrating the bcrypt
+    cost when PASSWORD_HASH_TARGET_MS is set. Called at startup before the
+    executors start."""
+
+    global hash_context, bcrypt_rounds, bcrypt_floor
+
+    for scheme in PASSWORD_SCHEMES:
+        handler = get_crypt_handler(scheme)
+        if hasattr(handler, "has_backend") and not handler.has_backend():
+            raise RuntimeError(f"password scheme {scheme} has no backend installed")
+
+    bcrypt_rounds = BCRYPT_ROUNDS
+    bcrypt_floor = BCRYPT_FLOOR_ROUNDS or BCRYPT_ROUNDS
+    if PASSWORD_HASH_TARGET_MS > 0:
+        bcrypt_rounds = calibrate_bcrypt(PASSWORD_HASH_TARGET_MS)
+        bcrypt_floor = BCRYPT_FLOOR_ROUNDS or bcrypt_rounds - 1
+    bcrypt_floor = max(BCRYPT_MIN_ROUNDS, min(bcrypt_floor, bcrypt_rounds))
+
+    hash_context = build_context(PASSWORD_SCHEMES, bcrypt_rounds, bcrypt_floor)
+    logger.info(
+        "password hashing with %s, bcrypt cost %s, rehashing under %s",
+        PASSWORD_SCHEMES[0],
+        bcrypt_rounds,
+        bcrypt_floor,
+    )
+
+
+def policy() -> dict:
+    return {
+        "schemes": PASSWORD_SCHEMES,
+        "bcrypt_rounds": bcrypt_rounds,
+        "bcrypt_floor": bcrypt_floor,
+        "target_ms": PASSWORD_HASH_TARGET_MS or None,
+    }
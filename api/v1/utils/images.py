@@ -0,0 +1,68 @@
+import io
+import os
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+
+load_dotenv()
+
+# Bounding boxes of the cover variants, the aspect ratio is kept
+IMAGE_VARIANTS = {
+    "thumb": (160, 240),
+    "medium": (400, 600),
+}
+IMAGE_FORMATS = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", 80))
+# Where the media route is mounted, variant urls are built from it
+MEDIA_URL = os.environ.get("MEDIA_URL", "/api/v1/media").rstrip("/")
+# Larger decodes are refused, a small file can still expand to a huge bitmap
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 40_000_000))
+
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+
+def variant_key(key: str, variant: str, format: str) -> str:
+    """Storage key of a variant, derived from the key of the original."""
+
+    return f"{key}-{variant}-{format}"
+
+
+def variant_urls(key: str | None) -> dict[str, dict[str, str]] | None:
+    """Urls of every variant of an image by size then format, None when the
+    image has no storage key (legacy and pending images)."""
+
+    if not key:
+        return None
+
+    return {
+        variant: {
+            format: f"{MEDIA_URL}/{key}/{variant}.{format}" for format in IMAGE_FORMATS
+        }
+        for variant in IMAGE_VARIANTS
+    }
+
+
+def render_variant(content: bytes, variant: str, format: str) -> bytes:
+    """Resize an image to fit the variant box and encode it. CPU bound, run
+    it on the cpu executor."""
+
+    with Image.open(io.BytesIO(content)) as image:
+        # decode at a reduced scale when the format allows it (jpeg)
+        image.draft("RGB", IMAGE_VARIANTS[variant])
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(IMAGE_VARIANTS[variant], Image.Resampling.LANCZOS)
+
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        if format == "jpeg" and image.mode == "RGBA":
+            # jpeg has no alpha, flatten on white instead of black
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+
+        output = io.BytesIO()
+        image.save(output, format=format.upper(), quality=IMAGE_QUALITY, optimize=True)
+
+    return output.getvalue()
@@ -0,0 +1,113 @@
+import os
+from email.message import EmailMessage
+from dotenv import load_dotenv
+import aiosmtplib
+
+load_dotenv()
+
+# "smtp" sends through EMAIL_HOST, "locmem" keeps messages in memory for
+# tests and local development
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "smtp")
+
+SENDER = os.environ.get("EMAIL_HOST_USER")
+PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT") or 587)
+EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS", "True") != "False"
+EMAIL_TIMEOUT = float(os.environ.get("EMAIL_TIMEOUT", 60))
+EMAIL_FROM = os.environ.get("EMAIL_FROM") or SENDER or "noreply@localhost"
+
+
+class MailError(Exception):
+    """A message could not be sent. Permanent errors (5xx replies) will not
+    succeed on a retry."""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+def build_message(recipient: str, subject: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = EMAIL_FROM
+    message["To"] = recipient
+    message.set_content(body)
+    return message
+
+
+class SMTPTransport:
+    """
+    Sends over one SMTP connection kept open between messages and batches.
+
+    The connection, STARTTLS and login happen once and are redone only after
+    the server drops the connection or the transport is closed.
+    """
+
+    def __init__(self):
+        self.client: aiosmtplib.SMTP | None = None
+        self.connections = 0
+
+    async def connect(self):
+        if self.client is not None and self.client.is_connected:
+            return
+
+        self.client = aiosmtplib.SMTP(
+            hostname=EMAIL_HOST,
+            port=EMAIL_PORT,
+            username=SENDER if PASSWORD else None,
+            password=PASSWORD,
+            start_tls=EMAIL_USE_TLS,
+            timeout=EMAIL_TIMEOUT,
+        )
+        await self.client.connect()
+        self.connections += 1
+
+    async def send(self, message: EmailMessage):
+        try:
+            try:
+                await self.connect()
+                await self.client.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                # an idle connection closed by the server, retry once on a
+                # fresh one
+                await self.close()
+                await self.connect()
+                await self.client.send_message(message)
+        except aiosmtplib.SMTPRecipientsRefused as e:
+            codes = [recipient.code for recipient in e.recipients]
+            raise MailError(str(e), permanent=all(code >= 500 for code in codes))
+        except aiosmtplib.SMTPResponseException as e:
+            raise MailError(f"{e.code} {e.message}", permanent=e.code >= 500)
+        except (aiosmtplib.SMTPException, OSError) as e:
+            await self.close()
+            raise MailError(str(e) or type(e).__name__)
+
+    async def close(self):
+        client, self.client = self.client, None
+
+        if client is not None and client.is_connected:
+            try:
+                await client.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                client.close()
+
+
+class LocmemTransport:
+    """Keeps sent messages in `outbox` instead of sending them."""
+
+    def __init__(self):
+        self.outbox: list[EmailMessage] = []
+        self.connections = 0
+
+    async def send(self, message: EmailMessage):
+        self.outbox.append(message)
+
+    async def close(self):
+        pass
+
+
+def get_transport():
+    if EMAIL_BACKEND == "locmem":
+        return LocmemTransport()
+    return SMTPTransport()
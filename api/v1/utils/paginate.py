@@ -1,10 +1,141 @@
+import os
+import time
+import base64
+import json
+from datetime import datetime
+from dotenv import load_dotenv
 from fastapi import HTTPException
 from sqlalchemy.orm import Session, Query
-from sqlalchemy import func
-from typing import Dict
+from sqlalchemy.orm.attributes import InstrumentedAttribute
+from sqlalchemy import event, tuple_, DateTime
+from typing import Callable, Dict, Hashable, Optional
+from api.v1.models.cache_version import CacheVersion
+from api.v1.utils.cache import TTLCache
 
+load_dotenv()
 
-def paginate_query(db: Session, query: Query, page: int = 1, limit: int = 10) -> Dict:
+MAX_LIMIT = 100
+
+count_cache = TTLCache(
+    maxsize=int(os.environ.get("COUNT_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("COUNT_CACHE_TTL", 60)),
+)
+# Seconds between two reads of a namespace's count version, a count cached
+# before a write in another worker is served at most that long after it
+COUNT_VERSION_CHECK = float(os.environ.get("COUNT_VERSION_CHECK", 1))
+
+# namespace: (version of the cached counts, when it was read)
+count_versions: dict[str, tuple[Optional[int], float]] = {}
+
+
+def count_version(db: Session, namespace: str) -> Optional[int]:
+    """The shared version of a namespace's counts, read from the database at
+    most every COUNT_VERSION_CHECK seconds."""
+
+    version, checked_at = count_versions.get(namespace, (None, 0.0))
+    if time.monotonic() - checked_at >= COUNT_VERSION_CHECK:
+        version = CacheVersion.current(db, f"count:{namespace}")
+        count_versions[namespace] = (version, time.monotonic())
+
+    return version
+
+
+def invalidate_counts(db: Session, namespace: str):
+    """Drop every cached count of a namespace in every worker, call it in the
+    transaction of a write that adds, removes or refilters rows."""
+
+    db.info.setdefault("count_versions", {})[namespace] = CacheVersion.bump(
+        db, f"count:{namespace}"
+    )
+
+
+def counts_committed(db: Session):
+    # this worker moves to the new version at once, the others on their next
+    # check
+    for namespace, version in db.info.pop("count_versions", {}).items():
+        count_versions[namespace] = (version, time.monotonic())
+
+
+def counts_rolled_back(db: Session):
+    db.info.pop("count_versions", None)
+
+
+event.listen(Session, "after_commit", counts_committed)
+event.listen(Session, "after_rollback", counts_rolled_back)
+
+
+def estimate_count(db: Session, query: Query) -> int:
+    """Row estimate from the postgres planner."""
+
+    bind = db.get_bind()
+    compiled = query.statement.compile(
+        dialect=bind.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    # asyncpg takes positional parameters, psycopg2 named ones
+    params = compiled.params
+    if compiled.positiontup is not None:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    plan = (
+        db.connection()
+        .exec_driver_sql("EXPLAIN (FORMAT JSON) " + compiled.string, params)
+        .scalar()
+    )
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_query(
+    db: Session,
+    query: Query,
+    strategy: str = "exact",
+    cache_key: Optional[tuple[str, Hashable]] = None,
+) -> tuple[Optional[int], str]:
+    """
+    Count the rows of a query with the given strategy.
+
+    Parameters:
+        - db: The SQLAlchemy session.
+        - query: The SQLAlchemy query object.
+        - strategy: "exact", "estimate" or "none".
+        - cache_key: (namespace, normalized filters). Exact counts are cached
+          under it until invalidate_counts(db, namespace) or the cache ttl.
+
+    Returns:
+        - The count and its type: "exact", "estimate" or "none".
+    """
+
+    if strategy == "none":
+        return None, "none"
+
+    query = query.order_by(None).enable_eagerloads(False)
+
+    if strategy == "estimate":
+        return estimate_count(db, query), "estimate"
+
+    if cache_key is None:
+        return query.count(), "exact"
+
+    namespace, filters = cache_key
+    key = (namespace, count_version(db, namespace), filters)
+
+    total_count = count_cache.get(key)
+    if total_count is None:
+        total_count = query.count()
+        count_cache.set(key, total_count)
+
+    return total_count, "exact"
+
+
+def paginate_query(
+    db: Session,
+    query: Query,
+    page: int = 1,
+    limit: int = 10,
+    count: str = "exact",
+    count_key: Optional[tuple[str, Hashable]] = None,
+    fetch: Optional[Callable[[int, int], list]] = None,
+) -> Dict:
     """
     Paginate a SQLAlchemy query without explicitly passing a model.
 
@@ -13,6 +144,10 @@ def paginate_query(db: Session, query: Query, page: int = 1, limit: int = 10) ->
         - query: The SQLAlchemy query object.
         - page: Current page number.
         - limit: Number of items per page.
+        - count: Count strategy, see count_query.
+        - count_key: Cache key for exact counts, see count_query.
+        - fetch: fetch(offset, limit) returning the rows of a page, for orders a
+          single offset query cannot serve. Defaults to the query itself.
 
     Returns:
         - A dictionary containing the paginated results, total count, current page, next, and previous page indicators.
@@ -25,29 +160,137 @@ def paginate_query(db: Session, query: Query, page: int = 1, limit: int = 10) ->
             status_code=400, detail="Page and limit must be greater than 0"
         )
 
-    # Get the total count by creating a subquery to count the rows in the query
+    limit = min(limit, MAX_LIMIT)
+
+    if count not in ("exact", "estimate", "none"):
+        raise HTTPException(
+            status_code=400, detail="Count must be one of exact, estimate or none"
+        )
+
+    # Get the total count with the requested strategy
 
-    total_count = query.with_entities(func.count()).scalar()
+    total_count, count_type = count_query(db, query, count, count_key)
 
     # Calculate the offset
 
     offset = (page - 1) * limit
 
-    # Fetch results for the current page with the limit and offset
+    # Fetch results for the current page with the limit and offset, plus one
+    # extra row so the next indicator does not depend on the count
 
-    results = query.offset(offset).limit(limit).all()
+    if fetch is not None:
+        results = fetch(offset, limit + 1)
+    else:
+        results = query.offset(offset).limit(limit + 1).all()
 
     # Calculate next and previous page indicators
 
-    next_page = page * limit < total_count  # True if there are more records
+    next_page = len(results) > limit  # True if there are more records
     prev_page = page > 1  # True if the current page is not the first page
+    results = results[:limit]
 
     # Construct the paginated response
 
     return {
         "count": total_count,
+        "count_type": count_type,
         "page": page,
         "next": next_page,
         "prev": prev_page,
         "results": results,
     }
+
+
+def encode_cursor(keys: tuple[InstrumentedAttribute, ...], row, direction: str) -> str:
+    """Build an opaque cursor from the sort key values of a row."""
+
+    values = []
+    for key in keys:
+        value = getattr(row, key.key)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+
+    payload = json.dumps({"k": values, "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(keys: tuple[InstrumentedAttribute, ...], cursor: str):
+    """Return the sort key values and direction stored in a cursor."""
+
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        values, direction = payload["k"], payload["d"]
+
+        if len(values) != len(keys) or direction not in ("next", "prev"):
+            raise ValueError("cursor does not match the sort key")
+
+        values = [
+            datetime.fromisoformat(value) if isinstance(key.type, DateTime) else value
+            for key, value in zip(keys, values)
+        ]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return values, direction
+
+
+def cursor_paginate_query(
+    query: Query,
+    keys: tuple[InstrumentedAttribute, ...],
+    cursor: Optional[str] = None,
+    limit: int = 10,
+) -> Dict:
+    """
+    Paginate a SQLAlchemy query with a keyset (seek) instead of an offset.
+
+    Parameters:
+        - query: The SQLAlchemy query object, without an order_by.
+        - keys: Unique sort key columns, newest first, e.g. (Model.created_at, Model.id).
+          An index over the same columns makes every page an index seek.
+        - cursor: Opaque token from a previous page, or None for the first page.
+        - limit: Number of items per page.
+
+    Returns:
+        - A dictionary containing the page results and the next and previous cursors.
+    """
+
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="Limit must be greater than 0")
+
+    limit = min(limit, MAX_LIMIT)
+    direction = "next"
+
+    if cursor:
+        values, direction = decode_cursor(keys, cursor)
+        if direction == "next":
+            query = query.filter(tuple_(*keys) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*keys) > tuple_(*values))
+
+    if direction == "next":
+        query = query.order_by(*[key.desc() for key in keys])
+    else:
+        query = query.order_by(*[key.asc() for key in keys])
+
+    # Fetch one extra row to know if there is another page in this direction
+
+    results = query.limit(limit + 1).all()
+    has_more = len(results) > limit
+    results = results[:limit]
+
+    if direction == "prev":
+        results.reverse()
+
+    has_next = has_more if direction == "next" else bool(cursor)
+    has_prev = bool(cursor) if direction == "next" else has_more
+
+    return {
+        "limit": limit,
+        "next_cursor": (
+            encode_cursor(keys, results[-1], "next") if has_next and results else None
+        ),
+        "prev_cursor": (
+            encode_cursor(keys, results[0], "prev") if has_prev and results else None
+        ),
+        "results": results,
+    }
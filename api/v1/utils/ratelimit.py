@@ -0,0 +1,213 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "memory" keeps the counters per worker process, "sqlite" shares them between
+# the workers of one host through a local file
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_PATH = os.environ.get("RATE_LIMIT_PATH", "./rate_limit.db")
+# Keys tracked before the least recently used is forgotten
+RATE_LIMIT_KEYS = int(os.environ.get("RATE_LIMIT_KEYS", 100_000))
+
+# A key's state is three floats whatever the algorithm:
+#   token bucket: (tokens left, time of the last refill, unused)
+#   sliding window: (start of the current window, its count, previous count)
+State = tuple[float, float, float]
+
+
+def bucket_step(
+    state: State | None, now: float, capacity: float, rate: float, cost: float
+) -> tuple[State, float]:
+    """Take cost tokens from a bucket holding up to capacity and refilled by
+    rate tokens a second. Returns the new state and 0 when they were taken,
+    else the seconds until they will be available."""
+
+    tokens, updated_at = (capacity, now) if state is None else state[:2]
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+
+    if tokens >= cost:
+        return (tokens - cost, now, 0.0), 0.0
+    return (tokens, now, 0.0), (cost - tokens) / rate
+
+
+def window_step(
+    state: State | None, now: float, limit: int, window: float
+) -> tuple[State, float]:
+    """Count a hit in a sliding window of `window` seconds allowing `limit`
+    hits. The window is approximated from the counts of the current and the
+    previous fixed window, weighted by their overlap. Returns the new state
+    and 0 when the hit is allowed, else the seconds until one will be."""
+
+    start = now - now % window
+    if state is None or state[0] < start - window:
+        current, previous = 0.0, 0.0
+    elif state[0] < start:
+        current, previous = 0.0, state[1]
+    else:
+        current, previous = state[1], state[2]
+
+    weight = 1 - (now - start) / window
+    if current + previous * weight + 1 <= limit:
+        return (start, current + 1, previous), 0.0
+
+    # the previous window's share shrinks until the hit fits, at the latest
+    # the next window starts with only this one's count behind it
+    if previous and current + 1 <= limit:
+        fits_at = 1 - (limit - current - 1) / previous
+        retry_after = (fits_at - (1 - weight)) * window
+    else:
+        retry_after = start + window - now
+    return (start, current, previous), max(retry_after, 0.001)
+
+
+class RateLimiter:
+    """
+    Token buckets and sliding window counters held in process memory.
+
+    Each key costs one tuple of three floats in an LRU bounded to `maxsize`
+    keys, a forgotten key starts over with a full allowance.
+
+    Parameters:
+        - maxsize: Number of keys kept before the least recently used is dropped.
+    """
+
+    backend = "memory"
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self.allowed = 0
+        self.limited = 0
+        self._data: OrderedDict[str, State] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _step(self, key: str, step) -> float:
+        now = time.time()
+
+        with self._lock:
+            state, retry_after = step(self._data.get(key), now)
+            self._data[key] = state
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+        return self._count(retry_after)
+
+    def _count(self, retry_after: float) -> float:
+        if retry_after:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def take(self, key: str, capacity: float, rate: float, cost: float = 1) -> float:
+        """Token bucket, see bucket_step. Returns 0 or the retry delay."""
+
+        return self._step(
+            key, lambda state, now: bucket_step(state, now, capacity, rate, cost)
+        )
+
+    def hit(self, key: str, limit: int, window: float) -> float:
+        """Sliding window, see window_step. Returns 0 or the retry delay."""
+
+        return self._step(
+            key, lambda state, now: window_step(state, now, limit, window)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "keys": len(self),
+            "maxsize": self.maxsize,
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """
+    RateLimiter stored in a local sqlite file, shared by every process of a
+    host. Each step is one read and one write in an immediate transaction.
+    Allowed and limited counters are per process.
+
+    Parameters:
+        - path: The sqlite file.
+        - maxsize: Number of keys kept before the least recently used is dropped.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, maxsize: int = 100_000):
+        super().__init__(maxsize)
+        self.path = path
+        self._local = threading.local()
+
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit ("
+                "key TEXT PRIMARY KEY, a REAL NOT NULL, b REAL NOT NULL, "
+                "c REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_rate_limit_accessed_at "
+                "ON rate_limit (accessed_at)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+
+        return connection
+
+    def _step(self, key: str, step) -> float:
+        now = time.time()
+
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+
+            row = connection.execute(
+                "SELECT a, b, c FROM rate_limit WHERE key = ?", (key,)
+            ).fetchone()
+            state, retry_after = step(row, now)
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limit (key, a, b, c, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, *state, now),
+            )
+
+            # trimmed now and then rather than on every step
+            if self.allowed % 1000 == 0:
+                connection.execute(
+                    "DELETE FROM rate_limit WHERE key IN ("
+                    "SELECT key FROM rate_limit ORDER BY accessed_at LIMIT max(0, "
+                    "(SELECT count(*) FROM rate_limit) - ?))",
+                    (self.maxsize,),
+                )
+
+        return self._count(retry_after)
+
+    def __len__(self) -> int:
+        return (
+            self._connection().execute("SELECT count(*) FROM rate_limit").fetchone()[0]
+        )
+
+
+def rate_limiter() -> RateLimiter:
+    """A rate limiter with the RATE_LIMIT_* settings."""
+
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteRateLimiter(RATE_LIMIT_PATH, RATE_LIMIT_KEYS)
+    return RateLimiter(RATE_LIMIT_KEYS)
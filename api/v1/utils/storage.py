@@ -1,31 +1,195 @@
 from dotenv import load_dotenv
 import os
+import base64
+import binascii
+import hashlib
+import tempfile
+import mimetypes
+import threading
+from typing import BinaryIO, Union
+import httpx
 
 load_dotenv()
 
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
+# "cloudinary", or "local" to keep files on disk for tests and development
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "cloudinary")
+STORAGE_LOCAL_DIR = os.environ.get("STORAGE_LOCAL_DIR", "./media")
+STORAGE_LOCAL_URL = os.environ.get("STORAGE_LOCAL_URL", "/media")
+CLOUDINARY_FOLDER = os.environ.get("CLOUDINARY_FOLDER", "chat-stream-api")
+# Reading a stored file back, to render its variants
+STORAGE_FETCH_TIMEOUT = float(os.environ.get("STORAGE_FETCH_TIMEOUT", 10))
+STORAGE_FETCH_MAX_BYTES = int(os.environ.get("STORAGE_FETCH_MAX_BYTES", 20_000_000))
 
-config = cloudinary.config(
-    cloud_name=os.environ.get("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.environ.get("CLOUDINARY_API_KEY"),
-    api_secret=os.environ.get("CLOUDINARY_API_SECRET"),
-    secure=True,
-)
+HASH_CHUNK_SIZE = 64 * 1024
+# Image values a client may send: a url the backend fetches, or a data uri
+SOURCE_PREFIXES = ("http://", "https://", "data:")
 
+# What a backend stores: the content, or a remote url it may fetch itself
+Payload = Union[bytes, BinaryIO, str]
 
-def upload(file):
-    """File upload handler
-    :usage: res = upload(request_file.file.read())
+
+def read_source(source) -> tuple[str, Payload, str | None]:
+    """Split an upload source into (key, payload, content type).
+
+    Bytes, readable files and data uris are keyed by the sha256 of their
+    content, so identical images share a key whatever their origin. Remote
+    urls are keyed by the hash of the url, fetching them only to hash them
+    would cost as much as the upload it saves. Server paths and data uris
+    that are not valid base64 are refused with a ValueError.
     """
 
-    response = cloudinary.uploader.upload(
-        file,
-        unique_filename=False,
-        overwrite=True,
-        asset_folder="chat-stream-api",
-        resource_type="auto",
-    )
+    if isinstance(source, str) and source.startswith(("http://", "https://")):
+        key = hashlib.sha256(source.encode()).hexdigest()
+        return key, source, mimetypes.guess_type(source)[0]
+
+    content_type = None
+    if isinstance(source, str):
+        if not source.startswith(SOURCE_PREFIXES):
+            raise ValueError("image must be an http(s) url or a data uri")
+        header, _, data = source.partition(",")
+        content_type = header[5:].split(";")[0] or None
+        try:
+            source = base64.b64decode(data, validate=True)
+        except binascii.Error:
+            raise ValueError("image is not a valid base64 data uri")
+
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest(), source, content_type
+
+    # a file opened from a path is typed by its extension
+    name = getattr(source, "name", None)
+    if isinstance(name, str):
+        content_type = mimetypes.guess_type(name)[0]
+
+    digest = hashlib.sha256()
+    source.seek(0)
+    while chunk := source.read(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    source.seek(0)
+
+    return digest.hexdigest(), source, content_type
+
+
+class StorageBackend:
+    """Where uploaded files live. put() stores a payload under a content key
+    and returns its public url, storing the same key twice must be harmless."""
+
+    name = ""
+
+    def put(self, key: str, payload: Payload, content_type: str | None = None) -> str:
+        raise NotImplementedError
+
+    def get(self, url: str) -> bytes:
+        """Content of a url returned by put()."""
+
+        content = bytearray()
+        with httpx.stream(
+            "GET", url, timeout=STORAGE_FETCH_TIMEOUT, follow_redirects=True
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                content += chunk
+                if len(content) > STORAGE_FETCH_MAX_BYTES:
+                    raise ValueError(f"{url} is larger than {STORAGE_FETCH_MAX_BYTES}")
+
+        return bytes(content)
+
+
+class LocalStorage(StorageBackend):
+    """Files under a local directory, named by key, for tests and development.
+    Remote urls are kept as given."""
+
+    name = "local"
+
+    def __init__(self, directory: str, base_url: str):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+
+    def put(self, key: str, payload: Payload, content_type: str | None = None) -> str:
+        if isinstance(payload, str):
+            return payload
+
+        name = key + (mimetypes.guess_extension(content_type or "") or "")
+        path = os.path.join(self.directory, name)
+
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            # written aside and renamed so a reader never sees half a file
+            with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as file:
+                if isinstance(payload, bytes):
+                    file.write(payload)
+                else:
+                    while chunk := payload.read(HASH_CHUNK_SIZE):
+                        file.write(chunk)
+            os.replace(file.name, path)
+
+        return f"{self.base_url}/{name}"
+
+    def get(self, url: str) -> bytes:
+        if not url.startswith(self.base_url + "/"):
+            return super().get(url)
+
+        name = os.path.basename(url)
+        with open(os.path.join(self.directory, name), "rb") as file:
+            return file.read()
+
+
+class CloudinaryStorage(StorageBackend):
+    """Cloudinary, configured on first use so importing the app needs neither
+    the credentials nor a client."""
+
+    name = "cloudinary"
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.uploader = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self.uploader is None:
+                import cloudinary
+                import cloudinary.uploader
+
+                cloudinary.config(
+                    cloud_name=os.environ.get("CLOUDINARY_CLOUD_NAME"),
+                    api_key=os.environ.get("CLOUDINARY_API_KEY"),
+                    api_secret=os.environ.get("CLOUDINARY_API_SECRET"),
+                    secure=True,
+                )
+                self.uploader = cloudinary.uploader
+
+            return self.uploader
+
+    def put(self, key: str, payload: Payload, content_type: str | None = None) -> str:
+        # the key is the public id, an existing asset is returned untouched
+        response = self.client().upload(
+            payload,
+            public_id=key,
+            unique_filename=False,
+            overwrite=False,
+            asset_folder=self.folder,
+            resource_type="auto",
+        )
+
+        return response.get("secure_url")
+
+
+storage_backends = {
+    "local": lambda: LocalStorage(STORAGE_LOCAL_DIR, STORAGE_LOCAL_URL),
+    "cloudinary": lambda: CloudinaryStorage(CLOUDINARY_FOLDER),
+}
+_storage: StorageBackend | None = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """The STORAGE_BACKEND backend, created on first use."""
+
+    global _storage
+
+    with _storage_lock:
+        if _storage is None:
+            _storage = storage_backends[STORAGE_BACKEND]()
+        return _storage
 
-    return response.get("secure_url")
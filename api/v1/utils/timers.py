@@ -0,0 +1,65 @@
+import heapq
+import threading
+
+
+class TimerHeap:
+    """
+    Deadlines keyed by id, the earliest found in O(1) and popped in
+    O(log n).
+
+    Rescheduling or cancelling a key leaves its old entry in the heap, it is
+    skipped when it reaches the top. Keys are the ids of rows, deadlines are
+    unix timestamps.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, str]] = []
+        self._deadlines: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, key: str, deadline: float):
+        with self._lock:
+            self._deadlines[key] = deadline
+            heapq.heappush(self._heap, (deadline, key))
+
+    def cancel(self, key: str):
+        with self._lock:
+            self._deadlines.pop(key, None)
+
+    def _drop_stale(self):
+        while self._heap:
+            deadline, key = self._heap[0]
+            if self._deadlines.get(key) == deadline:
+                return
+            heapq.heappop(self._heap)
+
+    def next_deadline(self) -> float | None:
+        """The earliest deadline, None when nothing is scheduled."""
+
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float, limit: int) -> list[str]:
+        """Remove and return up to limit keys whose deadline is past, the
+        earliest first."""
+
+        due = []
+
+        with self._lock:
+            self._drop_stale()
+            while self._heap and self._heap[0][0] <= now and len(due) < limit:
+                _, key = heapq.heappop(self._heap)
+                del self._deadlines[key]
+                due.append(key)
+                self._drop_stale()
+
+        return due
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+            self._deadlines.clear()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
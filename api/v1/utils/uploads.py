@@ -0,0 +1,256 @@
+import os
+from dataclasses import dataclass, field
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Mapping
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from multipart.multipart import (
+    MultipartParseError,
+    MultipartParser,
+    parse_options_header,
+)
+from api.v1.utils.executors import io_executor
+
+load_dotenv()
+
+# Largest file accepted in a multipart upload, larger ones fail with a 413
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+# A file is held in memory up to this size, then spooled to a temporary file
+UPLOAD_MEMORY_BYTES = int(os.environ.get("UPLOAD_MEMORY_BYTES", 1024 * 1024))
+# Total size of the plain form fields, which are always held in memory
+UPLOAD_FIELDS_MAX_BYTES = int(os.environ.get("UPLOAD_FIELDS_MAX_BYTES", 64 * 1024))
+
+# First bytes of the image formats a cover may be uploaded in, webp is matched
+# apart since its magic bytes follow the RIFF header and size
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"GIF87a": "image/gif",
+    b"GIF89a": "image/gif",
+}
+SNIFF_BYTES = 12
+
+
+def sniff_image(head: bytes) -> str | None:
+    """Content type of an image from its first bytes, or None when it is not
+    an accepted image. The content type the client declares is not trusted."""
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+
+    for magic, content_type in IMAGE_SIGNATURES.items():
+        if head.startswith(magic):
+            return content_type
+
+    return None
+
+
+@dataclass
+class ImageForm:
+    """A multipart form: its plain fields with all their values, and the
+    image, spooled to a temporary file, with its sniffed content type."""
+
+    fields: dict[str, list[str]] = field(default_factory=dict)
+    file: SpooledTemporaryFile | None = None
+    content_type: str | None = None
+    size: int = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class ImageFormParser:
+    """
+    Streaming multipart/form-data parser for a form with one image file.
+
+    The body is fed to python-multipart chunk by chunk. The file part is
+    written to a SpooledTemporaryFile as it arrives, so at most
+    UPLOAD_MEMORY_BYTES of it is ever held in memory. A file past
+    UPLOAD_MAX_BYTES fails with a 413 and one that does not start like an
+    image with a 415, as soon as the bytes that show it are read.
+
+    Parameters:
+        - file_field: Name of the file field, other file fields are refused.
+    """
+
+    def __init__(self, file_field: str):
+        self.file_field = file_field
+        self.form = ImageForm()
+        self.fields_size = 0
+        self.ended = False
+        self.name = ""
+        self.is_file = False
+        self.value = bytearray()
+        self.header_name = b""
+        self.header_value = b""
+        self.disposition = b""
+        self.pending: list[bytes] = []
+        self.head = b""
+
+    def on_part_begin(self):
+        self.disposition = b""
+        self.value = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        if self.header_name.lower() == b"content-disposition":
+            self.disposition = self.header_value
+        self.header_name = b""
+        self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.disposition)
+        if b"name" not in options:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="every form part must have a name",
+            )
+
+        self.name = options[b"name"].decode("utf-8", errors="replace")
+        self.is_file = b"filename" in options
+        if not self.is_file:
+            return
+
+        if self.name != self.file_field or self.form.file is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"only one file is accepted, in the {self.file_field} field",
+            )
+
+        self.form.file = SpooledTemporaryFile(max_size=UPLOAD_MEMORY_BYTES)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        chunk = data[start:end]
+
+        if not self.is_file:
+            self.fields_size += len(chunk)
+            if self.fields_size > UPLOAD_FIELDS_MAX_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="form fields are too large",
+                )
+            self.value += chunk
+            return
+
+        self.form.size += len(chunk)
+        if self.form.size > UPLOAD_MAX_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"file is larger than {UPLOAD_MAX_BYTES} bytes",
+            )
+
+        if self.form.content_type is None:
+            self.head += chunk[:SNIFF_BYTES]
+            if len(self.head) >= SNIFF_BYTES:
+                self.sniff()
+
+        self.pending.append(chunk)
+
+    def on_part_end(self):
+        if not self.is_file:
+            value = self.value.decode("utf-8", errors="replace")
+            self.form.fields.setdefault(self.name, []).append(value)
+        elif self.form.size == 0:
+            # browsers send an empty file part when no file was picked
+            self.form.close()
+            self.form.file = None
+        elif self.form.content_type is None:
+            # shorter than SNIFF_BYTES
+            self.sniff()
+
+    def on_end(self):
+        self.ended = True
+
+    def sniff(self):
+        self.form.content_type = sniff_image(self.head)
+        if self.form.content_type is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="file must be a jpeg, png, gif or webp image",
+            )
+
+    def flush(self):
+        for chunk in self.pending:
+            self.form.file.write(chunk)
+        self.pending.clear()
+
+    async def parse(
+        self, headers: Mapping[str, str], stream: AsyncIterator[bytes]
+    ) -> ImageForm:
+        content_type, options = parse_options_header(headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="body must be multipart/form-data",
+            )
+
+        # a body announced larger than the limits is refused before reading it
+        length = headers.get("content-length", "")
+        limit = UPLOAD_MAX_BYTES + UPLOAD_FIELDS_MAX_BYTES
+        if length.isdigit() and int(length) > limit:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"file is larger than {UPLOAD_MAX_BYTES} bytes",
+            )
+
+        parser = MultipartParser(
+            options[b"boundary"],
+            {
+                "on_part_begin": self.on_part_begin,
+                "on_part_data": self.on_part_data,
+                "on_part_end": self.on_part_end,
+                "on_header_field": self.on_header_field,
+                "on_header_value": self.on_header_value,
+                "on_header_end": self.on_header_end,
+                "on_headers_finished": self.on_headers_finished,
+                "on_end": self.on_end,
+            },
+        )
+
+        try:
+            async for chunk in stream:
+                parser.write(chunk)
+                if not self.pending:
+                    continue
+                # past the memory threshold the file is on disk, written off
+                # the event loop
+                if self.form.size > UPLOAD_MEMORY_BYTES:
+                    await io_executor.arun(self.flush)
+                else:
+                    self.flush()
+        except MultipartParseError:
+            self.form.close()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="malformed multipart body",
+            )
+        except BaseException:
+            self.form.close()
+            raise
+
+        if not self.ended:
+            self.form.close()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="incomplete multipart body",
+            )
+
+        if self.form.file is not None:
+            self.form.file.seek(0)
+
+        return self.form
+
+
+async def parse_image_form(
+    headers: Mapping[str, str], stream: AsyncIterator[bytes], file_field: str
+) -> ImageForm:
+    """Parse a multipart/form-data body with one image file, see
+    ImageFormParser. The caller closes the returned form."""
+
+    return await ImageFormParser(file_field).parse(headers, stream)
@@ -0,0 +1,19 @@
+from sqlalchemy.dialects import postgresql
+
+
+def insert_ignore(table, index_elements: list[str]):
+    """
+    Build an INSERT that skips rows conflicting on index_elements.
+
+    Parameters:
+        - table: Mapped class or Table to insert into.
+        - index_elements: Columns of the unique constraint to ignore conflicts on.
+
+    Returns:
+        - The insert statement. Execute it with a list of rows, which SQLAlchemy
+          sends as batched multi-row VALUES; add .returning(...) if needed.
+    """
+
+    return postgresql.insert(table).on_conflict_do_nothing(
+        index_elements=index_elements
+    )
@@ -0,0 +1,108 @@
+"""Credential stuffing burst with and without admission control.
+
+Starts the app under uvicorn, fires --logins concurrent POST /account/login
+with wrong passwords for one account from one client, and meanwhile probes
+GET / every 10ms. "off" raises every limit out of reach so each attempt runs
+bcrypt, "on" uses the shipped limits. Reports how many attempts reached
+bcrypt, how many were refused and how long every other request waited.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.auth_admission --logins 200
+"""
+
+import os
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+import httpx
+from benchmarks.login_burst import create_user
+
+PORT = 8767
+
+UNLIMITED = {
+    "AUTH_IP_BURST": "1000000",
+    "LOGIN_ACCOUNT_LIMIT": "1000000",
+    "AUTH_CONCURRENCY": "1000000",
+}
+
+
+async def burst(logins: int, email: str):
+    base_url = f"http://127.0.0.1:{PORT}/"
+    limits = httpx.Limits(max_connections=logins + 1)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as http:
+        for _ in range(100):
+            try:
+                await http.get("/")
+                break
+            except httpx.ConnectError:
+                await asyncio.sleep(0.1)
+
+        probes = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await http.get("/")
+                probes.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        async def login():
+            response = await http.post(
+                "/api/v1/account/login", json={"email": email, "password": "wrong"}
+            )
+            return response.status_code
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        codes = await asyncio.gather(*[login() for _ in range(logins)])
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+
+    probes.sort()
+    return {
+        "seconds": elapsed,
+        "probe p50": statistics.median(probes),
+        "probe max": probes[-1],
+        "status": Counter(codes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':<6}{'seconds':>9}{'bcrypt':>8}{'refused':>9}{'probe p50':>12}"
+        f"{'probe max':>12}"
+    )
+    for mode in ("off", "on"):
+        email, _ = create_user()
+        env = {**os.environ, **(UNLIMITED if mode == "off" else {})}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app"]
+            + ["--port", str(PORT), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            result = asyncio.run(burst(args.logins, email))
+        finally:
+            server.terminate()
+            server.wait()
+
+        status = result["status"]
+        refused = status[429] + status[503]
+        print(
+            f"{mode:<6}{result['seconds']:>9.1f}{status[400]:>8}{refused:>9}"
+            f"{result['probe p50']:>10.1f}ms{result['probe max']:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Concurrent borrows of one hot book: read-check-write vs locked vs conditional.
+
+Creates --borrowers users and, for each mode, a book, then has every user
+borrow it from --threads threads, each with its own connection. "naive"
+reads copies_available and writes back one less, the way Book.borrow_book
+worked; "locked" does the same under SELECT ... FOR UPDATE; "conditional" is
+the shipped LoanService.borrow, a single conditional UPDATE.
+
+Each mode runs twice: "stock" with a copy for every borrower measures
+borrows/s, "hot" with only --copies copies has most borrowers refused and
+checks that no more loans were granted than copies and that
+copies_available plus the open loans still adds up to the copies.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.borrow_contention
+"""
+
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func, select, update
+from sqlalchemy.orm import sessionmaker
+from api.v1.models import Book, Category, Loan, User
+from api.v1.services.loan import loan_service
+from api.v1.utils.database import SQLALCHEMY_DATABASE_URL, SessionLocal
+
+
+def seed(borrowers: int) -> list[User]:
+    with SessionLocal(expire_on_commit=False) as db:
+        users = [
+            User(
+                username=f"borrow-{uuid.uuid4().hex[:8]}",
+                email=f"borrow-{uuid.uuid4().hex[:8]}@example.com",
+                password="unused",
+                is_active=True,
+            )
+            for _ in range(borrowers)
+        ]
+        db.add_all(users)
+        db.commit()
+
+        return users
+
+
+def create_book(copies: int) -> str:
+    with SessionLocal() as db:
+        category = db.scalar(select(Category).where(Category.name == "bench"))
+        if category is None:
+            category = Category(name="bench")
+            db.add(category)
+            db.flush()
+
+        book = Book(
+            title=f"hot book {uuid.uuid4().hex[:8]}",
+            authors=["bench"],
+            publishers=["bench"],
+            image="unused",
+            year=2024,
+            isbn=uuid.uuid4().hex,
+            category_id=category.id,
+            copies_available=copies,
+            total_copies=copies,
+        )
+        db.add(book)
+        db.commit()
+
+        return book.id
+
+
+def lend(db, book_id: str, user: User):
+    now = datetime.now(timezone.utc)
+    db.add(
+        Loan(
+            book_id=book_id,
+            user_id=user.id,
+            borrowed_at=now,
+            due_at=now + loan_service.period,
+        )
+    )
+    db.commit()
+
+
+def naive(db, book_id: str, user: User):
+    copies = db.scalar(select(Book.copies_available).where(Book.id == book_id))
+    if copies < 1:
+        raise HTTPException(status_code=409)
+    db.execute(
+        update(Book).where(Book.id == book_id).values(copies_available=copies - 1)
+    )
+    lend(db, book_id, user)
+
+
+def locked(db, book_id: str, user: User):
+    copies = db.scalar(
+        select(Book.copies_available).where(Book.id == book_id).with_for_update()
+    )
+    if copies < 1:
+        raise HTTPException(status_code=409)
+    db.execute(
+        update(Book).where(Book.id == book_id).values(copies_available=copies - 1)
+    )
+    lend(db, book_id, user)
+
+
+def conditional(db, book_id: str, user: User):
+    loan_service.borrow(db, book_id, user)
+
+
+MODES = {"naive": naive, "locked": locked, "conditional": conditional}
+
+
+def run(mode: str, users: list[User], copies: int, threads: int) -> dict:
+    book_id = create_book(copies)
+    borrow = MODES[mode]
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=threads)
+    # like the app's sessions, objects stay loaded after commit
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    granted, refused, failed = [], [], []
+
+    def attempt(user: User):
+        with Session() as db:
+            try:
+                borrow(db, book_id, user)
+                granted.append(user.id)
+            except HTTPException:
+                refused.append(user.id)
+            except Exception:
+                failed.append(user.id)
+
+    with ThreadPoolExecutor(threads) as pool:
+        # open every connection before timing
+        list(pool.map(lambda _: engine.connect().close(), range(threads)))
+        start = time.perf_counter()
+        list(pool.map(attempt, users))
+        elapsed = time.perf_counter() - start
+
+    with SessionLocal() as db:
+        available = db.scalar(select(Book.copies_available).where(Book.id == book_id))
+        loans = db.scalar(
+            select(func.count())
+            .select_from(Loan)
+            .where(Loan.book_id == book_id, Loan.returned_at.is_(None))
+        )
+    engine.dispose()
+
+    return {
+        "borrows/s": len(users) / elapsed,
+        "granted": len(granted),
+        "refused": len(refused),
+        "failed": len(failed),
+        "oversold": max(0, loans - copies),
+        "lost": available + loans - copies,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--borrowers", type=int, default=2000)
+    parser.add_argument("--copies", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    users = seed(args.borrowers)
+
+    print(
+        f"{'mode':<13}{'book':<7}{'borrows/s':>10}{'granted':>9}{'refused':>9}"
+        f"{'failed':>8}{'oversold':>10}{'lost':>6}"
+    )
+    for mode in MODES:
+        for book, copies in (("stock", args.borrowers), ("hot", args.copies)):
+            result = run(mode, users, copies, args.threads)
+            print(
+                f"{mode:<13}{book:<7}{result['borrows/s']:>10.1f}"
+                f"{result['granted']:>9}{result['refused']:>9}{result['failed']:>8}"
+                f"{result['oversold']:>10}{result['lost']:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
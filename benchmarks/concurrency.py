@@ -0,0 +1,144 @@
+"""Throughput of the book listing under concurrent clients, sync vs async session.
+
+Serves the book listing twice from one app: "sync" runs BookService on the
+blocking Session inside an async route (how every route worked before the
+AsyncSession stack), "async" runs it through async_book_service on an
+AsyncSession. The result cache is disabled so every request hits the database.
+
+--latency adds a pg_sleep round trip to each request to stand in for a
+database on another host: on a single machine Postgres and the app share
+the same cores, so only the time spent waiting can overlap.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.concurrency --clients 100
+"""
+
+import os
+
+os.environ["RESULT_CACHE_SIZE"] = "0"
+
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.v1.utils.database import SessionLocal
+from api.v1.utils.dependencies import get_async_db
+from api.v1.services.book import book_service, async_book_service
+from benchmarks.search import seed
+
+LATENCY = text("SELECT pg_sleep(:seconds)")
+SEARCHES = ["orwell", "silent river", "penguin classic", "dystopia", "tolstoy war"]
+
+PORT = 8765
+
+app = FastAPI()
+app.state.latency = float(os.environ.get("BENCH_LATENCY", 0))
+
+
+@app.get("/sync/books")
+async def sync_books(search: str = "", page: int = 1):
+    with SessionLocal() as db:
+        if app.state.latency:
+            db.execute(LATENCY, {"seconds": app.state.latency})
+        return book_service.fetch_all(db, search, "", page, 10, None, "estimate")
+
+
+@app.get("/async/books")
+async def async_books(
+    search: str = "", page: int = 1, db: AsyncSession = Depends(get_async_db)
+):
+    if app.state.latency:
+        await db.execute(LATENCY, {"seconds": app.state.latency})
+    return await async_book_service.fetch_all(
+        db, search, "", page, 10, None, "estimate"
+    )
+
+
+async def run(
+    mode: str, clients: int, requests: int, search: bool
+) -> tuple[float, list[float]]:
+    latencies = []
+    queue = asyncio.Queue()
+    for number in range(requests):
+        if search:
+            queue.put_nowait({"search": SEARCHES[number % len(SEARCHES)]})
+        else:
+            queue.put_nowait({"page": number % 50 + 1})
+
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=120
+    ) as http:
+
+        async def client():
+            while not queue.empty():
+                params = queue.get_nowait()
+                start = time.perf_counter()
+                response = await http.get(f"/{mode}/books", params=params)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(clients)])
+        elapsed = time.perf_counter() - start
+
+    return requests / elapsed, latencies
+
+
+async def wait_until_up():
+    async with httpx.AsyncClient() as http:
+        for _ in range(100):
+            try:
+                await http.get(f"http://127.0.0.1:{PORT}/docs")
+                return
+            except httpx.ConnectError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("benchmark server did not start")
+
+
+async def bench(args):
+    print(f"{'mode':<8}{'req/s':>10}{'p50':>12}{'p99':>12}")
+    for mode in ("sync", "async"):
+        # warm up the pools and the taxonomy cache
+        await run(mode, 10, 50, args.search)
+        throughput, latencies = await run(
+            mode, args.clients, args.requests, args.search
+        )
+        latencies.sort()
+        p50 = statistics.median(latencies)
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"{mode:<8}{throughput:>10.1f}{p50:>10.2f}ms{p99:>10.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds")
+    parser.add_argument("--search", action="store_true", help="ranked search pages")
+    args = parser.parse_args()
+
+    seed(args.books)
+
+    # one uvicorn worker, the client runs in this process
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.concurrency:app"]
+        + ["--port", str(PORT), "--log-level", "warning"],
+        env={**os.environ, "BENCH_LATENCY": str(args.latency / 1000)},
+    )
+    try:
+        asyncio.run(wait_until_up())
+        asyncio.run(bench(args))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
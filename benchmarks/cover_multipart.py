@@ -0,0 +1,170 @@
+"""Peak memory of POST /books with a cover, base64 in json vs a multipart file.
+
+Both bodies are streamed to the app in 48KiB chunks of a --size MiB
+jpeg-like file, so the client holds no copy. Each request is sent twice:
+once timed, once under tracemalloc for the peak Python memory it allocated.
+The json body is read, decoded and validated whole; the multipart file is
+spooled to disk past UPLOAD_MEMORY_BYTES and copied to the spool directory
+in chunks.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.cover_multipart --size 1 8 32
+"""
+
+import os
+import tempfile
+
+directory = tempfile.mkdtemp(prefix="bookvault-bench-")
+os.environ.update(
+    {
+        "STORAGE_BACKEND": "local",
+        "STORAGE_LOCAL_DIR": os.path.join(directory, "media"),
+        "IMAGE_UPLOAD_SPOOL_DIR": os.path.join(directory, "spool"),
+        "UPLOAD_MAX_BYTES": str(1024 * 1024 * 1024),
+    }
+)
+
+import json
+import base64
+import argparse
+import asyncio
+import time
+import tracemalloc
+import uuid
+import httpx
+from api.v1.models import User
+from api.v1.models.user import Role
+from api.v1.services.user import user_service
+from api.v1.utils.database import SessionLocal
+
+CHUNK = 48 * 1024  # a multiple of 3, so chunks encode to base64 on their own
+
+
+def admin_token() -> str:
+    with SessionLocal() as db:
+        user = User(
+            username=f"bench-{uuid.uuid4().hex[:8]}",
+            email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+            password="unused",
+            role=Role.admin,
+            is_active=True,
+        )
+        db.add(user)
+        db.commit()
+        return user_service.generate_access_token(db, user)["token"]
+
+
+def fields() -> dict:
+    tag = uuid.uuid4().hex[:12]
+    return {
+        "title": f"Bench multipart {tag}",
+        "authors": ["Bench"],
+        "publishers": ["Bench"],
+        "year": 2000,
+        "genre": ["bench"],
+        "isbn": f"bench-{tag}",
+        "category": "bench",
+        "total_copies": 1,
+    }
+
+
+def file_chunks(size: int):
+    """size bytes starting like a jpeg, generated as they are sent."""
+
+    sent = 0
+    while sent < size:
+        chunk = os.urandom(min(CHUNK, size - sent))
+        if sent == 0:
+            chunk = b"\xff\xd8\xff" + chunk[3:]
+        sent += len(chunk)
+        yield chunk
+
+
+async def json_body(size: int):
+    head, _, tail = json.dumps({**fields(), "image": "@"}).partition('"@"')
+    yield (head + '"data:image/jpeg;base64,').encode()
+    for chunk in file_chunks(size):
+        yield base64.b64encode(chunk)
+    yield ('"' + tail).encode()
+
+
+async def multipart_body(size: int, boundary: str):
+    for name, value in fields().items():
+        for item in value if isinstance(value, list) else [value]:
+            yield (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+                f"\r\n\r\n{item}\r\n"
+            ).encode()
+
+    yield (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; '
+        'filename="cover.jpg"\r\nContent-Type: image/jpeg\r\n\r\n'
+    ).encode()
+    for chunk in file_chunks(size):
+        yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+async def send(http: httpx.AsyncClient, mode: str, size: int):
+    if mode == "json":
+        path, content = "/api/v1/books", json_body(size)
+        headers = {"Content-Type": "application/json"}
+    else:
+        boundary = uuid.uuid4().hex
+        path, content = "/api/v1/books/upload", multipart_body(size, boundary)
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+    response = await http.post(path, content=content, headers=headers)
+    response.raise_for_status()
+
+
+async def measure(http: httpx.AsyncClient, mode: str, size: int) -> tuple:
+    start = time.perf_counter()
+    await send(http, mode, size)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    # tracing slows every allocation down, it is left out of the timing
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await send(http, mode, size)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return peak, elapsed
+
+
+async def bench(args):
+    from main import app
+
+    token = admin_token()
+    transport = httpx.ASGITransport(app=app)
+
+    print(f"{'mode':<11}{'file':>8}{'peak':>11}{'time':>10}")
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url="http://bench",
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=300,
+    ) as http:
+        # first requests warm up imports and pools outside the measure
+        await send(http, "json", 1024)
+        await send(http, "multipart", 1024)
+
+        for size in args.size:
+            for mode in ("json", "multipart"):
+                peak, elapsed = await measure(http, mode, int(size * 1024 * 1024))
+                print(
+                    f"{mode:<11}{size:>5.0f}MiB{peak / 1024 / 1024:>8.1f}MiB"
+                    f"{elapsed:>8.0f}ms"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=float, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
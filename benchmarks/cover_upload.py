@@ -0,0 +1,125 @@
+"""POST /books latency against a slow image host, inline upload vs the queue.
+
+The storage backend is replaced by one that sleeps --upload-latency
+milliseconds per upload.
+"inline" uploads inside the request like add_book did before the upload
+queue, "queued" is the shipped code: the book is saved with a pending image
+and the request returns without waiting on the image host.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.cover_upload --books 100
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+import httpx
+import api.v1.services.image_upload as image_upload
+import api.v1.utils.storage as storage
+from api.v1.models import User
+from api.v1.models.user import Role
+from api.v1.services.user import user_service
+from api.v1.utils.database import SessionLocal
+from api.v1.utils.executors import io_executor
+
+
+class SlowStorage(storage.StorageBackend):
+    name = "slow"
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def put(self, key, payload, content_type=None):
+        time.sleep(self.latency)
+        return f"https://images.example.com/{key}.jpg"
+
+
+def inline_enqueue(db, book, source):
+    key, payload, content_type = storage.read_source(source)
+    book.image = io_executor.run(storage.get_storage().put, key, payload, content_type)
+
+
+def admin_token() -> str:
+    with SessionLocal() as db:
+        user = User(
+            username=f"bench-{uuid.uuid4().hex[:8]}",
+            email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+            password="unused",
+            role=Role.admin,
+            is_active=True,
+        )
+        db.add(user)
+        db.commit()
+        return user_service.generate_access_token(db, user)["token"]
+
+
+async def create_books(books: int, clients: int, token: str) -> list[float]:
+    from main import app
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    semaphore = asyncio.Semaphore(clients)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", headers=headers, timeout=120
+    ) as http:
+
+        async def create():
+            tag = uuid.uuid4().hex[:12]
+            async with semaphore:
+                start = time.perf_counter()
+                response = await http.post(
+                    "/api/v1/books",
+                    json={
+                        "title": f"Bench cover {tag}",
+                        "authors": ["Bench"],
+                        "publishers": ["Bench"],
+                        "image": f"https://example.com/{tag}.jpg",
+                        "year": 2000,
+                        "genre": ["bench"],
+                        "isbn": f"bench-{tag}",
+                        "category": "bench",
+                        "total_copies": 1,
+                    },
+                )
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*[create() for _ in range(books)])
+
+    latencies.sort()
+    return latencies
+
+
+async def bench(args):
+    token = admin_token()
+    enqueue = image_upload.image_upload_service.enqueue
+
+    print(f"{'mode':<8}{'upload':>9}{'p50':>10}{'p99':>10}")
+    for latency in args.upload_latency:
+        storage._storage = SlowStorage(latency / 1000)
+        for mode in ("inline", "queued"):
+            image_upload.image_upload_service.enqueue = (
+                inline_enqueue if mode == "inline" else enqueue
+            )
+            latencies = await create_books(args.books, args.clients, token)
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(
+                f"{mode:<8}{latency:>7.0f}ms{latencies[len(latencies) // 2]:>8.1f}ms"
+                f"{p99:>8.1f}ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--upload-latency", type=float, nargs="+", default=[100, 2000])
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
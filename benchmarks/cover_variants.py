@@ -0,0 +1,118 @@
+"""Cover bytes per catalog page, full-size images vs the thumbnail variants.
+
+Stores --covers generated 1200x1800 jpeg covers with the local storage
+backend, then fetches every variant through GET /media/{key}/{variant}:
+the first request renders it, the second is served from the disk cache.
+Reports the bytes a page of --page covers costs for each variant.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.cover_variants --covers 20
+"""
+
+import os
+import tempfile
+
+directory = tempfile.mkdtemp(prefix="bookvault-bench-")
+os.environ.update(
+    {
+        "STORAGE_BACKEND": "local",
+        "STORAGE_LOCAL_DIR": os.path.join(directory, "media"),
+        "MEDIA_CACHE_DIR": os.path.join(directory, "media_cache"),
+    }
+)
+
+import io
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import httpx
+from PIL import Image, ImageDraw, ImageFilter
+from api.v1.services.storage import storage_service
+from api.v1.utils.database import SessionLocal
+from api.v1.utils.executors import start_executors
+from api.v1.utils.images import IMAGE_FORMATS, IMAGE_VARIANTS
+from api.v1.utils.storage import get_storage, read_source
+
+
+def cover() -> bytes:
+    """A cover-like jpeg: gradient, shapes and some grain."""
+
+    image = Image.linear_gradient("L").resize((1200, 1800)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = random.randrange(1200), random.randrange(1800)
+        size = random.randrange(40, 400)
+        color = tuple(random.randrange(256) for _ in range(3))
+        draw.ellipse((x, y, x + size, y + size), fill=color)
+    noise = Image.effect_noise((1200, 1800), 24).convert("RGB")
+    image = Image.blend(image, noise, 0.15).filter(ImageFilter.SMOOTH)
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+def store_covers(covers: int) -> tuple[list[str], int]:
+    keys, total = [], 0
+
+    with SessionLocal() as db:
+        for _ in range(covers):
+            content = cover()
+            key, payload, content_type = read_source(content)
+            url = get_storage().put(key, payload, "image/jpeg")
+            storage_service.remember(
+                db, [{"key": key, "url": url, "content_type": content_type}]
+            )
+            keys.append(key)
+            total += len(content)
+        db.commit()
+
+    return keys, total
+
+
+async def bench(args):
+    from main import app
+
+    start_executors()
+    keys, original = store_covers(args.covers)
+    per_cover = original / args.covers
+
+    print(f"{'variant':<14}{'KiB/page':>10}{'cold p50':>11}{'warm p50':>11}")
+    print(f"{'original':<14}{per_cover * args.page / 1024:>10.1f}")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for variant in IMAGE_VARIANTS:
+            for format in IMAGE_FORMATS:
+                timings = {"cold": [], "warm": []}
+                sizes = []
+                for key in keys:
+                    for run in ("cold", "warm"):
+                        start = time.perf_counter()
+                        response = await http.get(
+                            f"/api/v1/media/{key}/{variant}.{format}"
+                        )
+                        response.raise_for_status()
+                        timings[run].append((time.perf_counter() - start) * 1000)
+                    sizes.append(len(response.content))
+
+                page = statistics.mean(sizes) * args.page / 1024
+                print(
+                    f"{variant + '.' + format:<14}{page:>10.1f}"
+                    f"{statistics.median(timings['cold']):>9.1f}ms"
+                    f"{statistics.median(timings['warm']):>9.1f}ms"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--covers", type=int, default=20)
+    parser.add_argument("--page", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Time of the overdue fine pass over many open loans.
+
+Creates --loans open loans overdue by 0 to 60 days, then runs the fine
+pass twice: the first charges every loan, the second finds nothing to
+change. For comparison, charges --orm-sample of the loans one ORM object
+at a time and extrapolates to all of them.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.fine_pass
+"""
+
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import insert, select, text, update
+from api.v1.models import Book, Category, Loan, User
+from api.v1.services import fine
+from api.v1.services.fine import fine_service
+from api.v1.utils.database import SessionLocal
+
+CHUNK = 10000
+
+
+def seed(count: int) -> list[str]:
+    # every user borrows every book once, the open loan index allows no more
+    side = int(count**0.5) + 1
+    now = datetime.now(timezone.utc)
+
+    with SessionLocal() as db:
+        category = db.scalar(select(Category).where(Category.name == "bench"))
+        if category is None:
+            category = Category(name="bench")
+            db.add(category)
+            db.flush()
+
+        user_ids = [str(uuid.uuid4()) for _ in range(side)]
+        db.execute(
+            insert(User),
+            [
+                {
+                    "id": id,
+                    "username": f"fine-{id[:8]}",
+                    "email": f"fine-{id[:8]}@example.com",
+                    "password": "unused",
+                    "is_active": True,
+                }
+                for id in user_ids
+            ],
+        )
+        book_ids = [str(uuid.uuid4()) for _ in range(side)]
+        db.execute(
+            insert(Book),
+            [
+                {
+                    "id": id,
+                    "title": f"overdue book {id[:8]}",
+                    "authors": ["bench"],
+                    "publishers": ["bench"],
+                    "image": "unused",
+                    "year": 2024,
+                    "isbn": uuid.uuid4().hex,
+                    "category_id": category.id,
+                    "copies_available": 0,
+                    "total_copies": side,
+                }
+                for id in book_ids
+            ],
+        )
+        db.commit()
+
+        loans = []
+        loan_ids = []
+        for n in range(count):
+            id = str(uuid.uuid4())
+            due_at = now - timedelta(seconds=random.uniform(0, 60 * 86400))
+            loans.append(
+                {
+                    "id": id,
+                    "book_id": book_ids[n // side],
+                    "user_id": user_ids[n % side],
+                    "borrowed_at": due_at - timedelta(days=14),
+                    "due_at": due_at,
+                    "renewals": 0,
+                }
+            )
+            loan_ids.append(id)
+            if len(loans) == CHUNK:
+                db.execute(insert(Loan), loans)
+                db.commit()
+                loans = []
+        if loans:
+            db.execute(insert(Loan), loans)
+            db.commit()
+
+        db.execute(text("ANALYZE loan"))
+        db.commit()
+
+    return loan_ids
+
+
+def charge_orm(loan_ids: list[str]) -> float:
+    """The per-row alternative: load each loan and set its fine in Python."""
+
+    now = datetime.now(timezone.utc)
+    start = time.perf_counter()
+
+    with SessionLocal() as db:
+        for id in loan_ids:
+            loan = db.get(Loan, id)
+            days = (now - loan.due_at).days
+            loan.fine = min(days * fine.FINE_PER_DAY, fine.FINE_MAX)
+        db.commit()
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loans", type=int, default=1000000)
+    parser.add_argument("--orm-sample", type=int, default=10000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    loan_ids = seed(args.loans)
+    print(f"seeded {args.loans} loans in {time.perf_counter() - start:.1f}s")
+
+    for run in ("first", "second"):
+        with SessionLocal() as db:
+            start = time.perf_counter()
+            charged = fine_service.charge(db)
+            elapsed = time.perf_counter() - start
+        print(f"{run} pass: {charged} charged in {elapsed:.2f}s")
+
+    # the sample again from zero, so the orm loop writes every row
+    sample = random.sample(loan_ids, min(args.orm_sample, len(loan_ids)))
+    with SessionLocal() as db:
+        db.execute(update(Loan).where(Loan.id.in_(sample)).values(fine=0))
+        db.commit()
+    elapsed = charge_orm(sample)
+    print(
+        f"per-row orm: {len(sample)} in {elapsed:.2f}s, "
+        f"{elapsed * args.loans / len(sample):.0f}s for {args.loans}"
+    )
+
+
+if __name__ == "__main__":
+    main()
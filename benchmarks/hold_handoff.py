@@ -0,0 +1,135 @@
+"""Return latency on books with hold queues of growing length.
+
+For each --queues length, creates a book with one copy, lends it and queues
+that many holds behind it. Then for --rounds rounds the holder of the copy
+returns it, which keeps it for the head of the queue, and the head borrows
+it. Reports the mean return and borrow latency per queue length, which
+should stay flat as the queue grows.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.hold_handoff
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import insert, select, text
+from api.v1.models import Book, Category, Hold, User
+from api.v1.services.loan import loan_service
+from api.v1.utils.database import SessionLocal
+
+
+def seed_users(count: int) -> list[str]:
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+
+    with SessionLocal() as db:
+        db.execute(
+            insert(User),
+            [
+                {
+                    "id": id,
+                    "username": f"hold-{id[:8]}",
+                    "email": f"hold-{id[:8]}@example.com",
+                    "password": "unused",
+                    "is_active": True,
+                }
+                for id in ids
+            ],
+        )
+        db.commit()
+
+    return ids
+
+
+def seed_book(user_ids: list[str], queue: int) -> str:
+    with SessionLocal() as db:
+        category = db.scalar(select(Category).where(Category.name == "bench"))
+        if category is None:
+            category = Category(name="bench")
+            db.add(category)
+            db.flush()
+
+        book = Book(
+            title=f"reserved book {uuid.uuid4().hex[:8]}",
+            authors=["bench"],
+            publishers=["bench"],
+            image="unused",
+            year=2024,
+            isbn=uuid.uuid4().hex,
+            category_id=category.id,
+            copies_available=1,
+            total_copies=1,
+        )
+        db.add(book)
+        db.commit()
+        book_id = book.id
+
+    with SessionLocal(expire_on_commit=False) as db:
+        loan_service.borrow(db, book_id, db.get(User, user_ids[0]))
+
+        expires_at = datetime.now(timezone.utc) + timedelta(days=90)
+        db.execute(
+            insert(Hold),
+            [
+                {
+                    "book_id": book_id,
+                    "user_id": user_id,
+                    "seq": seq,
+                    "status": "waiting",
+                    "expires_at": expires_at,
+                }
+                for seq, user_id in enumerate(user_ids[1 : queue + 1], start=1)
+            ],
+        )
+        db.execute(
+            Book.__table__.update()
+            .where(Book.__table__.c.id == book_id)
+            .values(hold_seq=queue)
+        )
+        db.commit()
+
+        # planner statistics for the fresh rows, autovacuum would get there
+        db.execute(text("ANALYZE hold"))
+        db.commit()
+
+    return book_id
+
+
+def run(user_ids: list[str], queue: int, rounds: int) -> tuple[float, float]:
+    book_id = seed_book(user_ids, queue)
+    returns, borrows = [], []
+
+    with SessionLocal(expire_on_commit=False) as db:
+        users = [db.get(User, user_id) for user_id in user_ids[: rounds + 1]]
+
+        for holder, head in zip(users, users[1:]):
+            start = time.perf_counter()
+            loan_service.return_book(db, book_id, holder)
+            returns.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            loan_service.borrow(db, book_id, head)
+            borrows.append((time.perf_counter() - start) * 1000)
+
+    return statistics.mean(returns), statistics.mean(borrows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queues", default="10,1000,100000")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    queues = [int(queue) for queue in args.queues.split(",")]
+    user_ids = seed_users(max(queues) + 1)
+
+    print(f"{'queue':>8}{'return':>12}{'borrow':>12}")
+    for queue in queues:
+        rounds = min(args.rounds, queue)
+        returned, borrowed = run(user_ids, queue, rounds)
+        print(f"{queue:>8}{returned:>10.2f}ms{borrowed:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
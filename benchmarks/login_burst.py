@@ -0,0 +1,126 @@
+"""Event loop stalls during a burst of logins, inline bcrypt vs the executors.
+
+Starts the app under uvicorn, fires --logins concurrent POST /account/login
+and meanwhile probes GET / every 10ms. "inline" hashes on the event loop like
+the handlers did before the cpu executor, "executor" is the shipped code.
+The probe latency shows how long every other request waits.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.login_burst --logins 50
+"""
+
+import os
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+import httpx
+
+PORT = 8766
+
+if os.environ.get("BENCH_INLINE") == "1":
+    from api.v1.services.user import UserService
+    from api.v1.utils import hashing
+
+    UserService.verify_and_update = lambda self, plain, hashed: (
+        hashing.verify_and_update(plain, hashed)
+    )
+
+from main import app  # noqa: E402
+
+
+def create_user() -> tuple[str, str]:
+    from api.v1.utils.database import SessionLocal
+    from api.v1.models import User
+    from api.v1.utils import hashing
+
+    email = f"burst-{uuid.uuid4().hex[:8]}@example.com"
+    password = uuid.uuid4().hex
+
+    with SessionLocal() as db:
+        user = User(
+            username=f"burst-{uuid.uuid4().hex[:8]}",
+            email=email,
+            password=hashing.hash_password(password),
+            is_active=True,
+        )
+        db.add(user)
+        db.commit()
+
+    return email, password
+
+
+async def burst(logins: int, email: str, password: str):
+    base_url = f"http://127.0.0.1:{PORT}/"
+    limits = httpx.Limits(max_connections=logins + 1)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as http:
+        for _ in range(100):
+            try:
+                await http.get("/")
+                break
+            except httpx.ConnectError:
+                await asyncio.sleep(0.1)
+
+        probes = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await http.get("/")
+                probes.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        async def login():
+            response = await http.post(
+                "/api/v1/account/login", json={"email": email, "password": password}
+            )
+            return response.status_code
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        codes = await asyncio.gather(*[login() for _ in range(logins)])
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+
+    probes.sort()
+    return {
+        "logins/s": logins / elapsed,
+        "probe p50": statistics.median(probes),
+        "probe max": probes[-1],
+        "status": sorted(set(codes)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+
+    email, password = create_user()
+
+    print(f"{'mode':<10}{'logins/s':>10}{'probe p50':>12}{'probe max':>12}  status")
+    for mode in ("inline", "executor"):
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "benchmarks.login_burst:app"]
+            + ["--port", str(PORT), "--log-level", "warning"],
+            env={**os.environ, "BENCH_INLINE": "1" if mode == "inline" else "0"},
+        )
+        try:
+            result = asyncio.run(burst(args.logins, email, password))
+        finally:
+            server.terminate()
+            server.wait()
+
+        print(
+            f"{mode:<10}{result['logins/s']:>10.1f}{result['probe p50']:>10.1f}ms"
+            f"{result['probe max']:>10.1f}ms  {result['status']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Login throughput with last_login written inline vs buffered.
+
+Creates --users active users, their passwords hashed with the cheapest bcrypt
+cost so the database work dominates, then sends --logins POST /account/login
+with --concurrency in flight, spread over the users. "inline" writes
+last_login in the login transaction (ACTIVITY_FLUSH_INTERVAL=0), "buffered"
+is the shipped write-behind, its flush is timed apart.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.login_writes
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+import httpx
+from sqlalchemy import event
+import api.v1.services.activity as activity
+from api.v1.models import User
+from api.v1.utils import hashing
+from api.v1.utils.database import SessionLocal, async_engine
+
+PASSWORD = "bench-password"
+
+
+def seed(users: int) -> list[str]:
+    # the policy also applies to the app, else every login would rehash
+    hashing.hash_context = hashing.build_context(["bcrypt"], 4)
+    hashed = hashing.hash_password(PASSWORD)
+
+    with SessionLocal() as db:
+        created = [
+            User(
+                username=f"login-{uuid.uuid4().hex[:8]}",
+                email=f"login-{uuid.uuid4().hex[:8]}@example.com",
+                password=hashed,
+                is_active=True,
+            )
+            for _ in range(users)
+        ]
+        db.add_all(created)
+        db.commit()
+
+        return [user.email for user in created]
+
+
+async def run(emails: list[str], logins: int, concurrency: int) -> dict:
+    from main import app
+
+    statements = []
+    commits = []
+    engine = async_engine.sync_engine
+    count = lambda *args: statements.append(1)  # noqa: E731
+    commit = lambda *args: commits.append(1)  # noqa: E731
+    event.listen(engine, "before_cursor_execute", count)
+    event.listen(engine, "commit", commit)
+
+    sent = iter(range(logins))
+    codes = []
+
+    async def worker(http: httpx.AsyncClient):
+        for i in sent:
+            response = await http.post(
+                "/api/v1/account/login",
+                json={"email": emails[i % len(emails)], "password": PASSWORD},
+            )
+            codes.append(response.status_code)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(http) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    flushed = await activity.activity_service.flush()
+    flush_ms = (time.perf_counter() - start) * 1000
+
+    event.remove(engine, "before_cursor_execute", count)
+    event.remove(engine, "commit", commit)
+
+    return {
+        "logins/s": logins / elapsed,
+        "statements": len(statements) / logins,
+        "commits": len(commits) / logins,
+        "flushed": flushed,
+        "flush ms": flush_ms,
+        "status": sorted(set(codes)),
+    }
+
+
+async def bench(args):
+    emails = seed(args.users)
+
+    print(
+        f"{'mode':<10}{'logins/s':>10}{'stmts':>8}{'commits':>9}"
+        f"{'flushed':>9}{'flush':>10}  status"
+    )
+    interval = activity.ACTIVITY_FLUSH_INTERVAL
+    for mode in ("inline", "buffered"):
+        activity.ACTIVITY_FLUSH_INTERVAL = interval if mode == "buffered" else 0
+        result = await run(emails, args.logins, args.concurrency)
+        print(
+            f"{mode:<10}{result['logins/s']:>10.1f}{result['statements']:>8.2f}"
+            f"{result['commits']:>9.2f}{result['flushed']:>9}"
+            f"{result['flush ms']:>8.1f}ms  {result['status']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Email outbox drain throughput and registration latency against a local SMTP sink.
+
+Runs a minimal SMTP server that accepts every message after --connect-delay
+milliseconds per connection (TLS and login round trips on a real server).
+
+- drain: sends --messages queued mails with a connection per message, as
+  create_user used to, then with the reused outbox connection.
+- register: POST /account/register latency while the sink is that slow.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.outbox --messages 200
+"""
+
+import os
+
+os.environ.update(
+    {"EMAIL_BACKEND": "smtp", "EMAIL_HOST": "127.0.0.1", "EMAIL_USE_TLS": "False"}
+)
+os.environ.pop("EMAIL_HOST_PASSWORD", None)
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+import httpx
+from sqlalchemy import delete
+import api.v1.utils.mail as mail
+from api.v1.utils.database import SessionLocal
+from api.v1.models.email_outbox import EmailOutbox
+from api.v1.services.email_outbox import email_outbox_service
+
+
+class SMTPSink:
+    def __init__(self, connect_delay: float):
+        self.connect_delay = connect_delay
+        self.connections = 0
+        self.messages = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.connect_delay)
+        writer.write(b"220 sink ready\r\n")
+
+        while line := await reader.readline():
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                writer.write(b"250-sink\r\n250 8BITMIME\r\n")
+            elif command == b"DATA":
+                writer.write(b"354 end with .\r\n")
+                await writer.drain()
+                while await reader.readline() not in (b".\r\n", b""):
+                    pass
+                self.messages += 1
+                writer.write(b"250 queued\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+
+        writer.close()
+
+
+class ConnectionPerMessage(mail.SMTPTransport):
+    async def send(self, message):
+        await super().send(message)
+        await self.close()
+
+
+def enqueue(messages: int):
+    with SessionLocal() as db:
+        db.execute(delete(EmailOutbox).where(EmailOutbox.recipient.like("bench-%")))
+        for number in range(messages):
+            email_outbox_service.enqueue(
+                db, f"bench-{number}@example.com", "Outbox bench", "hello"
+            )
+        db.commit()
+
+
+async def drain(sink: SMTPSink, transport, messages: int) -> tuple[float, int]:
+    enqueue(messages)
+    email_outbox_service.transport = transport
+    connections = sink.connections
+
+    start = time.perf_counter()
+    while await email_outbox_service.drain():
+        pass
+    elapsed = time.perf_counter() - start
+    await transport.close()
+
+    return messages / elapsed, sink.connections - connections
+
+
+async def register(registrations: int) -> list[float]:
+    from main import app
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for _ in range(registrations):
+            tag = uuid.uuid4().hex[:10]
+            start = time.perf_counter()
+            response = await http.post(
+                "/api/v1/account/register",
+                json={
+                    "username": f"bench-{tag}",
+                    "email": f"bench-{tag}@example.com",
+                    "password": "Passw0rd!",
+                },
+            )
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    return latencies
+
+
+async def bench(args):
+    sink = SMTPSink(args.connect_delay / 1000)
+    server = await asyncio.start_server(sink.handle, "127.0.0.1", 0)
+    mail.EMAIL_PORT = server.sockets[0].getsockname()[1]
+
+    async with server:
+        print(f"{'drain':<22}{'msg/s':>10}{'connections':>14}")
+        for name, transport in (
+            ("connection per message", ConnectionPerMessage()),
+            ("reused connection", mail.SMTPTransport()),
+        ):
+            throughput, connections = await drain(sink, transport, args.messages)
+            print(f"{name:<22}{throughput:>10.1f}{connections:>14}")
+
+        latencies = await register(args.registrations)
+        print(
+            f"register p50 {statistics.median(latencies):.1f}ms, "
+            f"max {max(latencies):.1f}ms with a {args.connect_delay:.0f}ms smtp connect"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--registrations", type=int, default=20)
+    parser.add_argument("--connect-delay", type=float, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
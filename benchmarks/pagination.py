@@ -0,0 +1,68 @@
+"""Offset vs keyset pagination benchmark.
+
+Times page 1 and a deep page of the book listing with paginate_query
+(OFFSET + count) and cursor_paginate_query (seek on (created_at, id)).
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.pagination --books 200000
+"""
+
+import argparse
+import statistics
+import time
+from sqlalchemy.orm import joinedload
+from api.v1.utils.database import SessionLocal
+from api.v1.models import Book
+from api.v1.utils.paginate import paginate_query, cursor_paginate_query, encode_cursor
+from benchmarks.search import seed
+
+KEYS = (Book.created_at, Book.id)
+
+
+def listing(db):
+    return db.query(Book).options(joinedload(Book.genre), joinedload(Book.category))
+
+
+def timed(run, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(max(args.books, args.page * args.limit + args.limit))
+
+    with SessionLocal() as db:
+        ordered = listing(db).order_by(Book.created_at.desc(), Book.id.desc())
+
+        # cursor pointing at the row just before the deep page
+        anchor = (
+            db.query(Book)
+            .order_by(Book.created_at.desc(), Book.id.desc())
+            .offset((args.page - 1) * args.limit - 1)
+            .first()
+        )
+        deep_cursor = encode_cursor(KEYS, anchor, "next")
+
+        for label, page, cursor in (("1", 1, None), (str(args.page), args.page, deep_cursor)):
+            offset_ms = timed(
+                lambda: paginate_query(db, ordered, page, args.limit), args.runs
+            )
+            keyset_ms = timed(
+                lambda: cursor_paginate_query(listing(db), KEYS, cursor, args.limit),
+                args.runs,
+            )
+            print(f"page {label:>6}: offset {offset_ms:8.2f}ms  keyset {keyset_ms:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
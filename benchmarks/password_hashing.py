@@ -0,0 +1,74 @@
+"""Password verifies per second per core at each hashing setting.
+
+Verifies a password --verifies times on one core for each bcrypt cost in
+--rounds, and for argon2 when argon2-cffi is installed, then through the cpu
+executor with all its workers. Also prints the cost calibrate_bcrypt picks
+for --target-ms on this machine.
+
+usage: python -m benchmarks.password_hashing --rounds 10 11 12 13
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from passlib.hash import argon2
+from api.v1.utils import hashing
+from api.v1.utils.executors import CPU_EXECUTOR_WORKERS
+
+PASSWORD = "bench-password"
+
+
+def verify_many(stored: str, verifies: int) -> float:
+    start = time.perf_counter()
+    for _ in range(verifies):
+        hashing.verify_password(PASSWORD, stored)
+    return time.perf_counter() - start
+
+
+def measure(schemes: list[str], rounds: int, verifies: int) -> dict:
+    # set before the pool forks, so the workers share it
+    hashing.hash_context = hashing.build_context(schemes, rounds)
+    stored = hashing.hash_password(PASSWORD)
+
+    elapsed = verify_many(stored, verifies)
+
+    workers = CPU_EXECUTOR_WORKERS
+    with ProcessPoolExecutor(workers) as pool:
+        pool.submit(int).result()
+        start = time.perf_counter()
+        list(pool.map(verify_many, [stored] * workers, [verifies] * workers))
+        pool_elapsed = time.perf_counter() - start
+
+    return {
+        "ms": elapsed / verifies * 1000,
+        "per core": verifies / elapsed,
+        "all cores": workers * verifies / pool_elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--verifies", type=int, default=10)
+    parser.add_argument("--target-ms", type=float, default=250)
+    args = parser.parse_args()
+
+    settings = [(["bcrypt"], rounds, f"bcrypt {rounds}") for rounds in args.rounds]
+    if argon2.has_backend():
+        settings.append((["argon2"], 0, "argon2"))
+
+    print(f"{CPU_EXECUTOR_WORKERS} cpu workers")
+    print(f"{'scheme':<12}{'verify':>10}{'per core':>12}{'all cores':>12}")
+    for schemes, rounds, name in settings:
+        result = measure(schemes, rounds, args.verifies)
+        print(
+            f"{name:<12}{result['ms']:>8.1f}ms{result['per core']:>10.1f}/s"
+            f"{result['all cores']:>10.1f}/s"
+        )
+
+    rounds = hashing.calibrate_bcrypt(args.target_ms)
+    print(f"calibrated bcrypt cost for {args.target_ms:.0f}ms: {rounds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Cost of the pickup timers with many ready holds.
+
+Creates --holds books with one copy each, kept for a ready hold with a
+second hold waiting behind it. Reports the time to load the deadlines
+from the database, the cost of an idle tick while none is due, and the
+throughput of expiring them all in batches, each passing its copy to the
+waiting hold.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.pickup_expiry
+"""
+
+import argparse
+import asyncio
+import time
+import timeit
+import uuid
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import insert, select, text
+from api.v1.models import Book, Category, Hold, User
+from api.v1.services import pickup
+from api.v1.services.hold import hold_service
+from api.v1.services.pickup import pickup_service
+from api.v1.utils.database import SessionLocal
+
+
+def seed(count: int) -> list[str]:
+    now = datetime.now(timezone.utc)
+
+    with SessionLocal() as db:
+        category = db.scalar(select(Category).where(Category.name == "bench"))
+        if category is None:
+            category = Category(name="bench")
+            db.add(category)
+            db.flush()
+
+        user_ids = [str(uuid.uuid4()) for _ in range(2)]
+        db.execute(
+            insert(User),
+            [
+                {
+                    "id": id,
+                    "username": f"pickup-{id[:8]}",
+                    "email": f"pickup-{id[:8]}@example.com",
+                    "password": "unused",
+                    "is_active": True,
+                }
+                for id in user_ids
+            ],
+        )
+
+        book_ids = [str(uuid.uuid4()) for _ in range(count)]
+        db.execute(
+            insert(Book),
+            [
+                {
+                    "id": id,
+                    "title": f"kept book {id[:8]}",
+                    "authors": ["bench"],
+                    "publishers": ["bench"],
+                    "image": "unused",
+                    "year": 2024,
+                    "isbn": uuid.uuid4().hex,
+                    "category_id": category.id,
+                    "copies_available": 0,
+                    "total_copies": 1,
+                    "hold_seq": 2,
+                }
+                for id in book_ids
+            ],
+        )
+        db.execute(
+            insert(Hold),
+            [
+                hold
+                for id in book_ids
+                for hold in (
+                    {
+                        "book_id": id,
+                        "user_id": user_ids[0],
+                        "seq": 1,
+                        "status": "ready",
+                        "ready_at": now,
+                        "pickup_by": now + timedelta(seconds=2),
+                    },
+                    {
+                        "book_id": id,
+                        "user_id": user_ids[1],
+                        "seq": 2,
+                        "status": "waiting",
+                        "expires_at": now + timedelta(days=90),
+                    },
+                )
+            ],
+        )
+        db.commit()
+
+        db.execute(text("ANALYZE hold"))
+        db.commit()
+
+    return book_ids
+
+
+async def expire_all(count: int) -> float:
+    start = time.perf_counter()
+    fired = 0
+    while fired < count:
+        fired += await pickup_service.tick()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--holds", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=pickup.PICKUP_BATCH_SIZE)
+    args = parser.parse_args()
+    pickup.PICKUP_BATCH_SIZE = args.batch
+
+    seed(args.holds)
+
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        loaded = pickup_service.load(db)
+        print(f"load {loaded} deadlines: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    rounds = 100000
+    idle = timeit.timeit(
+        lambda: hold_service.pickups.pop_due(time.time() - 60, args.batch),
+        number=rounds,
+    )
+    print(f"idle tick: {idle / rounds * 1e6:.2f}us")
+
+    # the seeded windows end 2s after seeding
+    time.sleep(max(0, hold_service.pickups.next_deadline() - time.time()))
+    elapsed = asyncio.run(expire_all(args.holds))
+    print(
+        f"expire {pickup_service.expired} in {pickup_service.batches} batches: "
+        f"{elapsed:.2f}s, {pickup_service.expired / elapsed:.0f}/s, "
+        f"{pickup_service.advanced} passed on"
+    )
+
+
+if __name__ == "__main__":
+    main()
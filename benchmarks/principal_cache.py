@@ -0,0 +1,116 @@
+"""Authenticated request cost with and without the principal cache.
+
+Adds --tokens access token rows, the lookup by jti goes through its index, then
+sends --requests GET /books/{id} (answered from the result cache) spread over
+--users users. Reports the median latency and queries per request with the
+principal cache off and on, and its hit rate.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.principal_cache
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+import httpx
+from sqlalchemy import event, insert
+import api.v1.services.principal as principal
+from api.v1.models import User, AccessToken, Book
+from api.v1.models.user import Role
+from api.v1.services.user import user_service
+from api.v1.utils.database import SessionLocal, async_engine
+
+
+def seed(tokens: int, users: int) -> tuple[list[str], str]:
+    with SessionLocal() as db:
+        created = [
+            User(
+                username=f"bench-{uuid.uuid4().hex[:8]}",
+                email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+                password="unused",
+                role=Role.member,
+                is_active=True,
+            )
+            for _ in range(users)
+        ]
+        db.add_all(created)
+        db.commit()
+
+        expiry = datetime.now(timezone.utc) + timedelta(days=1)
+        db.execute(
+            insert(AccessToken),
+            [
+                {
+                    "user_id": created[i % users].id,
+                    "jti": uuid.uuid4().hex,
+                    "expiry_time": expiry,
+                }
+                for i in range(tokens)
+            ],
+        )
+        db.commit()
+
+        book_id = db.query(Book.id).limit(1).scalar()
+        bearer = [
+            user_service.generate_access_token(db, user)["token"] for user in created
+        ]
+
+    return bearer, book_id
+
+
+async def run(tokens: list[str], book_id: str, requests: int) -> tuple[float, float]:
+    from main import app
+
+    queries = []
+
+    def count(*args):
+        queries.append(1)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    latencies = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for i in range(requests):
+            headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+            start = time.perf_counter()
+            response = await http.get(f"/api/v1/books/{book_id}", headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+    event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+    return statistics.median(latencies), len(queries) / requests
+
+
+async def bench(args):
+    tokens, book_id = seed(args.tokens, args.users)
+    if book_id is None:
+        raise SystemExit("add a book first, e.g. python -m benchmarks.search")
+
+    print(f"{'cache':<7}{'p50':>10}{'queries':>10}{'hit rate':>10}")
+    ttl = principal.PRINCIPAL_CACHE_TTL
+    for mode in ("off", "on"):
+        principal.PRINCIPAL_CACHE_TTL = ttl if mode == "on" else 0
+        principal.principal_service.cache.clear()
+        stats = principal.principal_service.cache
+        stats.hits = stats.misses = 0
+
+        p50, queries = await run(tokens, book_id, args.requests)
+        hit_rate = principal.principal_service.stats()["hit_rate"]
+        print(f"{mode:<7}{p50:>8.2f}ms{queries:>10.2f}{hit_rate:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
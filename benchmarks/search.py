@@ -0,0 +1,140 @@
+"""Catalog search benchmark.
+
+Seeds the database pointed to by DATABASE_URL with synthetic books and compares
+the legacy ILIKE search against the ranked full-text search used by
+BookService.fetch_all. The full-text page is timed with its exact count already
+cached, as every page after the first of a search is served, and the cold count
+is timed on its own.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.search --books 1000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+import uuid
+from sqlalchemy import insert, func
+from sqlalchemy.orm import joinedload
+from api.v1.utils.database import Base, engine, SessionLocal
+from api.v1.models import Book, Category
+from api.v1.services.search import search_service
+from api.v1.utils.paginate import count_cache, count_query, paginate_query
+
+WORDS = (
+    "shadow river empire garden silent winter machine ocean crown glass "
+    "forest memory iron storm paper city night golden broken hidden last "
+    "journey kingdom secret fire light house letter song war dream"
+).split()
+NAMES = (
+    "achebe adichie austen baldwin bronte dickens eliot hemingway morrison "
+    "orwell rowling soyinka tolkien twain woolf"
+).split()
+SEARCHES = ["shad", "silent river", "orwell", "tolkien kingdom", "9780", "zzzz"]
+
+
+def seed(books: int, batch_size: int = 10_000):
+    Base.metadata.create_all(bind=engine)
+
+    with SessionLocal() as db:
+        existing = db.query(func.count(Book.id)).scalar()
+        if existing >= books:
+            return
+
+        category = Category(name=f"bench-{uuid.uuid4().hex[:8]}")
+        db.add(category)
+        db.commit()
+
+        rows = []
+        for n in range(existing, books):
+            title = " ".join(random.sample(WORDS, 3)) + f" {n}"
+            authors = random.sample(NAMES, 2)
+            isbn = f"978{n:010d}"
+            rows.append(
+                {
+                    "id": str(uuid.uuid4()),
+                    "title": title,
+                    "authors": authors,
+                    "publishers": ["bench press"],
+                    "image": "",
+                    "year": 2000,
+                    "isbn": isbn,
+                    "category_id": category.id,
+                    "copies_available": 1,
+                    "total_copies": 1,
+                    "search_document": " ".join(
+                        [title, *authors, "bench press", category.name, isbn]
+                    ),
+                }
+            )
+            if len(rows) == batch_size:
+                db.execute(insert(Book), rows)
+                db.commit()
+                rows = []
+        if rows:
+            db.execute(insert(Book), rows)
+            db.commit()
+
+
+def legacy_query(db, search):
+    return db.query(Book).filter(
+        Book.authors.any(search) | Book.title.icontains(search) | Book.isbn.icontains(search)
+    )
+
+
+def legacy_page(db, search):
+    query = legacy_query(db, search).options(
+        joinedload(Book.genre), joinedload(Book.category)
+    )
+    paginate_query(db, query, 1)
+
+
+def ranked_count(db, search):
+    count_cache.clear()
+    query = search_service.apply(db, db.query(Book), search)
+    count_query(db, query, "exact", ("book", search))
+
+
+def ranked_page(db, search):
+    books = db.query(Book).options(joinedload(Book.genre), joinedload(Book.category))
+    query = search_service.apply(db, books, search)
+    count_key = ("book", search)
+    total, _ = count_query(db, query, "exact", count_key)
+    fetch = search_service.ranked(db, books, search, total)
+    paginate_query(db, query, 1, count_key=count_key, fetch=fetch)
+
+
+def timed(db, run, search, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run(db, search)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.books)
+
+    print(
+        f"{'search':<18}{'legacy p50':>12}{'legacy max':>12}"
+        f"{'fts p50':>12}{'fts max':>12}{'count p50':>12}"
+    )
+    with SessionLocal() as db:
+        for search in SEARCHES:
+            legacy = timed(db, legacy_page, search, args.runs)
+            count = timed(db, ranked_count, search, args.runs)
+            ranked = timed(db, ranked_page, search, args.runs)
+            print(
+                f"{search:<18}{legacy[0]:>10.2f}ms{legacy[1]:>10.2f}ms"
+                f"{ranked[0]:>10.2f}ms{ranked[1]:>10.2f}ms{count[0]:>10.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Upload calls made by importing the same catalog twice.
+
+Imports --books books sharing --covers distinct data uri covers through
+POST /books/import, drains the image upload queue, then imports the same
+file again. A counting storage backend records every upload call and
+sleeps --upload-latency milliseconds per call.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.storage_dedupe --books 2000
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+import httpx
+import api.v1.utils.storage as storage
+from api.v1.models import User
+from api.v1.models.user import Role
+from api.v1.services.image_upload import image_upload_service
+from api.v1.services.user import user_service
+from api.v1.utils.database import SessionLocal
+
+
+class CountingStorage(storage.StorageBackend):
+    name = "counting"
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def put(self, key, payload, content_type=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        return f"https://images.example.com/{key}.png"
+
+
+def admin_token() -> str:
+    with SessionLocal() as db:
+        user = User(
+            username=f"bench-{uuid.uuid4().hex[:8]}",
+            email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+            password="unused",
+            role=Role.admin,
+            is_active=True,
+        )
+        db.add(user)
+        db.commit()
+        return user_service.generate_access_token(db, user)["token"]
+
+
+def catalog(books: int, covers: int) -> bytes:
+    tag = uuid.uuid4().hex[:8]
+    images = [
+        "data:image/png;base64," + base64.b64encode(os.urandom(4096)).decode()
+        for _ in range(covers)
+    ]
+
+    return "\n".join(
+        json.dumps(
+            {
+                "title": f"Dedupe {tag} {number}",
+                "authors": ["Bench"],
+                "publishers": ["Bench"],
+                "image": images[number % covers],
+                "year": 2000,
+                "genre": ["bench"],
+                "isbn": f"dedupe-{tag}-{number}",
+                "category": "bench",
+                "total_copies": 1,
+            }
+        )
+        for number in range(books)
+    ).encode()
+
+
+async def bench(args):
+    from main import app
+
+    backend = CountingStorage(args.upload_latency / 1000)
+    storage._storage = backend
+    body = catalog(args.books, args.covers)
+    headers = {"Authorization": f"Bearer {admin_token()}"}
+    transport = httpx.ASGITransport(app=app)
+
+    print(f"{'import':<8}{'seconds':>9}{'uploads':>9}{'queued':>8}")
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", headers=headers, timeout=600
+    ) as http:
+        for name in ("first", "repeat"):
+            calls = backend.calls
+            start = time.perf_counter()
+            response = await http.post(
+                "/api/v1/books/import", params={"format": "ndjson"}, content=body
+            )
+            response.raise_for_status()
+
+            queued = 0
+            while claimed := await image_upload_service.drain():
+                queued += claimed
+            elapsed = time.perf_counter() - start
+
+            print(f"{name:<8}{elapsed:>9.2f}{backend.calls - calls:>9}{queued:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--covers", type=int, default=50)
+    parser.add_argument("--upload-latency", type=float, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
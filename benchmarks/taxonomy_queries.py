@@ -0,0 +1,77 @@
+"""Query counts of the book write and listing paths.
+
+Counts the SQL statements BookService.add_book, update and fetch_all send,
+with a cold and a warm taxonomy cache.
+
+usage: DATABASE_URL=postgresql://... python -m benchmarks.taxonomy_queries
+"""
+
+import uuid
+from contextlib import contextmanager
+from sqlalchemy import event
+from api.v1.utils.database import Base, engine, SessionLocal
+from api.v1.models import User
+from api.v1.schemas.book import AddBookSchema, UpdateBookSchema
+import api.v1.services.book as book_module
+from api.v1.services.book import book_service
+from api.v1.services.taxonomy import taxonomy_service
+
+GENRES = ["fiction", "classic", "dystopia", "politics"]
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def book_schema(tag: str) -> AddBookSchema:
+    return AddBookSchema(
+        title=f"Taxonomy bench {tag}",
+        authors=["George Orwell"],
+        publishers=["Secker & Warburg"],
+        image="https://example.com/cover.jpg",
+        year=1949,
+        genre=GENRES,
+        isbn=f"bench-{tag}",
+        category="novels",
+        total_copies=1,
+    )
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    # measure the database, not the image host
+    book_module.upload = lambda image: image
+    librarian = User(role="liberian")
+
+    with SessionLocal() as db:
+        for label in ("cold", "warm"):
+            if label == "cold":
+                taxonomy_service.clear()
+
+            tag = uuid.uuid4().hex[:8]
+            with count_statements() as statements:
+                book = book_service.add_book(db, librarian, book_schema(tag))
+            print(f"add_book  ({label}): {len(statements)} statements")
+
+            update = UpdateBookSchema(**book_schema(tag).model_dump())
+            with count_statements() as statements:
+                book_service.update(db, book.id, librarian, update)
+            print(f"update    ({label}): {len(statements)} statements")
+
+            with count_statements() as statements:
+                book_service.fetch_all(db, category="novels", count="none")
+            print(f"fetch_all ({label}): {len(statements)} statements")
+
+
+if __name__ == "__main__":
+    main()
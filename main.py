@@ -1,8 +1,11 @@
 import os
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from fastapi.exceptions import RequestValidationError, FastAPIError
 import uvicorn
 from sqlalchemy.exc import InvalidRequestError
@@ -11,14 +14,48 @@ from api.v1.utils.database import Base, engine
 from api.v1.responses.success_responses import success_response
 from api.v1.responses.error_responses import ValidationErrorResponse, ErrorResponse
 from api.v1.routes import version_one
+from api.v1.utils.executors import start_executors, shutdown_executors
+from api.v1.utils import hashing
+from api.v1.utils.storage import STORAGE_BACKEND, STORAGE_LOCAL_DIR, STORAGE_LOCAL_URL
+from api.v1.services.email_outbox import email_outbox_service
+from api.v1.services.image_upload import image_upload_service
+from api.v1.services.reaper import reaper_service
+from api.v1.services.activity import activity_service
+from api.v1.services.pickup import pickup_service
+from api.v1.services.fine import fine_service
+from api.v1.services.book_import import book_import_service
 
 load_dotenv()
 
 # Creating database
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # before the cpu workers fork, they inherit the calibrated policy
+    hashing.configure()
+    start_executors()
+    email_outbox_service.start()
+    image_upload_service.start()
+    reaper_service.start()
+    activity_service.start()
+    pickup_service.start()
+    fine_service.start()
+    yield
+    await fine_service.stop()
+    await book_import_service.stop()
+    await pickup_service.stop()
+    await activity_service.stop()
+    await reaper_service.stop()
+    await image_upload_service.stop()
+    await email_outbox_service.stop()
+    shutdown_executors()
+
+
 # App settings for project
 app = FastAPI(
+    lifespan=lifespan,
     title="BookVault",
     summary="Library management api",
     version="0.0.1",
@@ -37,6 +74,16 @@ app = FastAPI(
 
 app.include_router(version_one)
 
+# Files kept by the local storage backend are served under the urls it hands
+# out, the other backends serve their own
+if STORAGE_BACKEND == "local":
+    os.makedirs(STORAGE_LOCAL_DIR, exist_ok=True)
+    app.mount(
+        urlparse(STORAGE_LOCAL_URL).path.rstrip("/"),
+        StaticFiles(directory=STORAGE_LOCAL_DIR),
+        name="storage",
+    )
+
 # Setting up cors and middleware
 origins = ["*"]
 app.add_middleware(
@@ -71,7 +118,11 @@ async def http_exception_handler(request: Request, exc: StarletteHttpException):
     """
 
     response = ErrorResponse(status_code=exc.status_code, message=exc.detail)
-    return JSONResponse(status_code=exc.status_code, content=response.model_dump())
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=response.model_dump(),
+        headers=getattr(exc, "headers", None),
+    )
 
 
 @app.exception_handler(InvalidRequestError)